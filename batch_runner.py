@@ -0,0 +1,305 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+批量政策讨论
+
+- batch：在同一事件循环中并发运行多个政策议题
+- farm：多进程运行，每个讨论在独立的工作进程和事件循环中运行，单个讨论崩溃不影响其他讨论
+
+议题文件支持两种格式（可混用）：
+- 每行一个议题的纯文本
+- JSONL：{"idea": "...", "investment": 3.0, "n_round": 8}
+
+用法:
+    python batch_runner.py batch ideas.jsonl --max_discussions 4 --max_llm_calls 8
+    python batch_runner.py farm ideas.jsonl --processes 8 --max_llm_calls 4
+"""
+
+import asyncio
+import json
+import multiprocessing
+import os
+import platform
+import time
+from collections import Counter, deque
+from datetime import datetime
+from multiprocessing.connection import Connection, wait
+from multiprocessing.process import BaseProcess
+from pathlib import Path
+from typing import Any, Dict, List, Sequence, Tuple, Union
+
+import fire
+
+from http_pool import configure_http_pool, with_http_pool
+from main import configure_llm_dispatcher, policy_development
+
+
+def load_ideas(ideas_file: str) -> List[Dict[str, Any]]:
+    """读取议题文件，跳过空行和 # 注释行"""
+    items = []
+    with Path(ideas_file).open("r", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            if line.startswith("{"):
+                item = json.loads(line)
+                if not item.get("idea"):
+                    raise ValueError(f"议题文件中缺少 idea 字段: {line[:80]}")
+            else:
+                item = {"idea": line}
+            items.append(item)
+    return items
+
+
+def write_result_file(output_dir: Path, index: int, result: Dict[str, Any]):
+    """写出单个讨论的结果文件"""
+    (output_dir / f"{index:03d}.json").write_text(
+        json.dumps(result, ensure_ascii=False, indent=2), encoding="utf-8"
+    )
+
+
+def reset_summary(output_dir: Path):
+    """清空汇总文件（每次批量运行开始时调用，重复运行到同一目录不会重复记录）"""
+    (output_dir / "results.jsonl").write_text("", encoding="utf-8")
+
+
+def append_summary(output_dir: Path, result: Dict[str, Any]):
+    """追加到汇总文件（只由主进程写入）"""
+    with (output_dir / "results.jsonl").open("a", encoding="utf-8") as f:
+        f.write(json.dumps(result, ensure_ascii=False) + "\n")
+
+
+def write_result(output_dir: Path, index: int, result: Dict[str, Any]):
+    """每个讨论完成后立即写出结果，并追加到汇总文件"""
+    write_result_file(output_dir, index, result)
+    append_summary(output_dir, result)
+
+
+def llm_settings(max_llm_calls: int, llm_rpm: float, llm_tpm: float, llm_max_retries: int, hedge_actions: Any,
+                 hedge_percentile: float, hedge_budget: float, http_pool: bool,
+                 http_max_connections: int) -> Dict[str, Any]:
+    """LLM调度器与HTTP连接池的参数（可跨进程传递）"""
+    return {
+        "max_calls": max_llm_calls, "rpm": llm_rpm, "tpm": llm_tpm, "max_retries": llm_max_retries,
+        "hedge_actions": hedge_actions, "hedge_percentile": hedge_percentile, "hedge_budget": hedge_budget,
+        "http_pool": http_pool, "http_max_connections": http_max_connections,
+    }
+
+
+def configure_llm(settings: Dict[str, Any]):
+    """配置本进程共享的LLM调度器与HTTP连接池（batch 在主进程调用，farm 在每个工作进程调用）"""
+    settings = dict(settings)
+    configure_http_pool(settings.pop("http_pool"), settings.pop("http_max_connections"))
+    configure_llm_dispatcher(**settings)
+
+
+async def run_discussion(index: int, item: Dict[str, Any], investment: float, n_round: int,
+                         options: Dict[str, Any]) -> Dict[str, Any]:
+    """运行单个议题，异常只影响该议题本身"""
+    start = time.perf_counter()
+    try:
+        result = await policy_development(
+            item["idea"],
+            item.get("investment", investment),
+            max(int(item.get("n_round", n_round)), 3),
+            **options,
+        )
+        result["status"] = "completed"
+    except Exception as e:
+        result = {"idea": item["idea"], "status": "failed", "error": f"{type(e).__name__}: {e}"}
+    result["index"] = index
+    result["elapsed"] = round(time.perf_counter() - start, 2)
+    result["finished_at"] = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    return result
+
+
+async def run_batch(items: List[Dict[str, Any]], output_dir: Path, max_discussions: int, llm: Dict[str, Any],
+                    investment: float, n_round: int, options: Dict[str, Any]) -> List[Dict[str, Any]]:
+    output_dir.mkdir(parents=True, exist_ok=True)
+    reset_summary(output_dir)
+    configure_llm(llm)
+    semaphore = asyncio.Semaphore(max(1, max_discussions))
+    done = 0
+
+    async def _run(index: int, item: Dict[str, Any]) -> Dict[str, Any]:
+        nonlocal done
+        async with semaphore:
+            result = await run_discussion(index, item, investment, n_round, options)
+        write_result(output_dir, index, result)
+        done += 1
+        print(f"[{done}/{len(items)}] {result['status']} ({result['elapsed']}s): {item['idea'][:40]}")
+        return result
+
+    return await asyncio.gather(*(_run(index, item) for index, item in enumerate(items)))
+
+
+def batch(ideas_file: str, output_dir: str = "batch_results", max_discussions: int = 4, max_llm_calls: int = 8,
+          investment: float = 3.0, n_round: int = 10, llm_rpm: float = 0, llm_tpm: float = 0,
+          llm_max_retries: int = 4, hedge_actions: Union[str, Sequence[str]] = (), hedge_percentile: float = 0.95,
+          hedge_budget: float = 0.1, http_pool: bool = True, http_max_connections: int = 64, **options):
+    """
+    :param ideas_file: 议题文件（每行一个议题，或JSONL格式并可带 investment/n_round）
+    :param output_dir: 结果目录，每个议题完成后写出 <序号>.json 并追加到 results.jsonl
+    :param max_discussions: 同时进行的讨论数
+    :param max_llm_calls: 所有讨论共享的在途LLM调用上限
+    :param investment: 默认讨论预算
+    :param n_round: 默认最大讨论轮数（最低3轮）
+    :param llm_rpm: 所有讨论共享的每分钟LLM请求数上限（0 表示不限制）
+    :param llm_tpm: 所有讨论共享的每分钟LLM token数上限（0 表示不限制）
+    :param llm_max_retries: LLM调用遇到限流、超时等错误时的最多重试次数
+    :param hedge_actions: 启用对冲请求的动作名（逗号分隔；gate 为发言判断；all 为全部）
+    :param hedge_percentile: 调用超过该动作历史耗时的此分位数仍未返回时发出对冲请求
+    :param hedge_budget: 对冲请求数占请求总数的比例上限
+    :param http_pool: 是否让所有讨论共享一个保持连接的HTTP连接池
+    :param http_max_connections: 共享连接池的连接数上限
+    :param options: 其余参数透传给 policy_development（如 concurrent、gate_mode、cache_mode）
+    """
+    if platform.system() == "Windows":
+        asyncio.set_event_loop_policy(asyncio.WindowsSelectorEventLoopPolicy())
+    items = load_ideas(ideas_file)
+    llm = llm_settings(max_llm_calls, llm_rpm, llm_tpm, llm_max_retries, hedge_actions, hedge_percentile,
+                       hedge_budget, http_pool, http_max_connections)
+    results = asyncio.run(with_http_pool(run_batch(items, Path(output_dir), max_discussions, llm,
+                                                   investment, n_round, options)))
+    completed = sum(1 for r in results if r["status"] == "completed")
+    print(f"批量讨论完成: {completed}/{len(results)} 成功，结果目录: {output_dir}")
+
+
+def farm_worker(index: int, item: Dict[str, Any], investment: float, n_round: int, llm: Dict[str, Any],
+                options: Dict[str, Any], output_dir: str) -> Dict[str, Any]:
+    """工作进程入口：为单个讨论运行独立的事件循环，并把结果写入共享结果目录"""
+    if platform.system() == "Windows":
+        asyncio.set_event_loop_policy(asyncio.WindowsSelectorEventLoopPolicy())
+
+    async def _run() -> Dict[str, Any]:
+        configure_llm(llm)
+        return await run_discussion(index, item, investment, n_round, options)
+
+    result = asyncio.run(with_http_pool(_run()))
+    result["worker_pid"] = os.getpid()
+    write_result_file(Path(output_dir), index, result)
+    return result
+
+
+def farm_process(conn: Connection, index: int, item: Dict[str, Any], investment: float, n_round: int,
+                 llm: Dict[str, Any], options: Dict[str, Any], output_dir: str):
+    """工作进程入口：运行一个讨论，结果经管道交回主进程（进程异常退出时主进程收不到结果）"""
+    conn.send(farm_worker(index, item, investment, n_round, llm, options, output_dir))
+    conn.close()
+
+
+class FarmProgress:
+    """多进程运行的汇总进度，输出到控制台并写入 progress.json"""
+
+    def __init__(self, total: int, output_dir: Path):
+        self.total = total
+        self.output_dir = output_dir
+        self.counts = Counter()
+        self.start = time.perf_counter()
+
+    def update(self, result: Dict[str, Any]):
+        self.counts[result["status"]] += 1
+        done = sum(self.counts.values())
+        elapsed = time.perf_counter() - self.start
+        snapshot = {
+            "total": self.total,
+            "done": done,
+            "remaining": self.total - done,
+            "counts": dict(self.counts),
+            "elapsed": round(elapsed, 1),
+            "discussions_per_hour": round(done / elapsed * 3600, 1) if elapsed > 0 else 0,
+            "updated_at": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+        }
+        (self.output_dir / "progress.json").write_text(json.dumps(snapshot, ensure_ascii=False, indent=2),
+                                                      encoding="utf-8")
+        print(f"[{done}/{self.total}] {result['status']} ({result.get('elapsed', 0)}s): {result['idea'][:40]} "
+              f"| {dict(self.counts)} | {snapshot['discussions_per_hour']}/h")
+
+
+def farm(ideas_file: str, processes: int = 0, output_dir: str = "batch_results", max_llm_calls: int = 4,
+         investment: float = 3.0, n_round: int = 10, max_attempts: int = 2, llm_rpm: float = 0, llm_tpm: float = 0,
+         llm_max_retries: int = 4, hedge_actions: Union[str, Sequence[str]] = (), hedge_percentile: float = 0.95,
+         hedge_budget: float = 0.1, http_pool: bool = True, http_max_connections: int = 64, **options):
+    """
+    :param ideas_file: 议题文件（格式同 batch）
+    :param processes: 同时运行的工作进程数（默认CPU核数），每个讨论一个工作进程
+    :param output_dir: 共享结果目录，另写出汇总进度 progress.json
+    :param max_llm_calls: 每个工作进程的在途LLM调用上限
+    :param investment: 默认讨论预算
+    :param n_round: 默认最大讨论轮数（最低3轮）
+    :param max_attempts: 工作进程崩溃时同一讨论的最多尝试次数
+    :param llm_rpm: 每个工作进程的每分钟LLM请求数上限（0 表示不限制）
+    :param llm_tpm: 每个工作进程的每分钟LLM token数上限（0 表示不限制）
+    :param llm_max_retries: LLM调用遇到限流、超时等错误时的最多重试次数
+    :param hedge_actions: 启用对冲请求的动作名（逗号分隔；gate 为发言判断；all 为全部）
+    :param hedge_percentile: 调用超过该动作历史耗时的此分位数仍未返回时发出对冲请求
+    :param hedge_budget: 对冲请求数占请求总数的比例上限
+    :param http_pool: 是否在每个工作进程内共享一个保持连接的HTTP连接池
+    :param http_max_connections: 每个工作进程连接池的连接数上限
+    :param options: 其余参数透传给 policy_development
+    """
+    items = load_ideas(ideas_file)
+    llm = llm_settings(max_llm_calls, llm_rpm, llm_tpm, llm_max_retries, hedge_actions, hedge_percentile,
+                       hedge_budget, http_pool, http_max_connections)
+    out = Path(output_dir)
+    out.mkdir(parents=True, exist_ok=True)
+    reset_summary(out)
+    processes = processes or os.cpu_count() or 1
+    progress = FarmProgress(len(items), out)
+    context = multiprocessing.get_context("spawn")
+    attempts = Counter()
+    pending = deque(enumerate(items))
+    # 序号 -> (工作进程, 结果管道, 议题)；每个讨论一个工作进程，崩溃只计入该讨论自身的尝试次数
+    running: Dict[int, Tuple[BaseProcess, Connection, Dict[str, Any]]] = {}
+    received: Dict[int, Dict[str, Any]] = {}
+
+    try:
+        while pending or running:
+            while pending and len(running) < processes:
+                index, item = pending.popleft()
+                receiver, sender = context.Pipe(duplex=False)
+                process = context.Process(target=farm_process, name=f"farm-{index:03d}",
+                                          args=(sender, index, item, investment, n_round, llm, options, output_dir))
+                process.start()
+                sender.close()
+                running[index] = (process, receiver, item)
+
+            # 同时等待结果管道，避免较大的结果写满管道时工作进程无法退出
+            waitables = [process.sentinel for process, _, _ in running.values()]
+            waitables += [receiver for index, (_, receiver, _) in running.items() if index not in received]
+            ready = wait(waitables)
+            for index, (process, receiver, item) in list(running.items()):
+                if index not in received and receiver in ready:
+                    try:
+                        received[index] = receiver.recv()
+                    except EOFError:
+                        received[index] = None
+                if process.sentinel not in ready:
+                    continue
+                process.join()
+                receiver.close()
+                del running[index]
+                result = received.pop(index, None)
+                if result is None:
+                    attempts[index] += 1
+                    if attempts[index] < max_attempts:
+                        pending.append((index, item))
+                        continue
+                    result = {"idea": item["idea"], "index": index, "status": "crashed",
+                              "error": f"工作进程异常退出（exitcode={process.exitcode}）"}
+                    write_result_file(out, index, result)
+                append_summary(out, result)
+                progress.update(result)
+    finally:
+        for process, receiver, _ in running.values():
+            process.terminate()
+            process.join()
+            receiver.close()
+
+    print(f"多进程讨论完成: {dict(progress.counts)}，结果目录: {output_dir}")
+
+
+if __name__ == "__main__":
+    fire.Fire({"batch": batch, "farm": farm})
@@ -0,0 +1,172 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+HTTP连接池基准测试：本地OpenAI兼容的替身服务器（/v1/chat/completions，可选TLS）统计建立的连接数，
+新连接的首个请求额外等待 --connect-latency 秒以模拟远端服务商的TCP/TLS握手往返；
+多个讨论并发，每轮七个动作依次调用（--concurrent-actions 时同时调用），对比三种客户端用法：
+- 每次请求新建客户端
+- 每个讨论的每个动作各自一个客户端（原行为）
+- 进程内共享连接池（http_pool.HTTPPool）
+
+需要安装 httpx；--tls 需要 openssl 命令生成自签名证书。
+
+用法: python benchmarks/bench_http_pool.py --discussions 4 --rounds 5 --latency 0.05 --connect-latency 0.05 --tls
+"""
+
+import argparse
+import asyncio
+import json
+import ssl
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import httpx  # noqa: E402
+
+from http_pool import HTTPPool  # noqa: E402
+
+ACTIONS = 7
+
+
+class StandInServer:
+    """OpenAI兼容的替身服务器（HTTP/1.1，支持 keep-alive），响应前按 latency 等待，新连接另加 connect_latency"""
+
+    def __init__(self, latency: float, connect_latency: float = 0.0, ssl_context=None):
+        self.latency = latency
+        self.connect_latency = connect_latency
+        self.ssl_context = ssl_context
+        self.connections = 0
+        self.requests = 0
+        self.server = None
+
+    async def start(self) -> int:
+        self.server = await asyncio.start_server(self._handle, "127.0.0.1", 0, ssl=self.ssl_context)
+        return self.server.sockets[0].getsockname()[1]
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self.connections += 1
+        first_request = True
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+                    name, _, value = line.decode("latin-1").partition(":")
+                    headers[name.strip().lower()] = value.strip()
+                body = json.loads(await reader.readexactly(int(headers.get("content-length", 0))) or b"{}")
+                self.requests += 1
+                await asyncio.sleep(self.latency + (self.connect_latency if first_request else 0))
+                first_request = False
+                payload = json.dumps({
+                    "id": f"chatcmpl-{self.requests}",
+                    "object": "chat.completion",
+                    "model": body.get("model", "stand-in"),
+                    "choices": [{"index": 0, "finish_reason": "stop",
+                                 "message": {"role": "assistant", "content": "需要发言"}}],
+                    "usage": {"prompt_tokens": 100, "completion_tokens": 4, "total_tokens": 104},
+                }, ensure_ascii=False).encode("utf-8")
+                writer.write(b"HTTP/1.1 200 OK\r\nContent-Type: application/json\r\n"
+                             b"Connection: keep-alive\r\nContent-Length: " + str(len(payload)).encode() + b"\r\n\r\n"
+                             + payload)
+                await writer.drain()
+                if headers.get("connection", "").lower() == "close":
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError, ssl.SSLError):
+            pass
+        finally:
+            writer.close()
+
+    async def stop(self):
+        self.server.close()
+        await self.server.wait_closed()
+
+
+def make_certificate(directory: Path):
+    cert, key = directory / "cert.pem", directory / "key.pem"
+    subprocess.run(["openssl", "req", "-x509", "-newkey", "rsa:2048", "-nodes", "-days", "1", "-subj", "/CN=127.0.0.1",
+                    "-addext", "subjectAltName=IP:127.0.0.1", "-keyout", str(key), "-out", str(cert)],
+                   check=True, capture_output=True)
+    server_context = ssl.create_default_context(ssl.Purpose.CLIENT_AUTH)
+    server_context.load_cert_chain(cert, key)
+    client_context = ssl.create_default_context(cafile=str(cert))
+    return server_context, client_context
+
+
+async def chat(client: httpx.AsyncClient, url: str, prompt: str):
+    response = await client.post(url, json={"model": "stand-in", "messages": [{"role": "user", "content": prompt}]})
+    response.raise_for_status()
+    return response.json()["choices"][0]["message"]["content"]
+
+
+async def run(mode: str, args, client_context) -> dict:
+    server = StandInServer(args.latency, args.connect_latency, client_context[0] if client_context else None)
+    port = await server.start()
+    url = f"{'https' if client_context else 'http'}://127.0.0.1:{port}/v1/chat/completions"
+    verify = client_context[1] if client_context else True
+    pool = HTTPPool(verify=verify)
+    action_clients = {}
+
+    async def call(discussion: int, action: int, round_num: int):
+        prompt = f"讨论{discussion} 第{round_num}轮 动作{action}"
+        if mode == "per_request":
+            async with httpx.AsyncClient(verify=verify) as client:
+                return await chat(client, url, prompt)
+        if mode == "per_action":
+            client = action_clients.get((discussion, action))
+            if client is None:
+                client = action_clients[(discussion, action)] = httpx.AsyncClient(verify=verify)
+            return await chat(client, url, prompt)
+        return await chat(pool.client(), url, prompt)
+
+    async def discussion(index: int):
+        for round_num in range(args.rounds):
+            if args.concurrent_actions:
+                await asyncio.gather(*(call(index, action, round_num) for action in range(ACTIONS)))
+            else:
+                for action in range(ACTIONS):
+                    await call(index, action, round_num)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(discussion(index) for index in range(args.discussions)))
+    elapsed = time.perf_counter() - start
+    pool_stats = pool.stats() if mode == "pooled" else None
+    for client in action_clients.values():
+        await client.aclose()
+    await pool.aclose()
+    await server.stop()
+    return {"elapsed": elapsed, "connections": server.connections, "requests": server.requests, "pool": pool_stats}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--discussions", type=int, default=4, help="并发讨论数")
+    parser.add_argument("--rounds", type=int, default=5)
+    parser.add_argument("--latency", type=float, default=0.05, help="替身服务器响应延迟（秒）")
+    parser.add_argument("--connect-latency", type=float, default=0.05, help="新连接的握手往返延迟（秒）")
+    parser.add_argument("--concurrent-actions", action="store_true", help="每轮七个动作同时调用")
+    parser.add_argument("--tls", action="store_true", help="使用自签名证书的HTTPS")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        contexts = make_certificate(Path(directory)) if args.tls else None
+        print(f"{'客户端用法':>12} {'请求数':>6} {'新建连接':>8} {'总耗时 s':>8} {'每请求 ms':>9}")
+        for mode in ("per_request", "per_action", "pooled"):
+            result = asyncio.run(run(mode, args, contexts))
+            print(f"{mode:>12} {result['requests']:>6} {result['connections']:>8} {result['elapsed']:>8.2f} "
+                  f"{result['elapsed'] / result['requests'] * 1000:>9.2f}")
+            if result["pool"]:
+                print(f"连接池统计: {result['pool']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,130 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+专家建议影响归因基准测试：对比原三重循环实现（关键词 + 空格分词重合度）与倒排索引实现的耗时和结果重合度
+
+用法: python benchmarks/bench_influence.py --groups 60,300,1200 --changes 5 --repeat 3
+"""
+
+import argparse
+import random
+import sys
+import time
+from pathlib import Path
+from typing import Dict, List
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from influence_index import SuggestionIndex  # noqa: E402
+from message_parser import extract_expert_suggestions, extract_keywords  # noqa: E402
+
+PHRASES = [
+    "建立分层空域管理制度", "设立无人机物流专用通道", "完善飞行许可审批流程", "加强噪音与污染排放监测",
+    "推动基础设施共建共享", "明确运营主体安全责任", "建设统一监控系统", "给予试点企业资金支持",
+    "规范数据采集与隐私保护", "制定应急响应与事故赔偿机制", "降低企业合规成本", "开展跨部门法规执法",
+    "提高商业运营准入条件", "评估项目投资效益", "推广绿色环境友好技术", "统一区域飞行标准",
+]
+EXPERTS = ["经济顾问", "环境学家", "合规律师", "制造商", "物流公司", "基建公司"]
+
+
+def calculate_relevance(change_text: str, suggestion_text: str, suggestion_keywords: List[str]) -> float:
+    """原 calculate_relevance 实现"""
+    change_lower = change_text.lower()
+    suggestion_lower = suggestion_text.lower()
+    keyword_matches = sum(1 for keyword in suggestion_keywords if keyword in change_lower)
+    keyword_score = keyword_matches / max(len(suggestion_keywords), 1)
+    change_words = set(change_lower.split())
+    suggestion_words = set(suggestion_lower.split())
+    if len(change_words) == 0 or len(suggestion_words) == 0:
+        similarity_score = 0
+    else:
+        intersection = len(change_words & suggestion_words)
+        union = len(change_words | suggestion_words)
+        similarity_score = intersection / union if union > 0 else 0
+    return keyword_score * 0.7 + similarity_score * 0.3
+
+
+def legacy_influencing(changes: List[str], expert_suggestions: List[Dict], current_round: int) -> List[Dict]:
+    """原 find_influencing_suggestions 实现"""
+    influencing = []
+    relevant_suggestions = [s for s in expert_suggestions if s["round"] <= current_round]
+    for change in changes:
+        change_keywords = extract_keywords(change)
+        for suggestion_group in relevant_suggestions:
+            for suggestion in suggestion_group["suggestions"]:
+                relevance_score = calculate_relevance(change, suggestion["text"], suggestion["keywords"])
+                if relevance_score > 0.3:
+                    influencing.append({
+                        "expert": suggestion_group["expert"],
+                        "suggestion": suggestion["text"],
+                        "relevance_score": relevance_score,
+                        "matched_keywords": list(set(change_keywords) & set(suggestion["keywords"])),
+                    })
+    influencing.sort(key=lambda x: x["relevance_score"], reverse=True)
+    seen, unique = set(), []
+    for item in influencing:
+        key = (item["expert"], item["suggestion"][:50])
+        if key not in seen:
+            seen.add(key)
+            unique.append(item)
+        if len(unique) >= 10:
+            break
+    return unique
+
+
+def make_groups(rng: random.Random, n_groups: int) -> List[Dict]:
+    groups = []
+    for i in range(n_groups):
+        expert = rng.choice(EXPERTS)
+        content = "\n".join(f"{j}. 建议" + "，".join(rng.sample(PHRASES, 2)) for j in range(1, 5))
+        groups.append({"expert": expert, "round": i // 6 + 1, "suggestions": extract_expert_suggestions(content, expert)})
+    return groups
+
+
+def timed(func, repeat: int):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        result = func()
+    return result, (time.perf_counter() - start) / repeat
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--groups", default="60,300,1200", help="专家建议组数（逗号分隔）")
+    parser.add_argument("--changes", type=int, default=5, help="每个版本的修改条数")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    print(f"{'建议组':>6} {'建议数':>6} {'原实现ms':>10} {'索引ms':>8} {'建索引ms':>8} {'原命中召回':>10}")
+    for n_groups in (int(n) for n in args.groups.split(",")):
+        groups = make_groups(rng, n_groups)
+        changes = ["，".join(rng.sample(PHRASES, 2)) for _ in range(args.changes)]
+        current_round = groups[-1]["round"]
+
+        legacy, legacy_time = timed(lambda: legacy_influencing(changes, groups, current_round), args.repeat)
+
+        def build_index() -> SuggestionIndex:
+            index = SuggestionIndex()
+            for group in groups:
+                index.add_group(group)
+            return index
+
+        index, build_time = timed(build_index, args.repeat)
+        result, index_time = timed(lambda: index.attribute(changes, current_round), args.repeat)
+        # 原实现超过阈值的 (修改, 建议) 对是否都被索引检出（排序因余弦相似度不同，前10条不要求一致）
+        legacy_hits = {
+            (c, s["text"]) for c in changes for g in groups if g["round"] <= current_round
+            for s in g["suggestions"] if calculate_relevance(c, s["text"], s["keywords"]) > 0.3
+        }
+        entries = [s["text"] for g in groups for s in g["suggestions"]]
+        index_hits = {(c, entries[i]) for c in changes for _, i in index.score_change(c, current_round)}
+        recall = len(legacy_hits & index_hits) / max(len(legacy_hits), 1)
+        print(f"{n_groups:>6} {len(index):>6} {legacy_time * 1000:>10.2f} {index_time * 1000:>8.2f} "
+              f"{build_time * 1000:>8.2f} {recall:>10.3f}")
+
+
+if __name__ == "__main__":
+    main()
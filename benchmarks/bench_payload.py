@@ -0,0 +1,139 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Web接口负载基准测试：对比原消息/政策历史结构（每条消息带 role_config 与 raw_content，
+标准库 json 默认转义中文）与精简结构（roles 表只发一次、无重复文本、orjson/紧凑UTF-8）的大小和序列化耗时
+
+用法: python benchmarks/bench_payload.py --messages 70,350,1400 --repeat 5
+"""
+
+import argparse
+import gzip
+import json
+import random
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from message_parser import extract_structured_content  # noqa: E402
+from web_server_new import (ROLES_CONFIG, PolicyHistoryState, build_message, encode_json,  # noqa: E402
+                            orjson)
+
+PHRASES = [
+    "建立分层低空空域管理制度", "设立无人机物流专用通道", "完善飞行许可审批流程", "加强噪音与碳排放监测",
+    "推动基础设施共建共享", "明确运营主体安全责任", "建设统一监控平台", "给予首批试点企业财税支持",
+    "规范数据采集与隐私保护", "制定应急处置与事故赔偿机制", "鼓励国产核心零部件研发", "开展跨部门联合执法",
+]
+EXPERTS = [
+    ("经济顾问", "关键经济问题", "建议改进", "可接受性评分"),
+    ("环境学家", "关键环境问题", "建议改进", "环境影响评分"),
+    ("合规律师", "法规合规问题", "建议修改", "合规风险评分"),
+    ("制造商", "制造问题", "建议修改", "可制造性评分"),
+    ("物流公司", "物流运营问题", "建议修改", "运营可行性评分"),
+    ("基建公司", "基础设施开发问题", "建议修改", "基础设施可行性评分"),
+]
+
+
+def sentence(rng: random.Random) -> str:
+    return "建议" + "，".join(rng.sample(PHRASES, 3)) + "，并细化实施细则与考核要求"
+
+
+def make_discussion(rng: random.Random, n_messages: int):
+    """生成 (角色, 内容, 轮次) 序列：每轮六位专家发言后政策部门修订一次"""
+    items = []
+    round_num = 1
+    while len(items) < n_messages:
+        for role, problems, suggestions, score in EXPERTS:
+            content = (
+                f"{problems}:\n" + "\n".join(f"{i}. {sentence(rng)}" for i in range(1, 4))
+                + f"\n\n{suggestions}:\n" + "\n".join(f"- {sentence(rng)}" for _ in range(3))
+                + f"\n\n{score}: {rng.randint(4, 9)}/10\n同意程度: 同意"
+            )
+            items.append((role, content, round_num))
+        policy = "\n".join(f"{i}. {sentence(rng)}。" for i in range(1, 13))
+        changes = "\n".join(f"{i}. {sentence(rng)}" for i in range(1, 4))
+        items.append(("政策部门", f"修订后的政策:\n{policy}\n\n所做修改:\n{changes}", round_num))
+        round_num += 1
+    return items[:n_messages]
+
+
+def legacy_message(index: int, role: str, content: str, round_num: int) -> dict:
+    """原 build_message 结构"""
+    return {
+        "id": str(index),
+        "role": role,
+        "role_config": ROLES_CONFIG[role],
+        "content": content,
+        "structured": extract_structured_content(content, role),
+        "timestamp": "2025-01-01 00:00:00",
+        "send_to": [],
+        "round": round_num,
+    }
+
+
+def build_payloads(items):
+    legacy_messages, messages = [], []
+    legacy_versions, legacy_groups = {}, []
+    history = PolicyHistoryState()
+    for index, (role, content, round_num) in enumerate(items):
+        legacy_messages.append(legacy_message(index, role, content, round_num))
+        structured = extract_structured_content(content, role, include_raw=False)
+        message = build_message(str(index), role, content, round_num, "2025-01-01 00:00:00", structured)
+        messages.append(message)
+        # 原政策历史结构中版本带 raw_message、建议组带 full_content（均为消息全文）
+        for update in history.add(message, structured):
+            if update["type"] == "policy_version":
+                legacy_versions[update["version"]["version"]] = {**update["version"], "raw_message": content}
+            else:
+                legacy_groups.append({**update["group"], "full_content": content})
+
+    snapshot = history.snapshot()
+    legacy_history = {**snapshot, "versions": list(legacy_versions.values()), "expert_suggestions": legacy_groups}
+    return (
+        {"messages": legacy_messages, "total_messages": len(items)},
+        {"messages": messages, "total_messages": len(items), "roles": ROLES_CONFIG},
+        legacy_history,
+        snapshot,
+    )
+
+
+def legacy_encode(payload) -> bytes:
+    """Flask jsonify 默认行为：ensure_ascii、sort_keys"""
+    return json.dumps(payload, ensure_ascii=True, sort_keys=True).encode("utf-8")
+
+
+def timed(func, repeat: int):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        result = func()
+    return result, (time.perf_counter() - start) / repeat
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--messages", default="70,350,1400", help="消息数（逗号分隔）")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    print(f"编码器: {'orjson' if orjson is not None else 'json(ensure_ascii=False)'}")
+    print(f"{'接口':>20} {'消息数':>6} {'原KB':>8} {'原ms':>8} {'精简KB':>8} {'精简ms':>8} {'gzip KB':>8} {'gzip ms':>8}")
+
+    for n_messages in (int(n) for n in args.messages.split(",")):
+        legacy_data, data, legacy_history, history = build_payloads(make_discussion(rng, n_messages))
+        for name, old, new in (("/api/discussion", legacy_data, data),
+                               ("/api/policy_history", legacy_history, history)):
+            old_body, old_time = timed(lambda: legacy_encode(old), args.repeat)
+            new_body, new_time = timed(lambda: encode_json(new), args.repeat)
+            gz_body, gz_time = timed(lambda: gzip.compress(encode_json(new), compresslevel=5), args.repeat)
+            print(f"{name:>20} {n_messages:>6} {len(old_body) / 1024:>8.1f} {old_time * 1000:>8.2f} "
+                  f"{len(new_body) / 1024:>8.1f} {new_time * 1000:>8.2f} "
+                  f"{len(gz_body) / 1024:>8.1f} {gz_time * 1000:>8.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+政策差异引擎基准测试：对比原字符级 SequenceMatcher 与各差异引擎的结果和速度
+
+用法: python benchmarks/bench_policy_diff.py --sizes 1000,3000,8000 --repeat 5
+"""
+
+import argparse
+import random
+import sys
+import time
+from difflib import SequenceMatcher
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from policy_diff import DIFF_ENGINES  # noqa: E402
+
+MIN_DIFF = 0.25
+PHRASES = [
+    "建立分层低空空域管理制度", "设立无人机物流专用通道", "完善飞行许可审批流程", "加强噪音与碳排放监测",
+    "推动基础设施共建共享", "明确运营主体安全责任", "建设统一监控平台", "给予首批试点企业财税支持",
+    "规范数据采集与隐私保护", "制定应急处置与事故赔偿机制", "鼓励国产核心零部件研发", "开展跨部门联合执法",
+]
+
+
+def legacy_policy_diff(policy1: str, policy2: str) -> float:
+    """原 ConsensusChecker.calculate_policy_diff 实现"""
+    policy1_clean = policy1.split("修订后的政策:")[-1].strip()
+    policy2_clean = policy2.split("修订后的政策:")[-1].strip()
+    return 1 - SequenceMatcher(None, policy1_clean, policy2_clean).ratio()
+
+
+def make_policy(rng: random.Random, size: int) -> str:
+    clauses = []
+    length = 0
+    while length < size:
+        clause = f"{len(clauses) + 1}. " + "，".join(rng.sample(PHRASES, 3)) + "。"
+        clauses.append(clause)
+        length += len(clause)
+    return "\n".join(clauses)
+
+
+def revise(rng: random.Random, policy: str, fraction: float) -> str:
+    """按比例改写条款，模拟一次政策修订"""
+    clauses = policy.split("\n")
+    for i in rng.sample(range(len(clauses)), max(1, int(len(clauses) * fraction))):
+        clauses[i] = f"{i + 1}. " + "，".join(rng.sample(PHRASES, 3)) + "，并细化实施细则。"
+    return "\n".join(clauses)
+
+
+def timed(func, repeat: int):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        result = func()
+    return result, (time.perf_counter() - start) / repeat
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", default="1000,3000,8000", help="政策文本字数（逗号分隔）")
+    parser.add_argument("--fractions", default="0.05,0.2,0.5", help="每次修订改写的条款比例")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    header = f"{'字数':>6} {'改写比例':>8} {'原实现差异':>10} {'原实现耗时ms':>12}"
+    for name in DIFF_ENGINES:
+        header += f" {name + '差异':>10} {name + '耗时ms':>10} {name + '判定ms':>10} {'判定一致':>6}"
+    print(header)
+
+    for size in (int(s) for s in args.sizes.split(",")):
+        base = make_policy(rng, size)
+        for fraction in (float(f) for f in args.fractions.split(",")):
+            revised = revise(rng, base, fraction)
+            legacy, legacy_time = timed(lambda: legacy_policy_diff(base, revised), args.repeat)
+            row = f"{size:>6} {fraction:>8.2f} {legacy:>10.3f} {legacy_time * 1000:>12.2f}"
+            for engine in DIFF_ENGINES.values():
+                diff, diff_time = timed(lambda: engine.diff(base, revised), args.repeat)
+                decision, decision_time = timed(lambda: engine.is_substantial(base, revised, MIN_DIFF), args.repeat)
+                agrees = decision == (legacy >= MIN_DIFF)
+                row += f" {diff:>10.3f} {diff_time * 1000:>10.2f} {decision_time * 1000:>10.2f} {str(agrees):>6}"
+            print(row)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+LLM调用的token与花费记账
+
+讨论进程每次发出的LLM请求写入一条 llm_call 事件（轮次、角色、动作、调用类型、来源、是否对冲、结果、token数、花费），
+重试与对冲请求各自单独记录，真实请求优先使用服务商返回的token数；缓存命中与回放各记一条。
+事件同时累加到本讨论的账本，讨论结束时输出按角色、轮次、调用类型汇总的表格；
+Web服务器从事件文件重建同样的账本供 /api/cost 使用。
+"""
+
+from collections import defaultdict
+from typing import Any, Dict, List, Tuple
+
+# 调用来源：live 为真实调用，cache / replay 不产生花费
+SOURCE_LIVE = "live"
+SOURCE_CACHE = "cache"
+SOURCE_REPLAY = "replay"
+
+# 请求结果：ok 为正常返回，failed 为出错（将被重试或放弃），cancelled 为对冲落败后被取消
+STATUS_OK = "ok"
+STATUS_FAILED = "failed"
+STATUS_CANCELLED = "cancelled"
+
+COST_FIELDS = ("calls", "live_calls", "hedges", "unused", "prompt_tokens", "completion_tokens", "cost")
+GROUP_FIELDS = ("round", "role", "kind", "action")
+
+
+def _empty() -> Dict[str, Any]:
+    return {"calls": 0, "live_calls": 0, "hedges": 0, "unused": 0, "prompt_tokens": 0, "completion_tokens": 0,
+            "cost": 0.0}
+
+
+class CostLedger:
+    """按 (轮次, 角色, 调用类型, 动作) 累加的请求数、对冲请求数、未采用的请求数、token数与花费"""
+
+    def __init__(self):
+        self._tallies: Dict[Tuple[int, str, str, str], Dict[str, Any]] = defaultdict(_empty)
+        self.calls = 0
+
+    def add(self, call: Dict[str, Any]):
+        """记入一次请求（call 即 llm_call 事件或同结构的字典）"""
+        tally = self._tallies[(call.get("round", 0), call.get("role", ""), call.get("kind", ""), call.get("action", ""))]
+        tally["calls"] += 1
+        tally["live_calls"] += call.get("source") == SOURCE_LIVE
+        tally["hedges"] += bool(call.get("hedge"))
+        tally["unused"] += call.get("status", STATUS_OK) != STATUS_OK
+        tally["prompt_tokens"] += call.get("prompt_tokens", 0)
+        tally["completion_tokens"] += call.get("completion_tokens", 0)
+        tally["cost"] += call.get("cost", 0.0)
+        self.calls += 1
+
+    def group_by(self, *fields: str) -> List[Dict[str, Any]]:
+        """按指定字段（round / role / kind / action）汇总，按字段值排序"""
+        groups: Dict[tuple, Dict[str, Any]] = defaultdict(_empty)
+        for key, tally in self._tallies.items():
+            values = dict(zip(GROUP_FIELDS, key))
+            group = groups[tuple(values[field] for field in fields)]
+            for name in COST_FIELDS:
+                group[name] += tally[name]
+        return [
+            {**dict(zip(fields, key)), **{name: round(value, 6) if name == "cost" else value
+                                          for name, value in group.items()}}
+            for key, group in sorted(groups.items())
+        ]
+
+    def totals(self) -> Dict[str, Any]:
+        rows = self.group_by()
+        return rows[0] if rows else _empty()
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "total": self.totals(),
+            "by_role": self.group_by("role"),
+            "by_round": self.group_by("round"),
+            "by_kind": self.group_by("kind"),
+            "by_round_role": self.group_by("round", "role"),
+        }
+
+    def format_table(self) -> str:
+        """按角色和轮次汇总的文本表格（讨论结束时输出到日志）"""
+        header = (f"{'':<12}{'请求':>6}{'真实':>6}{'对冲':>6}{'未采用':>6}{'提示词tokens':>14}{'响应tokens':>12}"
+                  f"{'花费$':>10}")
+        lines = [header]
+
+        def line(label: str, row: Dict[str, Any]):
+            lines.append(f"{label:<12}{row['calls']:>6}{row['live_calls']:>6}{row['hedges']:>6}{row['unused']:>6}"
+                         f"{row['prompt_tokens']:>14}{row['completion_tokens']:>12}{row['cost']:>10.4f}")
+
+        for row in self.group_by("role"):
+            line(row["role"] or "-", row)
+        for row in self.group_by("round"):
+            line(f"第{row['round']}轮", row)
+        for row in self.group_by("kind"):
+            line(row["kind"] or "-", row)
+        line("合计", self.totals())
+        return "\n".join(lines)
@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+讨论事件文件：每个讨论一个JSONL文件，每行一个事件，直接写文件而不经过日志系统
+
+事件公共字段：
+    id             事件序号（在单个讨论内单调递增）
+    type           事件类型，见下方常量
+    discussion_id  讨论ID
+    ts             Unix时间戳（秒）
+    time           本地时间 "YYYY-mm-dd HH:MM:SS"
+"""
+
+import json
+import threading
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, Optional, Tuple
+
+EVENTS_DIR = Path(__file__).resolve().parent / "logs" / "events"
+
+# 事件类型
+EVENT_RUN_STATUS = "run_status"    # status: started / completed / failed
+EVENT_ROUND_START = "round_start"  # round
+EVENT_GATE = "gate"                # round, role, speak, elapsed
+EVENT_MESSAGE = "message"          # round, role, profile, message_id, content
+EVENT_CONSENSUS = "consensus"      # round, agree_score, substantial_changes, key_issues, reached
+EVENT_LLM_CALL = "llm_call"        # round, role, action, kind, source, hedge, status, prompt_tokens, completion_tokens, cost, elapsed
+
+
+def new_discussion_id() -> str:
+    return datetime.now().strftime("%Y%m%d_%H%M%S_%f")
+
+
+class EventLog:
+    """
+    单个讨论的事件写入器（线程安全，每个事件写入后立即刷新）
+
+    复用讨论ID时续写已有的事件文件，序号接着文件中最后一个事件，保证同一文件内的事件ID不重复
+    （Web服务器按事件ID增量读取，并据此解析 Last-Event-ID）
+    """
+
+    def __init__(self, discussion_id: str, events_dir: Path = EVENTS_DIR):
+        self.discussion_id = discussion_id
+        self.path = Path(events_dir) / f"{discussion_id}.jsonl"
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._seq, complete = self._resume()
+        self._file = self.path.open("a", encoding="utf-8")
+        if not complete:
+            # 上次运行中断在半行处，另起一行
+            self._file.write("\n")
+        self._lock = threading.Lock()
+
+    def _resume(self) -> Tuple[int, bool]:
+        """已有事件文件的下一个序号，以及文件是否以完整的行结尾"""
+        if not self.path.exists():
+            return 0, True
+        data = self.path.read_bytes()
+        seq = 0
+        for line in data.splitlines():
+            try:
+                seq = max(seq, json.loads(line)["id"] + 1)
+            except (ValueError, KeyError, TypeError):
+                continue
+        return seq, not data or data.endswith(b"\n")
+
+    def emit(self, event_type: str, **fields: Any) -> Dict[str, Any]:
+        with self._lock:
+            now = time.time()
+            event = {
+                "id": self._seq,
+                "type": event_type,
+                "discussion_id": self.discussion_id,
+                "ts": round(now, 3),
+                "time": datetime.fromtimestamp(now).strftime("%Y-%m-%d %H:%M:%S"),
+                **fields,
+            }
+            self._file.write(json.dumps(event, ensure_ascii=False) + "\n")
+            self._file.flush()
+            self._seq += 1
+            return event
+
+    def close(self):
+        with self._lock:
+            if not self._file.closed:
+                self._file.close()
+
+
+def find_latest_event_file(events_dir: Path = EVENTS_DIR) -> Optional[Path]:
+    """查找最新的讨论事件文件"""
+    if not events_dir.exists():
+        return None
+    files = sorted(events_dir.glob("*.jsonl"), key=lambda p: p.stat().st_mtime, reverse=True)
+    return files[0] if files else None
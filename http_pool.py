@@ -0,0 +1,153 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+进程内共享的LLM HTTP连接池
+
+所有动作的LLM客户端（OpenAI兼容的 llm.aclient）改用同一个 httpx.AsyncClient：
+连接保持复用（keep-alive），并发讨论之间共享连接，避免重复的TCP/TLS握手；
+安装了 h2 时启用HTTP/2（服务端支持时在单个连接上多路复用）。
+统计请求数、新建TCP连接与TLS握手次数、HTTP版本以及连接池当前连接数。
+"""
+
+import asyncio
+from collections import Counter
+from typing import Any, Awaitable, Dict, Optional, Tuple, TypeVar
+
+try:
+    import httpx
+except ImportError:  # 未安装 httpx 时各动作沿用各自的客户端
+    httpx = None
+
+try:
+    import h2  # noqa: F401
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
+
+T = TypeVar("T")
+
+
+class HTTPPool:
+    """
+    共享的连接池（按事件循环与代理区分客户端）
+
+    LLM请求只发往服务商的一个或少数几个主机，max_connections 即每个主机的连接上限。
+
+    :param max_connections: 连接数上限，超出的请求在池中排队
+    :param max_keepalive_connections: 保持的空闲连接数上限
+    :param keepalive_expiry: 空闲连接保持秒数
+    :param http2: 是否启用HTTP/2（需要安装 h2）
+    :param timeout: 请求超时秒数
+    :param verify: TLS证书校验（True、CA证书路径或 ssl.SSLContext）
+    """
+
+    def __init__(self, max_connections: int = 64, max_keepalive_connections: int = 32,
+                 keepalive_expiry: float = 60.0, http2: bool = True, timeout: float = 600.0, verify: Any = True):
+        self.max_connections = max_connections
+        self.max_keepalive_connections = max_keepalive_connections
+        self.keepalive_expiry = keepalive_expiry
+        self.http2 = http2 and HTTP2_AVAILABLE
+        self.timeout = timeout
+        self.verify = verify
+        self._clients: Dict[Tuple[asyncio.AbstractEventLoop, str], "httpx.AsyncClient"] = {}
+        self.requests = 0
+        self.tcp_connects = 0
+        self.tls_handshakes = 0
+        self.http_versions = Counter()
+
+    async def _trace(self, event_name: str, info: Dict[str, Any]):
+        if event_name == "connection.connect_tcp.complete":
+            self.tcp_connects += 1
+        elif event_name == "connection.start_tls.complete":
+            self.tls_handshakes += 1
+
+    async def _on_request(self, request: "httpx.Request"):
+        self.requests += 1
+        request.extensions["trace"] = self._trace
+
+    async def _on_response(self, response: "httpx.Response"):
+        self.http_versions[response.http_version] += 1
+
+    def client(self, proxy: str = "") -> "httpx.AsyncClient":
+        """当前事件循环的共享客户端（同一进程中先后运行的事件循环各自新建，旧循环的连接无法复用）"""
+        loop = asyncio.get_running_loop()
+        for key in [key for key in self._clients if key[0] is not loop and key[0].is_closed()]:
+            del self._clients[key]
+        key = (loop, proxy)
+        client = self._clients.get(key)
+        if client is None or client.is_closed:
+            client = httpx.AsyncClient(
+                limits=httpx.Limits(max_connections=self.max_connections,
+                                    max_keepalive_connections=self.max_keepalive_connections,
+                                    keepalive_expiry=self.keepalive_expiry),
+                http2=self.http2,
+                timeout=self.timeout,
+                verify=self.verify,
+                proxy=proxy or None,
+                follow_redirects=True,
+                event_hooks={"request": [self._on_request], "response": [self._on_response]},
+            )
+            self._clients[key] = client
+        return client
+
+    async def aclose(self):
+        """关闭当前事件循环的客户端"""
+        loop = asyncio.get_running_loop()
+        for key in [key for key in self._clients if key[0] is loop]:
+            await self._clients.pop(key).aclose()
+
+    def stats(self) -> Dict[str, Any]:
+        connections = idle = 0
+        for client in self._clients.values():
+            # 连接池内部状态（httpcore.AsyncConnectionPool），取不到时只报告计数
+            pool = getattr(getattr(client, "_transport", None), "_pool", None)
+            for connection in getattr(pool, "connections", []):
+                connections += 1
+                idle += connection.is_idle()
+        return {
+            "requests": self.requests,
+            "tcp_connects": self.tcp_connects,
+            "tls_handshakes": self.tls_handshakes,
+            "reused": max(self.requests - self.tcp_connects, 0),
+            "http_versions": dict(self.http_versions),
+            "connections": connections,
+            "idle_connections": idle,
+        }
+
+
+# 进程内共享的连接池（None 表示不启用）
+HTTP_POOL: Optional[HTTPPool] = HTTPPool() if httpx is not None else None
+
+
+def configure_http_pool(enabled: bool = True, max_connections: int = 64, **settings: Any):
+    """重建进程内共享的连接池；未安装 httpx 时不启用"""
+    global HTTP_POOL
+    HTTP_POOL = HTTPPool(max_connections=max_connections, **settings) if enabled and httpx is not None else None
+
+
+def get_http_pool() -> Optional[HTTPPool]:
+    return HTTP_POOL
+
+
+def attach_http_pool(llm: Any):
+    """让OpenAI兼容的LLM实例改用共享连接池（没有 aclient 的提供方保持不变）"""
+    if HTTP_POOL is None:
+        return
+    aclient = getattr(llm, "aclient", None)
+    if aclient is None or not hasattr(aclient, "copy"):
+        return
+    config = getattr(llm, "config", None)
+    client = HTTP_POOL.client(getattr(config, "proxy", None) or "")
+    if getattr(aclient, "_client", None) is client:
+        return
+    llm.aclient = aclient.copy(http_client=client)
+
+
+async def with_http_pool(coro: Awaitable[T]) -> T:
+    """运行协程，结束后关闭当前事件循环的共享客户端（用于 asyncio.run 的入口）"""
+    try:
+        return await coro
+    finally:
+        if HTTP_POOL is not None:
+            await HTTP_POOL.aclose()
@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+政策修订的专家建议影响归因
+
+专家建议逐条加入倒排索引（关键词 -> 建议、字符二元组 -> 建议及词频），每条修改只对命中关键词的候选建议打分：
+    相关性 = 0.7 × 建议关键词在修改中的命中比例 + 0.3 × 字符二元组TF向量的余弦相似度
+没有关键词命中的建议相关性不超过0.3，达不到阈值，因此无需打分。
+"""
+
+import math
+from collections import Counter, defaultdict
+from typing import Dict, List, Tuple
+
+from message_parser import POLICY_KEYWORDS, extract_keywords
+
+RELEVANCE_THRESHOLD = 0.3  # 相关性阈值
+KEYWORD_WEIGHT = 0.7
+SIMILARITY_WEIGHT = 0.3
+MAX_INFLUENCING = 10  # 每个版本最多返回的相关建议数
+
+
+def bigram_counts(text: str) -> Counter:
+    """字符二元组词频（忽略标点与空白，适用于不分词的中文文本）"""
+    chars = [ch for ch in text.lower() if ch.isalnum()]
+    return Counter(a + b for a, b in zip(chars, chars[1:]))
+
+
+class SuggestionIndex:
+    """专家建议的增量倒排索引"""
+
+    def __init__(self):
+        self._entries: List[Dict] = []  # 按加入顺序：expert, round, suggestion, keyword_count, norm
+        self._keyword_postings: Dict[str, List[int]] = defaultdict(list)
+        self._bigram_postings: Dict[str, List[Tuple[int, int]]] = defaultdict(list)  # bigram -> [(序号, 词频)]
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def add_group(self, group: Dict):
+        """加入一个专家建议组（group 结构同政策历史中的 expert_suggestions 条目）"""
+        for suggestion in group["suggestions"]:
+            entry_id = len(self._entries)
+            counts = bigram_counts(suggestion["text"])
+            self._entries.append({
+                "expert": group["expert"],
+                "round": group["round"],
+                "suggestion": suggestion,
+                "keyword_count": len(suggestion["keywords"]),
+                "norm": math.sqrt(sum(c * c for c in counts.values())),
+            })
+            for keyword in set(suggestion["keywords"]):
+                self._keyword_postings[keyword].append(entry_id)
+            for bigram, count in counts.items():
+                self._bigram_postings[bigram].append((entry_id, count))
+
+    def score_change(self, change: str, current_round: int) -> List[Tuple[float, int]]:
+        """修改与各候选建议的相关性，返回超过阈值的 (相关性, 建议序号)"""
+        change_lower = change.lower()
+        # 候选：至少有一个建议关键词出现在修改中
+        hits = Counter()
+        for keyword in POLICY_KEYWORDS:
+            if keyword in change_lower:
+                for entry_id in self._keyword_postings.get(keyword, ()):
+                    hits[entry_id] += 1
+        if not hits:
+            return []
+
+        # 稀疏向量点积：沿修改的二元组倒排表累加
+        counts = bigram_counts(change)
+        change_norm = math.sqrt(sum(c * c for c in counts.values()))
+        dots = Counter()
+        if change_norm:
+            for bigram, count in counts.items():
+                for entry_id, entry_count in self._bigram_postings.get(bigram, ()):
+                    if entry_id in hits:
+                        dots[entry_id] += count * entry_count
+
+        scored = []
+        for entry_id, hit_count in hits.items():
+            entry = self._entries[entry_id]
+            if entry["round"] > current_round:
+                continue
+            keyword_score = hit_count / max(entry["keyword_count"], 1)
+            dot = dots.get(entry_id)
+            similarity = dot / (change_norm * entry["norm"]) if dot else 0
+            relevance_score = keyword_score * KEYWORD_WEIGHT + similarity * SIMILARITY_WEIGHT
+            if relevance_score > RELEVANCE_THRESHOLD:
+                scored.append((relevance_score, entry_id))
+        return scored
+
+    def attribute(self, changes: List[str], current_round: int) -> List[Dict]:
+        """找到影响当前政策修订的专家建议（按相关性排序、去重，最多 MAX_INFLUENCING 条）"""
+        ranked = [
+            (-relevance_score, change_index, entry_id)
+            for change_index, change in enumerate(changes)
+            for relevance_score, entry_id in self.score_change(change, current_round)
+        ]
+        ranked.sort()
+
+        # 使用专家和建议前50字符作为唯一标识去重，只为最终返回的条目构建结果
+        seen_combinations = set()
+        unique_influencing = []
+        for negative_score, change_index, entry_id in ranked:
+            entry = self._entries[entry_id]
+            suggestion = entry["suggestion"]
+            key = (entry["expert"], suggestion["text"][:50])
+            if key in seen_combinations:
+                continue
+            seen_combinations.add(key)
+            change = changes[change_index]
+            unique_influencing.append({
+                "expert": entry["expert"],
+                "suggestion": suggestion["text"],
+                "type": suggestion["type"],
+                "relevance_score": -negative_score,
+                "round": entry["round"],
+                "change": change,
+                "matched_keywords": list(set(extract_keywords(change)) & set(suggestion["keywords"]))
+            })
+            if len(unique_influencing) >= MAX_INFLUENCING:
+                break
+        return unique_influencing
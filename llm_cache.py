@@ -0,0 +1,141 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+LLM响应持久化缓存（按 模型 + 提示词哈希 + 采样参数 内容寻址，SQLite存储，LRU淘汰）
+"""
+
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+DEFAULT_CACHE_PATH = Path(__file__).resolve().parent / "cache" / "llm_cache.sqlite3"
+DEFAULT_MAX_BYTES = 200 * 1024 * 1024
+# 并发讨论与农场进程共用同一个缓存文件，写锁被占用时最多等待的秒数
+BUSY_TIMEOUT = 30.0
+
+# 缓存模式
+READ_THROUGH = "read_through"  # 先查缓存，未命中再调用LLM并写入
+WRITE_ONLY = "write_only"      # 总是调用LLM，只写入缓存（用于刷新）
+BYPASS = "bypass"              # 不读不写
+CACHE_MODES = (READ_THROUGH, WRITE_ONLY, BYPASS)
+
+
+class LLMCache:
+    """按内容寻址的LLM响应缓存，超过容量时按最近访问时间淘汰"""
+
+    def __init__(self, path: Path = DEFAULT_CACHE_PATH, max_bytes: int = DEFAULT_MAX_BYTES,
+                 mode: str = READ_THROUGH):
+        if mode not in CACHE_MODES:
+            raise ValueError(f"未知缓存模式: {mode}，可选: {', '.join(CACHE_MODES)}")
+        self.path = Path(path)
+        self.max_bytes = max_bytes
+        self.mode = mode
+        self.hits = 0
+        self.misses = 0
+        self.writes = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(str(self.path), timeout=BUSY_TIMEOUT, check_same_thread=False)
+        # WAL 模式下读不阻塞写，多个连接（进程）同时读写同一文件
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS responses ("
+            " key TEXT PRIMARY KEY,"
+            " response TEXT NOT NULL,"
+            " size INTEGER NOT NULL,"
+            " last_access REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_last_access ON responses(last_access)")
+        self._conn.commit()
+        # 缓存总大小（写入时累加，只在超出容量时重新统计）
+        self._size = self._total_size()
+
+    @staticmethod
+    def make_key(model: str, prompt: str, system_msgs: Optional[List[str]] = None,
+                 params: Optional[Dict[str, Any]] = None) -> str:
+        """生成缓存键：模型、系统消息、提示词与采样参数的SHA-256"""
+        payload = json.dumps({
+            "model": model,
+            "system_msgs": system_msgs or [],
+            "prompt_sha256": hashlib.sha256(prompt.encode("utf-8")).hexdigest(),
+            "params": params or {},
+        }, sort_keys=True, ensure_ascii=False)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> Optional[str]:
+        """读取缓存（仅 read_through 模式生效）"""
+        if self.mode != READ_THROUGH:
+            return None
+        with self._lock:
+            row = self._conn.execute("SELECT response FROM responses WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._conn.execute("UPDATE responses SET last_access = ? WHERE key = ?", (time.time(), key))
+            self._conn.commit()
+            return row[0]
+
+    def put(self, key: str, response: str):
+        """写入缓存（bypass 模式不写）"""
+        if self.mode == BYPASS:
+            return
+        size = len(response.encode("utf-8"))
+        with self._lock:
+            row = self._conn.execute("SELECT size FROM responses WHERE key = ?", (key,)).fetchone()
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses (key, response, size, last_access) VALUES (?, ?, ?, ?)",
+                (key, response, size, time.time()),
+            )
+            self.writes += 1
+            self._size += size - (row[0] if row else 0)
+            if self._size > self.max_bytes:
+                self._evict()
+            self._conn.commit()
+
+    def _total_size(self) -> int:
+        return self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+
+    def _evict(self):
+        """超出容量时淘汰最久未访问的条目（先重新统计，计入其他进程的写入与淘汰）"""
+        total = self._total_size()
+        while total > self.max_bytes:
+            row = self._conn.execute(
+                "SELECT key, size FROM responses ORDER BY last_access ASC LIMIT 1"
+            ).fetchone()
+            if row is None:
+                break
+            self._conn.execute("DELETE FROM responses WHERE key = ?", (row[0],))
+            total -= row[1]
+            self.evictions += 1
+        self._size = total
+
+    def stats(self) -> Dict[str, Any]:
+        """命中/未命中等统计"""
+        with self._lock:
+            entries, size = self._conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses"
+            ).fetchone()
+        lookups = self.hits + self.misses
+        return {
+            "mode": self.mode,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "writes": self.writes,
+            "evictions": self.evictions,
+            "entries": entries,
+            "bytes": size,
+        }
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
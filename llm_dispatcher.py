@@ -0,0 +1,355 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+进程内共享的LLM调用调度器
+
+所有角色的动作与发言判断都经由同一个调度器发起LLM调用：
+- 每分钟请求数（RPM）与每分钟token数（TPM）令牌桶限流，另可限制在途调用数
+- 按优先级放行排队的调用：政策修订 > 专家反馈 > 发言判断
+- 遇到限流、超时、连接错误或服务端错误时按带抖动的指数退避重试
+- 可选的对冲请求：指定动作的调用超过其历史耗时的某个分位数仍未返回时，再发出一份相同请求，先返回者胜出，
+  对冲请求数受预算比例限制
+- 统计排队深度、等待时间、重试与失败次数、对冲率与对冲胜出率
+"""
+
+import asyncio
+import heapq
+import itertools
+import random
+import time
+from collections import deque
+from contextvars import ContextVar
+from typing import Any, Awaitable, Callable, Dict, Iterable, Optional, Tuple
+
+# 调用类型及优先级（数值越小越先放行）
+CALL_REVISION = "revision"
+CALL_FEEDBACK = "feedback"
+CALL_GATE = "gate"
+CALL_PRIORITIES = {CALL_REVISION: 0, CALL_FEEDBACK: 1, CALL_GATE: 2}
+
+# 在对冲请求的任务中为 True，供调用方按请求记账时区分主请求与对冲请求
+HEDGE_REQUEST: ContextVar[bool] = ContextVar("HEDGE_REQUEST", default=False)
+
+RETRYABLE_STATUS = {408, 409, 429}
+RETRYABLE_ERROR_NAMES = {
+    "RateLimitError", "APITimeoutError", "APIConnectionError", "InternalServerError",
+    "ServiceUnavailableError", "Timeout", "TimeoutException", "ConnectError", "ReadTimeout",
+}
+
+
+def is_retryable(error: BaseException) -> bool:
+    """限流、超时、连接错误和5xx错误可以重试"""
+    if isinstance(error, (asyncio.TimeoutError, ConnectionError)):
+        return True
+    status = getattr(error, "status_code", None) or getattr(getattr(error, "response", None), "status_code", None)
+    if isinstance(status, int) and (status in RETRYABLE_STATUS or status >= 500):
+        return True
+    if type(error).__name__ in RETRYABLE_ERROR_NAMES:
+        return True
+    text = str(error).lower()
+    return "429" in text or "rate limit" in text or "overloaded" in text
+
+
+class TokenBucket:
+    """每分钟补充 rate 个令牌的令牌桶（rate 为0表示不限制）；允许透支，透支部分在之后的补充中偿还"""
+
+    def __init__(self, rate_per_minute: float):
+        self.rate = rate_per_minute / 60.0
+        self.capacity = float(rate_per_minute)
+        self.tokens = self.capacity
+        self._updated = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def time_until(self, amount: float) -> float:
+        """距离可取出 amount 个令牌的秒数（超过桶容量的请求按满桶计）"""
+        if not self.rate:
+            return 0.0
+        self._refill()
+        amount = min(amount, self.capacity)
+        return 0.0 if self.tokens >= amount else (amount - self.tokens) / self.rate
+
+    def consume(self, amount: float):
+        if self.rate:
+            self._refill()
+            self.tokens -= amount
+
+
+class LatencyTracker:
+    """
+    单个动作类型最近若干次请求的耗时与对冲统计
+
+    被取消的请求（对冲中落败的一方）记为删失样本：取消时已经过的时间只是其真实耗时的下界。
+    若只记录完成的请求，对冲胜出后慢请求的耗时被丢弃，窗口中的长尾逐渐消失，对冲阈值随之不断下降。
+    """
+
+    def __init__(self, window: int = 200):
+        self.latencies = deque(maxlen=window)  # (耗时, 是否删失)
+        self.requests = 0
+        self.hedges = 0
+        self.hedge_wins = 0
+
+    def record(self, latency: float, censored: bool = False):
+        self.latencies.append((latency, censored))
+
+    def percentile(self, q: float) -> Optional[float]:
+        """
+        耗时的q分位数（Kaplan-Meier 估计）：删失样本不计为完成，只在其耗时之后退出风险集；
+        没有删失样本时即最小的满足 "不超过它的样本比例大于q" 的耗时。
+        长尾全部被删失、估计的分布达不到q时返回最长的耗时（分位数的下界）
+        """
+        if not self.latencies:
+            return None
+        ordered = sorted(self.latencies)
+        at_risk = len(ordered)
+        survival = 1.0
+        for latency, censored in ordered:
+            if not censored:
+                survival *= 1 - 1 / at_risk
+                if 1 - survival > q + 1e-9:
+                    return latency
+            at_risk -= 1
+        return ordered[-1][0]
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "requests": self.requests,
+            "hedges": self.hedges,
+            "hedge_wins": self.hedge_wins,
+            "p50": round(self.percentile(0.5) or 0.0, 3),
+            "p95": round(self.percentile(0.95) or 0.0, 3),
+        }
+
+
+class LLMDispatcher:
+    """
+    LLM调用调度器
+
+    :param rpm: 每分钟请求数上限（0 表示不限制）
+    :param tpm: 每分钟token数上限（0 表示不限制），按提示词估算值加 completion_reserve 预留，响应返回后按实际结算
+    :param max_concurrency: 在途调用数上限（0 表示不限制）
+    :param max_retries: 可重试错误的最多重试次数
+    :param base_delay: 退避基准秒数，第n次重试等待 [0, min(max_delay, base_delay * 2^n)] 内的随机时间
+    :param max_delay: 单次退避的最长秒数
+    :param completion_reserve: 为响应预留的token数
+    :param hedge_actions: 启用对冲的动作名（如 LegalComplianceReview；发言判断为 gate；"all" 表示全部）
+    :param hedge_percentile: 调用超过该动作历史耗时的此分位数仍未返回时发出对冲请求
+    :param hedge_budget: 对冲请求数占请求总数的比例上限
+    :param hedge_min_samples: 动作至少有这么多次耗时记录后才开始对冲
+    """
+
+    def __init__(self, rpm: float = 0, tpm: float = 0, max_concurrency: int = 0, max_retries: int = 4,
+                 base_delay: float = 1.0, max_delay: float = 30.0, completion_reserve: int = 800,
+                 hedge_actions: Iterable[str] = (), hedge_percentile: float = 0.95, hedge_budget: float = 0.1,
+                 hedge_min_samples: int = 5):
+        self.rpm_bucket = TokenBucket(rpm)
+        self.tpm_bucket = TokenBucket(tpm)
+        self.max_concurrency = max_concurrency
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.completion_reserve = completion_reserve
+        self.hedge_actions = set(hedge_actions)
+        self.hedge_percentile = hedge_percentile
+        self.hedge_budget = hedge_budget
+        self.hedge_min_samples = hedge_min_samples
+        self.trackers: Dict[str, LatencyTracker] = {}
+
+        self._waiters = []  # (优先级, 序号, token数, future, 入队时间)
+        self._seq = itertools.count()
+        self._in_flight = 0
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+        self.calls = 0
+        self.retries = 0
+        self.failures = 0
+        self.hedges = 0
+        self.hedge_wins = 0
+        self.max_queue_depth = 0
+        self.wait_total: Dict[str, float] = {kind: 0.0 for kind in CALL_PRIORITIES}
+        self.wait_max: Dict[str, float] = {kind: 0.0 for kind in CALL_PRIORITIES}
+        self.granted: Dict[str, int] = {kind: 0 for kind in CALL_PRIORITIES}
+
+    @property
+    def queue_depth(self) -> int:
+        return sum(1 for waiter in self._waiters if not waiter[3].done())
+
+    @property
+    def in_flight(self) -> int:
+        return self._in_flight
+
+    def _bind_loop(self):
+        # 同一进程中可能先后运行多个事件循环（如工作进程依次运行多个讨论），切换时丢弃旧循环的排队状态
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            self._loop = loop
+            self._waiters = []
+            self._in_flight = 0
+            self._timer = None
+
+    def _pump(self):
+        """按优先级放行排队的调用，直到遇到并发或限流限制"""
+        self._timer = None
+        while self._waiters:
+            priority, _, tokens, future, queued_at = self._waiters[0]
+            if future.done():  # 等待中被取消
+                heapq.heappop(self._waiters)
+                continue
+            if self.max_concurrency and self._in_flight >= self.max_concurrency:
+                return
+            delay = max(self.rpm_bucket.time_until(1), self.tpm_bucket.time_until(tokens))
+            if delay > 0:
+                self._timer = self._loop.call_later(delay, self._pump)
+                return
+            heapq.heappop(self._waiters)
+            self.rpm_bucket.consume(1)
+            self.tpm_bucket.consume(tokens)
+            self._in_flight += 1
+            future.set_result(self._loop.time() - queued_at)
+
+    async def _acquire(self, kind: str, tokens: int):
+        self._bind_loop()
+        future = self._loop.create_future()
+        heapq.heappush(self._waiters, (CALL_PRIORITIES[kind], next(self._seq), tokens, future, self._loop.time()))
+        self.max_queue_depth = max(self.max_queue_depth, self.queue_depth)
+        if self._timer is None:
+            self._pump()
+        try:
+            waited = await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                self._release()  # 已放行但调用方被取消
+            raise
+        self.granted[kind] += 1
+        self.wait_total[kind] += waited
+        self.wait_max[kind] = max(self.wait_max[kind], waited)
+
+    def _release(self):
+        self._in_flight -= 1
+        if self._timer is None:
+            self._pump()
+
+    def _hedge_delay(self, tracker: LatencyTracker, action: str) -> Optional[float]:
+        """该动作本次调用的对冲等待秒数，不对冲时返回 None"""
+        if "all" not in self.hedge_actions and action not in self.hedge_actions:
+            return None
+        if len(tracker.latencies) < self.hedge_min_samples:
+            return None
+        return tracker.percentile(self.hedge_percentile)
+
+    async def _send(self, func: Callable[[], Awaitable[str]], tracker: LatencyTracker) -> str:
+        """发出一次已放行的请求并记录耗时（被取消时记为删失样本）"""
+        start = time.perf_counter()
+        try:
+            rsp = await func()
+            tracker.record(time.perf_counter() - start)
+            return rsp
+        except asyncio.CancelledError:
+            tracker.record(time.perf_counter() - start, censored=True)
+            raise
+        finally:
+            self._release()
+
+    async def _acquire_and_send(self, kind: str, tokens: int, func: Callable[[], Awaitable[str]],
+                                tracker: LatencyTracker, granted: asyncio.Event) -> str:
+        """对冲请求：在独立任务中排队并发出（放行后设置 granted）"""
+        HEDGE_REQUEST.set(True)
+        await self._acquire(kind, tokens)
+        granted.set()
+        self.calls += 1
+        return await self._send(func, tracker)
+
+    async def _attempt(self, kind: str, tokens: int, func: Callable[[], Awaitable[str]],
+                       action: str) -> Tuple[str, int]:
+        """
+        一次调用尝试：主请求超过对冲阈值未返回且预算允许时发出对冲请求，先成功返回者胜出
+
+        :return: (响应, 已放行并预留了token的请求数)
+        """
+        tracker = self.trackers.setdefault(action, LatencyTracker())
+        tracker.requests += 1
+        delay = self._hedge_delay(tracker, action)
+        await self._acquire(kind, tokens)
+        self.calls += 1
+        if delay is None:
+            return await self._send(func, tracker), 1
+
+        primary = asyncio.ensure_future(self._send(func, tracker))
+        pending = {primary}
+        hedge_granted = asyncio.Event()
+        try:
+            done, _ = await asyncio.wait(pending, timeout=delay)
+            if done or self.hedges >= self.hedge_budget * self.calls:
+                return await primary, 1
+            self.hedges += 1
+            tracker.hedges += 1
+            hedge = asyncio.ensure_future(self._acquire_and_send(kind, tokens, func, tracker, hedge_granted))
+            pending.add(hedge)
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                winners = [task for task in done if task.exception() is None]
+                if winners:
+                    if hedge in winners and primary not in winners:
+                        self.hedge_wins += 1
+                        tracker.hedge_wins += 1
+                    return winners[0].result(), 1 + hedge_granted.is_set()
+            # 两个请求都失败，按主请求的错误处理
+            raise primary.exception()
+        finally:
+            for task in pending:
+                task.cancel()
+
+    async def call(self, kind: str, prompt_tokens: int, func: Callable[[], Awaitable[str]],
+                   count_tokens: Callable[[str], int] = len, action: str = "") -> str:
+        """
+        排队并发起一次LLM调用，可重试错误按退避策略重试，重试用尽或不可重试时抛出最后一次的异常
+
+        :param kind: 调用类型（revision / feedback / gate）
+        :param prompt_tokens: 提示词的估算token数
+        :param func: 发起实际调用的协程函数（重试时再次调用，对冲时可能被并发调用两次；
+                     对冲请求中 HEDGE_REQUEST 为 True，落败的请求被取消）
+        :param count_tokens: 估算响应token数（用于TPM结算）
+        :param action: 动作类型，用于分别统计耗时与对冲，默认同 kind
+        """
+        if kind not in CALL_PRIORITIES:
+            raise ValueError(f"未知LLM调用类型: {kind}，可选: {', '.join(CALL_PRIORITIES)}")
+        reserved = prompt_tokens + self.completion_reserve
+        for attempt in range(self.max_retries + 1):
+            try:
+                rsp, requests = await self._attempt(kind, reserved, func, action or kind)
+            except Exception as e:
+                error = e
+            else:
+                # 每个已放行的请求各预留了一份 completion_reserve；对冲中落败的请求按胜出响应的规模结算
+                self.tpm_bucket.consume((count_tokens(rsp) - self.completion_reserve) * requests)
+                return rsp
+
+            if attempt >= self.max_retries or not is_retryable(error):
+                self.failures += 1
+                raise error
+            self.retries += 1
+            await asyncio.sleep(random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt)))
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "calls": self.calls,
+            "retries": self.retries,
+            "failures": self.failures,
+            "queue_depth": self.queue_depth,
+            "max_queue_depth": self.max_queue_depth,
+            "in_flight": self._in_flight,
+            "avg_wait": {
+                kind: round(self.wait_total[kind] / self.granted[kind], 3) if self.granted[kind] else 0.0
+                for kind in CALL_PRIORITIES
+            },
+            "max_wait": {kind: round(wait, 3) for kind, wait in self.wait_max.items()},
+            "hedges": self.hedges,
+            "hedge_rate": round(self.hedges / self.calls, 3) if self.calls else 0.0,
+            "hedge_win_rate": round(self.hedge_wins / self.hedges, 3) if self.hedges else 0.0,
+            "actions": {action: tracker.stats() for action, tracker in self.trackers.items()},
+        }
@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+LLM调用录制与回放（用于无网络环境下的确定性离线运行与性能测试）
+
+录制文件为JSONL，每行一次调用（按完成顺序写入）：
+{"seq": 0, "stream": "EconomicFeedback:feedback", "stream_seq": 0, "action": "EconomicFeedback", "key": "...",
+ "prompt": "...", "system_msgs": [], "response": "...", "latency": 3.2}
+
+seq 为发起顺序；stream 为调用流（动作名:调用类型），stream_seq 为该调用流内的发起序号。
+并发的发言判断与专家发言完成顺序不固定，按顺序回放时以 (stream, stream_seq) 匹配，
+每个调用流内的调用依次发生，回放结果不受完成顺序影响。
+"""
+
+import asyncio
+import hashlib
+import json
+import threading
+from collections import defaultdict, deque
+from pathlib import Path
+from typing import Any, Deque, Dict, List, Optional
+
+MATCH_HASH = "hash"    # 按提示词内容哈希匹配响应
+MATCH_ORDER = "order"  # 按每个调用流内的发起顺序依次返回响应
+MATCH_MODES = (MATCH_HASH, MATCH_ORDER)
+
+
+class ReplayMissError(LookupError):
+    """回放时找不到对应的录制响应"""
+
+
+def prompt_key(prompt: str, system_msgs: Optional[List[str]] = None) -> str:
+    """提示词内容哈希（不含模型配置，便于换机器回放）"""
+    payload = json.dumps({"system_msgs": system_msgs or [], "prompt": prompt}, ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class TranscriptRecorder:
+    """将每次LLM调用的提示词与响应追加写入录制文件"""
+
+    def __init__(self, path: str):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._file = self.path.open("w", encoding="utf-8")
+        self._lock = threading.Lock()
+        self._seq = 0
+        self._stream_seq: Dict[str, int] = defaultdict(int)
+
+    def reserve(self, stream: str) -> Dict[str, Any]:
+        """在发出调用前领取序号（发起顺序），调用完成后连同响应交给 record"""
+        with self._lock:
+            ticket = {"seq": self._seq, "stream": stream, "stream_seq": self._stream_seq[stream]}
+            self._seq += 1
+            self._stream_seq[stream] += 1
+            return ticket
+
+    def record(self, ticket: Dict[str, Any], action: str, prompt: str, system_msgs: Optional[List[str]],
+               response: str, latency: float):
+        with self._lock:
+            entry = {
+                **ticket,
+                "action": action,
+                "key": prompt_key(prompt, system_msgs),
+                "prompt": prompt,
+                "system_msgs": system_msgs or [],
+                "response": response,
+                "latency": round(latency, 4),
+            }
+            self._file.write(json.dumps(entry, ensure_ascii=False) + "\n")
+            self._file.flush()
+
+    def close(self):
+        with self._lock:
+            self._file.close()
+
+
+class TranscriptReplayer:
+    """从录制文件回放LLM响应，可选按录制时的耗时模拟延迟"""
+
+    def __init__(self, path: str, match: str = MATCH_HASH, reproduce_latency: bool = False):
+        if match not in MATCH_MODES:
+            raise ValueError(f"未知回放匹配方式: {match}，可选: {', '.join(MATCH_MODES)}")
+        self.path = Path(path)
+        self.match = match
+        self.reproduce_latency = reproduce_latency
+        self.served = 0
+
+        with self.path.open("r", encoding="utf-8") as f:
+            entries = sorted((json.loads(line) for line in f if line.strip()), key=lambda entry: entry["seq"])
+        self._by_key: Dict[str, Deque[dict]] = defaultdict(deque)
+        self._by_stream: Dict[str, Deque[dict]] = defaultdict(deque)
+        for entry in entries:
+            self._by_key[entry["key"]].append(entry)
+            self._by_stream[entry["stream"]].append(entry)
+        self._last_by_key: Dict[str, dict] = {}
+
+    def _next_entry(self, prompt: str, system_msgs: Optional[List[str]], stream: str) -> dict:
+        key = prompt_key(prompt, system_msgs)
+        if self.match == MATCH_ORDER:
+            queue = self._by_stream.get(stream)
+            if not queue:
+                raise ReplayMissError(f"录制文件 {self.path} 中调用流 {stream} 的响应已全部回放")
+            return queue.popleft()
+
+        queue = self._by_key.get(key)
+        if queue:
+            # 相同提示词按录制顺序返回，用尽后重复最后一条
+            entry = queue.popleft()
+            self._last_by_key[key] = entry
+            return entry
+        if key in self._last_by_key:
+            return self._last_by_key[key]
+        raise ReplayMissError(f"录制文件 {self.path} 中没有匹配该提示词的响应（key={key[:12]}）")
+
+    async def reply(self, prompt: str, system_msgs: Optional[List[str]] = None, stream: str = "") -> str:
+        entry = self._next_entry(prompt, system_msgs, stream)
+        if self.reproduce_latency and entry.get("latency"):
+            await asyncio.sleep(entry["latency"])
+        self.served += 1
+        return entry["response"]
@@ -4,8 +4,11 @@
 
 import asyncio
 import platform
-from typing import Any, Dict, List
-from difflib import SequenceMatcher
+import time
+import random
+from contextvars import ContextVar
+import re
+from typing import Any, ClassVar, Dict, List, Optional, Sequence, Tuple, Union
 
 import fire
 
@@ -14,9 +17,303 @@ from metagpt.roles import Role
 from metagpt.schema import Message
 from metagpt.team import Team
 from metagpt.actions import Action, UserRequirement
+from metagpt.utils.token_counter import TOKEN_COSTS
+
+from cost_ledger import (SOURCE_CACHE, SOURCE_LIVE, SOURCE_REPLAY, STATUS_CANCELLED, STATUS_FAILED, STATUS_OK,
+                         CostLedger)
+from llm_cache import BYPASS, LLMCache
+from llm_dispatcher import CALL_FEEDBACK, CALL_GATE, CALL_REVISION, HEDGE_REQUEST, LLMDispatcher
+from http_pool import attach_http_pool, configure_http_pool, get_http_pool, with_http_pool
+from llm_replay import MATCH_HASH, TranscriptRecorder, TranscriptReplayer
+from policy_diff import DiffEngine, get_diff_engine
+from message_parser import extract_structured_content
+from tracing import TRACER, Tracer, trace_span
+from event_log import (EVENT_CONSENSUS, EVENT_GATE, EVENT_LLM_CALL, EVENT_MESSAGE, EVENT_ROUND_START,
+                       EVENT_RUN_STATUS, EventLog, new_discussion_id)
+
+# 上下文构建
+CONTEXT_TOKEN_BUDGET = 6000  # 每次动作提示词中讨论历史的token预算
+
+def estimate_tokens(text: str) -> int:
+    """粗略估算token数：中文字符按1个计，其余字符每4个计1个"""
+    cjk = sum(1 for ch in text if "\u4e00" <= ch <= "\u9fff")
+    return cjk + (len(text) - cjk + 3) // 4
+
+class ContextBuilder:
+    """按token预算构建讨论历史：最新政策与自己上次反馈保留原文，较早轮次压缩为摘要"""
+
+    def __init__(self, token_budget: int = CONTEXT_TOKEN_BUDGET):
+        self.token_budget = token_budget
+        # 轮次摘要缓存（键为该轮消息id），每轮只摘要一次
+        self._summary_cache: Dict[Tuple[str, ...], str] = {}
+
+    def build(self, memories: List[Message], owner: str) -> str:
+        if not memories:
+            return ""
+
+        # 按政策修订划分轮次：每条修订后的政策结束一轮
+        rounds: List[List[Message]] = [[]]
+        for msg in memories:
+            rounds[-1].append(msg)
+            if "修订后的政策:" in msg.content:
+                rounds.append([])
+        if not rounds[-1]:
+            rounds.pop()
+
+        # 必须保留原文的消息：最新政策版本、自己上次的反馈
+        latest_policy = next((m for m in reversed(memories) if m.sent_from == "政策部门"), None)
+        own_last = next((m for m in reversed(memories) if m.sent_from == owner), None)
+        pinned_messages = list({id(m): m for m in (latest_policy, own_last) if m is not None}.values())
+        pinned = {id(m) for m in pinned_messages}
+        remaining = self.token_budget - sum(estimate_tokens(self._render(m)) for m in pinned_messages)
+
+        # 从最近一轮往前分配预算：优先原文，放不下则用摘要，摘要也放不下则舍弃
+        modes: Dict[int, str] = {}
+        exhausted = False
+        for index in range(len(rounds) - 1, -1, -1):
+            if exhausted:
+                modes[index] = "dropped"
+                continue
+            unpinned = [m for m in rounds[index] if id(m) not in pinned]
+            if not unpinned:
+                modes[index] = "verbatim"
+                continue
+            verbatim_cost = sum(estimate_tokens(self._render(m)) for m in unpinned)
+            if verbatim_cost <= remaining:
+                modes[index] = "verbatim"
+                remaining -= verbatim_cost
+                continue
+            summary_cost = estimate_tokens(self._summarize(index, unpinned))
+            if summary_cost <= remaining:
+                modes[index] = "summary"
+                remaining -= summary_cost
+            else:
+                # 预算用尽后更早的轮次全部舍弃，保证保留下来的历史是连续的
+                modes[index] = "dropped"
+                exhausted = True
+
+        lines = []
+        for index, round_messages in enumerate(rounds):
+            mode = modes[index]
+            if mode == "summary":
+                lines.append(self._summarize(index, [m for m in round_messages if id(m) not in pinned]))
+            for msg in round_messages:
+                if mode == "verbatim" or id(msg) in pinned:
+                    lines.append(self._render(msg))
+
+        context = "\n".join(lines)
+        if remaining < 0:
+            logger.warning(f"{owner}: 必须保留的内容已超出上下文预算 {self.token_budget} tokens")
+        return context
+
+    @staticmethod
+    def _render(msg: Message) -> str:
+        return f"{msg.sent_from}: {msg.content}"
+
+    def _summarize(self, index: int, messages: List[Message]) -> str:
+        """抽取式轮次摘要：保留每条发言的评分、同意程度和首要问题/修改"""
+        key = tuple(m.id for m in messages)
+        if key in self._summary_cache:
+            return self._summary_cache[key]
+
+        parts = []
+        for msg in messages:
+            points = [line.strip() for line in msg.content.split("\n")
+                      if re.search(r"评分[:：]|同意程度[:：]", line)]
+            first_item = next((line.strip() for line in msg.content.split("\n")
+                               if re.match(r"^\s*1\.", line)), "")
+            if first_item:
+                points.append(first_item[:80])
+            if not points:
+                points.append(msg.content.strip().replace("\n", " ")[:80])
+            parts.append(f"{msg.sent_from}: {'；'.join(points)}")
+
+        summary = f"【第{index + 1}段讨论摘要】" + " | ".join(parts)
+        self._summary_cache[key] = summary
+        return summary
+
+# LLM响应缓存与录制/回放（由 policy_development 按参数设置，每个讨论任务独立）
+LLM_CACHE: ContextVar[Optional[LLMCache]] = ContextVar("LLM_CACHE", default=None)
+LLM_RECORDER: ContextVar[Optional[TranscriptRecorder]] = ContextVar("LLM_RECORDER", default=None)
+LLM_REPLAYER: ContextVar[Optional[TranscriptReplayer]] = ContextVar("LLM_REPLAYER", default=None)
+# 当前讨论的政策差异引擎（条款级；"char" 为原字符级实现），由 policy_development 按参数设置
+DIFF_ENGINE: ContextVar[DiffEngine] = ContextVar("DIFF_ENGINE", default=get_diff_engine("clause"))
+# 进程内所有讨论共享的LLM调用调度器（限流、优先级、重试）
+LLM_DISPATCHER = LLMDispatcher()
+
+def configure_llm_dispatcher(max_calls: int = 0, rpm: float = 0, tpm: float = 0, max_retries: int = 4,
+                             hedge_actions: Union[str, Sequence[str]] = (), hedge_percentile: float = 0.95,
+                             hedge_budget: float = 0.1):
+    """重建进程内共享的LLM调用调度器（在途调用数、每分钟请求数/token数上限，0 表示不限制；对冲请求默认关闭）"""
+    global LLM_DISPATCHER
+    if isinstance(hedge_actions, str):
+        hedge_actions = [name.strip() for name in hedge_actions.split(",") if name.strip()]
+    LLM_DISPATCHER = LLMDispatcher(rpm=rpm, tpm=tpm, max_concurrency=max_calls, max_retries=max_retries,
+                                   hedge_actions=hedge_actions, hedge_percentile=hedge_percentile,
+                                   hedge_budget=hedge_budget)
+
+# 当前讨论的结构化事件文件（由 policy_development 设置）
+EVENT_LOG: ContextVar[Optional[EventLog]] = ContextVar("EVENT_LOG", default=None)
+# 当前讨论的token与花费账本（由 policy_development 设置），以及发起调用的角色（角色行动与发言判断时设置）
+COST_LEDGER: ContextVar[Optional[CostLedger]] = ContextVar("COST_LEDGER", default=None)
+CURRENT_ROLE: ContextVar[str] = ContextVar("CURRENT_ROLE", default="")
+# 当前请求的服务商token用量（由 DiscussionAction._request 设置，capture_usage 安装的钩子写入）
+CALL_USAGE: ContextVar[Optional[Dict[str, int]]] = ContextVar("CALL_USAGE", default=None)
+# 当前讨论的随机数生成器（由 policy_development 按种子设置）
+DISCUSSION_RNG: ContextVar[random.Random] = ContextVar("DISCUSSION_RNG", default=random.Random())
+
+def emit_event(event_type: str, **fields: Any):
+    """写入当前讨论的事件文件"""
+    event_log = EVENT_LOG.get()
+    if event_log is not None:
+        event_log.emit(event_type, **fields)
+
+def capture_usage(llm: Any):
+    """在LLM实例的 _update_costs 上挂钩，把每次请求的服务商token用量写入 CALL_USAGE（每个实例只安装一次）"""
+    update_costs = getattr(llm, "_update_costs", None)
+    if update_costs is None or getattr(update_costs, "captures_usage", False):
+        return
+
+    def _update_costs(usage: Any, *args, **kwargs):
+        sink = CALL_USAGE.get()
+        if sink is not None and usage:
+            for name in ("prompt_tokens", "completion_tokens"):
+                value = usage.get(name) if isinstance(usage, dict) else getattr(usage, name, None)
+                if value is not None:
+                    sink[name] = value
+        return update_costs(usage, *args, **kwargs)
+
+    _update_costs.captures_usage = True
+    llm._update_costs = _update_costs
+
+def disable_client_retries(llm: Any):
+    """关闭OpenAI兼容客户端自带的重试（默认对429/5xx重试2次），限流与服务端错误只由调度器按令牌桶和优先级重试"""
+    aclient = getattr(llm, "aclient", None)
+    if aclient is None or not getattr(aclient, "max_retries", 0) or not hasattr(aclient, "copy"):
+        return
+    llm.aclient = aclient.copy(max_retries=0)
+
+def record_response(role: Role, msg: Message):
+    """记录角色发言到事件文件（同时写入一次性解析出的结构化字段）"""
+    round_num = CURRENT_ROUND.get()
+    with trace_span("record_response", role=role.name):
+        emit_event(EVENT_MESSAGE, round=round_num, role=role.name, profile=role.profile,
+                   message_id=msg.id, content=msg.content,
+                   structured=extract_structured_content(msg.content, role.name, include_raw=False))
+        logger.info(f"{role.name}: 第{round_num}轮发言（{len(msg.content)}字）")
+
+# 讨论动作基类
+class DiscussionAction(Action):
+    """所有讨论动作的基类，统一记录每次LLM调用的提示词规模，并接入响应缓存、录制/回放与调用调度器"""
+
+    # 调度优先级类型：政策修订 > 专家反馈 > 发言判断
+    call_kind: ClassVar[str] = CALL_FEEDBACK
+
+    async def _aask(self, prompt: str, system_msgs: Optional[List[str]] = None, kind: Optional[str] = None) -> str:
+        with trace_span("llm_call", action=self.name, kind=kind or self.call_kind) as span:
+            prompt_tokens = estimate_tokens(prompt)
+            logger.info(f"{self.name}: 提示词约 {prompt_tokens} tokens")
+            if system_msgs:
+                prompt_tokens += sum(estimate_tokens(msg) for msg in system_msgs)
+            start = time.perf_counter()
+            # 调用流：同一动作的同类调用依次发生，按顺序回放时据此匹配
+            stream = f"{self.name}:{kind or self.call_kind}"
+            replayer = LLM_REPLAYER.get()
+            if replayer is not None:
+                rsp = await replayer.reply(prompt, system_msgs, stream)
+                span.set(source=SOURCE_REPLAY)
+                self._account(kind, SOURCE_REPLAY, prompt_tokens, estimate_tokens(rsp), start)
+                return rsp
+
+            # 在等待响应之前领取录制序号，并发调用的完成顺序不影响录制的发起顺序
+            recorder = LLM_RECORDER.get()
+            ticket = recorder.reserve(stream) if recorder is not None else None
+            cache = LLM_CACHE.get()
+            key = None
+            rsp = None
+            source = SOURCE_CACHE
+            if cache is not None:
+                key = LLMCache.make_key(self._model_name(), prompt, system_msgs, self._sampling_params())
+                rsp = cache.get(key)
+                if rsp is not None:
+                    logger.debug(f"{self.name}: 命中LLM缓存")
+            if rsp is None:
+                source = SOURCE_LIVE
+                disable_client_retries(self.llm)
+                attach_http_pool(self.llm)
+                capture_usage(self.llm)
+                # 发言判断单独统计耗时（提示词远短于动作本身），其余按动作名统计；每次请求在 _request 中记账
+                rsp = await LLM_DISPATCHER.call(kind or self.call_kind, prompt_tokens,
+                                                lambda: self._request(prompt, system_msgs, kind, prompt_tokens),
+                                                count_tokens=estimate_tokens, action=kind or self.name)
+                if cache is not None:
+                    cache.put(key, rsp)
+
+            if recorder is not None:
+                recorder.record(ticket, self.name, prompt, system_msgs, rsp, time.perf_counter() - start)
+            span.set(source=source)
+            if source == SOURCE_CACHE:
+                self._account(kind, source, prompt_tokens, estimate_tokens(rsp), start)
+            return rsp
+
+    async def _request(self, prompt: str, system_msgs: Optional[List[str]], kind: Optional[str],
+                       prompt_tokens: int) -> str:
+        """发出一次真实请求（调度器重试与对冲时会多次调用），每次请求单独记账"""
+        usage: Dict[str, int] = {}
+        CALL_USAGE.set(usage)
+        hedge = HEDGE_REQUEST.get()
+        status = STATUS_FAILED
+        rsp = ""
+        start = time.perf_counter()
+        try:
+            rsp = await super()._aask(prompt, system_msgs)
+            status = STATUS_OK
+            return rsp
+        except asyncio.CancelledError:
+            status = STATUS_CANCELLED
+            raise
+        finally:
+            # 优先使用服务商报告的用量；出错的请求通常不计费，被取消的请求已发出，按估算的提示词计入
+            self._account(kind, SOURCE_LIVE,
+                          usage.get("prompt_tokens", 0 if status == STATUS_FAILED else prompt_tokens),
+                          usage.get("completion_tokens", estimate_tokens(rsp)), start, hedge=hedge, status=status)
+
+    def _account(self, kind: Optional[str], source: str, prompt_tokens: int, completion_tokens: int, start: float,
+                 hedge: bool = False, status: str = STATUS_OK):
+        """把一次请求的token数与花费（按模型单价，只有真实请求计费）记入账本和事件文件"""
+        cost = 0.0
+        if source == SOURCE_LIVE:
+            prices = TOKEN_COSTS.get(self._model_name())
+            if prices:
+                cost = (prompt_tokens * prices["prompt"] + completion_tokens * prices["completion"]) / 1000
+        call = {
+            "round": CURRENT_ROUND.get(),
+            "role": CURRENT_ROLE.get(),
+            "action": self.name,
+            "kind": kind or self.call_kind,
+            "source": source,
+            "hedge": hedge,
+            "status": status,
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "cost": round(cost, 6),
+            "elapsed": round(time.perf_counter() - start, 3),
+        }
+        ledger = COST_LEDGER.get()
+        if ledger is not None:
+            ledger.add(call)
+        emit_event(EVENT_LLM_CALL, **call)
+
+    def _model_name(self) -> str:
+        config = getattr(self.llm, "config", None)
+        return getattr(config, "model", None) or getattr(self.llm, "model", "") or ""
+
+    def _sampling_params(self) -> Dict[str, Any]:
+        config = getattr(self.llm, "config", None)
+        return {name: getattr(config, name, None) for name in ("temperature", "top_p", "max_token")}
 
 # 政策修订动作
-class PolicyRevision(Action):
+class PolicyRevision(DiscussionAction):
     # 基于经济学家反馈修订政策
     
     PROMPT_TEMPLATE: str = """
@@ -52,6 +349,7 @@ class PolicyRevision(Action):
     2. [修改2及理由，来源反馈]
     """
     name: str = "PolicyRevision"
+    call_kind: ClassVar[str] = CALL_REVISION
 
     async def run(self, context: str, name1: str, opponent_name1: str):
         prompt = self.PROMPT_TEMPLATE.format(context=context, name1=name1, opponent_name1=opponent_name1)
@@ -59,7 +357,7 @@ class PolicyRevision(Action):
         return rsp
 
 # 经济反馈动作
-class EconomicFeedback(Action):
+class EconomicFeedback(DiscussionAction):
     # 提供严谨的经济分析
     
     PROMPT_TEMPLATE: str = """
@@ -112,7 +410,7 @@ class EconomicFeedback(Action):
         return rsp
 
 # 环境反馈动作
-class EnvironmentalFeedback(Action):
+class EnvironmentalFeedback(DiscussionAction):
     # 评估政策对环境的影响
     
     PROMPT_TEMPLATE: str = """
@@ -164,7 +462,7 @@ class EnvironmentalFeedback(Action):
         return rsp
 
 # 法律合规审查动作
-class LegalComplianceReview(Action):
+class LegalComplianceReview(DiscussionAction):
     # 确保政策符合航空法规
     
     PROMPT_TEMPLATE: str = """
@@ -218,7 +516,7 @@ class LegalComplianceReview(Action):
         return rsp
 
 # 制造反馈动作
-class ManufacturingFeedback(Action):
+class ManufacturingFeedback(DiscussionAction):
     # 评估政策对生产的影响
     
     PROMPT_TEMPLATE: str = """
@@ -273,7 +571,7 @@ class ManufacturingFeedback(Action):
         return rsp
 
 # 物流反馈动作
-class LogisticsFeedback(Action):
+class LogisticsFeedback(DiscussionAction):
     # 评估政策对运营的影响
     
     PROMPT_TEMPLATE: str = """
@@ -324,7 +622,7 @@ class LogisticsFeedback(Action):
         return rsp
 
 # 基础设施反馈动作
-class InfrastructureFeedback(Action):
+class InfrastructureFeedback(DiscussionAction):
     # 评估政策对建设的影响
     
     PROMPT_TEMPLATE: str = """
@@ -386,11 +684,17 @@ class PolicyMaker(Role):
     def __init__(self, **data: Any):
         super().__init__(**data)
         self.policy_versions = []
+        self.context_builder = ContextBuilder()
         self.set_actions([PolicyRevision])
         self._watch([UserRequirement, EconomicFeedback, EnvironmentalFeedback, 
                     LegalComplianceReview, ManufacturingFeedback, LogisticsFeedback, 
                     InfrastructureFeedback])
 
+    async def react(self) -> Message:
+        CURRENT_ROLE.set(self.name)  # 本次行动中的LLM调用记到本角色名下
+        with trace_span("act", role=self.name):
+            return await super().react()
+
     async def _observe(self) -> int:
         await super()._observe()
         logger.debug(f"{self.name} 收到原始消息: {len(self.rc.news)} 条")
@@ -425,14 +729,10 @@ class PolicyMaker(Role):
         todo = self.rc.todo
 
         memories = self.get_memories()
-        context = "\n".join(f"{msg.sent_from}: {msg.content}" for msg in memories)
+        context = self.context_builder.build(memories, self.name)
 
         rsp = await todo.run(context=context, name1=self.name1, opponent_name1="专家团队")
         
-        # 统一格式输出 (压缩为单行)
-        rsp_oneline = rsp.replace('\n', '\\n').replace('\r', '')
-        logger.info(f"[ROUND_{CURRENT_ROUND}|{self.name}|{rsp_oneline}]")
-        
         msg = Message(
             content=rsp,
             role=self.profile,
@@ -440,19 +740,55 @@ class PolicyMaker(Role):
             sent_from=self.name,
             send_to=None,
         )
+        record_response(self, msg)
         self.rc.memory.add(msg)
         self.policy_versions.append(rsp)
         return msg
 
+def extract_raised_issues(content: str) -> List[str]:
+    """提取专家发言中编号列出的问题（建议部分之前的编号项）"""
+    problem_part = re.split(r"建议(?:改进|修改)[:：]", content)[0]
+    return [re.sub(r"^\s*\d+\.\s*", "", line).strip()
+            for line in problem_part.split("\n") if re.match(r"^\s*\d+\.", line)]
+
+def char_bigrams(text: str) -> set:
+    """字符二元组集合（适用于不分词的中文文本）"""
+    chars = [ch for ch in text if ch.isalnum()]
+    return {a + b for a, b in zip(chars, chars[1:])}
+
 # 所有专家的基类
 class ExpertRole(Role):
+    # 各专家领域关键词（用于关联度检查）
+    EXPERTISE_KEYWORDS: ClassVar[Dict[str, List[str]]] = {
+        "经济顾问": ["投资", "成本", "收益", "经济", "市场", "财税", "融资"],
+        "环境学家": ["环境", "噪音", "污染", "生态", "碳排放", "环保"],
+        "合规律师": ["法律", "法规", "合规", "标准", "监管", "许可"],
+        "制造商": ["制造", "生产", "技术", "设备", "认证", "产品"],
+        "物流公司": ["物流", "配送", "运营", "效率", "空域", "通道"],
+        "基建公司": ["基础设施", "建设", "系统", "平台", "监控"]
+    }
+    # 发言判断模式："llm" 每次询问LLM；"local" 本地评分，仅在模糊区间内回退LLM
+    gate_mode: str = "llm"
+    # 本地评分模糊区间：低于下限直接跳过，不低于上限直接发言，区间内交由LLM判断
+    gate_band_low: float = 0.2
+    gate_band_high: float = 0.6
+    # 上轮问题与新修改的字符重合率达到该值即视为已处理
+    issue_addressed_overlap: float = 0.3
+
     def __init__(self,**data:Any):
         super().__init__(**data)
+        self.context_builder = ContextBuilder()
         # 观察政策修订和其他专家的反馈
         self._watch([PolicyRevision, UserRequirement])
     
+    async def react(self) -> Message:
+        CURRENT_ROLE.set(self.name)  # 本次行动中的LLM调用记到本角色名下
+        with trace_span("act", role=self.name):
+            return await super().react()
+
     async def decide_to_speak(self) -> bool:
         """判断是否需要在本轮发言（增强版：冷却机制+关联度检查）"""
+        CURRENT_ROLE.set(self.name)
         memories = self.get_memories()
         
         # 如果是第一轮(没有历史记忆),肯定需要发言
@@ -470,34 +806,77 @@ class ExpertRole(Role):
         
         # 如果连续2轮都发言了，本轮降低参与概率
         if recent_speeches >= 2:
-            import random
-            if random.random() > 0.3:  # 70%概率跳过
+            if DISCUSSION_RNG.get().random() > 0.3:  # 70%概率跳过
                 logger.info(f"{self.name}: 已连续{recent_speeches}轮发言，本轮休息")
                 return False
         
-        # 关联度检查：检查最新政策是否涉及本专家领域
-        expertise_keywords = {
-            "经济顾问": ["投资", "成本", "收益", "经济", "市场", "财税", "融资"],
-            "环境学家": ["环境", "噪音", "污染", "生态", "碳排放", "环保"],
-            "合规律师": ["法律", "法规", "合规", "标准", "监管", "许可"],
-            "制造商": ["制造", "生产", "技术", "设备", "认证", "产品"],
-            "物流公司": ["物流", "配送", "运营", "效率", "空域", "通道"],
-            "基建公司": ["基础设施", "建设", "系统", "平台", "监控"]
-        }
+        if self.gate_mode == "local":
+            score, relevance, unaddressed = self.local_gate_score(memories)
+            detail = f"评分:{score:.2f}，关联度:{relevance}，未解决问题:{unaddressed}"
+            if score >= self.gate_band_high:
+                logger.info(f"{self.name}: 本地判断需要发言（{detail}）")
+                return True
+            if score < self.gate_band_low:
+                logger.info(f"{self.name}: 本地判断无需发言（{detail}）")
+                return False
+            logger.info(f"{self.name}: 本地评分处于模糊区间（{detail}），交由LLM判断")
+            return await self._ask_to_speak(memories, relevance, recent_speeches)
         
+        # 关联度检查：检查最新政策是否涉及本专家领域
         latest_policy = ""
         for msg in reversed(memories[-5:]):
             if msg.sent_from == "政策部门":
                 latest_policy = msg.content[:500]
                 break
         
-        my_keywords = expertise_keywords.get(self.name, [])
+        my_keywords = self.EXPERTISE_KEYWORDS.get(self.name, [])
         relevance = sum(1 for kw in my_keywords if kw in latest_policy)
         
         if relevance == 0:
             logger.info(f"{self.name}: 最新政策与我的领域关联度低（0关键词），无需发言")
             return False
         
+        return await self._ask_to_speak(memories, relevance, recent_speeches)
+
+    def local_gate_score(self, memories: List[Message]) -> Tuple[float, int, int]:
+        """本地发言评分：自上次发言以来的政策修改关联度 + 自己提出但仍未解决的问题"""
+        last_turn = -1
+        for i, msg in enumerate(memories):
+            if msg.sent_from == self.name:
+                last_turn = i
+        
+        # 自上次发言以来的政策修改（优先取"所做修改"部分）
+        changes = []
+        for msg in memories[last_turn + 1:]:
+            if msg.sent_from == "政策部门":
+                content = msg.content
+                changes.append(content.split("所做修改:")[-1] if "所做修改:" in content else content)
+        if not changes:
+            return 0.0, 0, 0
+        changes_text = "\n".join(changes)
+        
+        my_keywords = self.EXPERTISE_KEYWORDS.get(self.name, [])
+        relevance = sum(1 for kw in my_keywords if kw in changes_text)
+        score = relevance / max(len(my_keywords), 1)
+        
+        # 检查上次提出的问题是否在新修改中得到回应
+        unaddressed = 0
+        issues = extract_raised_issues(memories[last_turn].content) if last_turn >= 0 else []
+        if issues:
+            change_grams = char_bigrams(changes_text)
+            for issue in issues:
+                issue_grams = char_bigrams(issue)
+                if not issue_grams:
+                    continue
+                overlap = len(issue_grams & change_grams) / len(issue_grams)
+                if overlap < self.issue_addressed_overlap:
+                    unaddressed += 1
+            score += 0.5 * unaddressed / len(issues)
+        
+        return min(score, 1.0), relevance, unaddressed
+
+    async def _ask_to_speak(self, memories: List[Message], relevance: int, recent_speeches: int) -> bool:
+        """由LLM判断是否需要发言"""
         # 构建上下文
         context = "\n".join(f"{msg.sent_from}: {msg.content[:200]}..." for msg in memories[-5:])
         
@@ -528,13 +907,17 @@ class ExpertRole(Role):
         try:
             if self.actions:
                 action = self.actions[0]
-                rsp = await action._aask(prompt)
+                rsp = await action._aask(prompt, kind=CALL_GATE)
                 decision = "需要发言" in rsp
                 logger.info(f"{self.name}: {'需要发言' if decision else '无需发言'}（关联度:{relevance}，连续发言:{recent_speeches}）")
                 return decision
         except Exception as e:
-            logger.warning(f"{self.name} 判断失败: {e}，默认无需发言")
-            return False
+            # 调度器重试用尽后回退本地评分：不低于模糊区间下限即发言
+            score, _, _ = self.local_gate_score(memories)
+            decision = score >= self.gate_band_low
+            logger.warning(f"{self.name} LLM判断失败: {e}，按本地评分{score:.2f}判断"
+                           f"{'需要发言' if decision else '无需发言'}")
+            return decision
         
         return False
     
@@ -579,14 +962,10 @@ class EconomicAdvisor(ExpertRole):
         todo = self.rc.todo
 
         memories = self.get_memories()
-        context = "\n".join(f"{msg.sent_from}: {msg.content}" for msg in memories)
+        context = self.context_builder.build(memories, self.name)
 
         rsp = await todo.run(context=context, name2=self.name2)
         
-        # 统一格式输出 (压缩为单行)
-        rsp_oneline = rsp.replace('\n', '\\n').replace('\r', '')
-        logger.info(f"[ROUND_{CURRENT_ROUND}|{self.name}|{rsp_oneline}]")
-
         msg = Message(
             content=rsp,
             role=self.profile,
@@ -594,6 +973,7 @@ class EconomicAdvisor(ExpertRole):
             sent_from=self.name,
             send_to={"政策部门"},
         )
+        record_response(self, msg)
         self.rc.memory.add(msg)
         return msg
 
@@ -611,14 +991,10 @@ class Environmentalist(ExpertRole):
         todo = self.rc.todo
         
         memories = self.get_memories()
-        context = "\n".join(f"{msg.sent_from}: {msg.content}" for msg in memories)
+        context = self.context_builder.build(memories, self.name)
         
         rsp = await todo.run(context=context, name=self.name)
         
-        # 统一格式输出 (压缩为单行)
-        rsp_oneline = rsp.replace('\n', '\\n').replace('\r', '')
-        logger.info(f"[ROUND_{CURRENT_ROUND}|{self.name}|{rsp_oneline}]")
-        
         msg = Message(
             content=rsp,
             role=self.profile,
@@ -626,6 +1002,7 @@ class Environmentalist(ExpertRole):
             sent_from=self.name,
             send_to={"政策部门"},
         )
+        record_response(self, msg)
         self.rc.memory.add(msg)
         return msg
 
@@ -643,14 +1020,10 @@ class ComplianceLawyer(ExpertRole):
         todo = self.rc.todo
         
         memories = self.get_memories()
-        context = "\n".join(f"{msg.sent_from}: {msg.content}" for msg in memories)
+        context = self.context_builder.build(memories, self.name)
         
         rsp = await todo.run(context=context, name=self.name)
         
-        # 统一格式输出 (压缩为单行)
-        rsp_oneline = rsp.replace('\n', '\\n').replace('\r', '')
-        logger.info(f"[ROUND_{CURRENT_ROUND}|{self.name}|{rsp_oneline}]")
-        
         msg = Message(
             content=rsp,
             role=self.profile,
@@ -658,6 +1031,7 @@ class ComplianceLawyer(ExpertRole):
             sent_from=self.name,
             send_to={"政策部门"},
         )
+        record_response(self, msg)
         self.rc.memory.add(msg)
         return msg
 
@@ -676,14 +1050,10 @@ class Manufacturer(ExpertRole):
         todo = self.rc.todo
         
         memories = self.get_memories()
-        context = "\n".join(f"{msg.sent_from}: {msg.content}" for msg in memories)
+        context = self.context_builder.build(memories, self.name)
         
         rsp = await todo.run(context=context, name=self.name)
         
-        # 统一格式输出 (压缩为单行)
-        rsp_oneline = rsp.replace('\n', '\\n').replace('\r', '')
-        logger.info(f"[ROUND_{CURRENT_ROUND}|{self.name}|{rsp_oneline}]")
-        
         msg = Message(
             content=rsp,
             role=self.profile,
@@ -691,6 +1061,7 @@ class Manufacturer(ExpertRole):
             sent_from=self.name,
             send_to={"政策部门"},
         )
+        record_response(self, msg)
         self.rc.memory.add(msg)
         return msg
 
@@ -708,14 +1079,10 @@ class LogisticsCompany(ExpertRole):
         todo = self.rc.todo
         
         memories = self.get_memories()
-        context = "\n".join(f"{msg.sent_from}: {msg.content}" for msg in memories)
+        context = self.context_builder.build(memories, self.name)
         
         rsp = await todo.run(context=context, name=self.name)
         
-        # 统一格式输出 (压缩为单行)
-        rsp_oneline = rsp.replace('\n', '\\n').replace('\r', '')
-        logger.info(f"[ROUND_{CURRENT_ROUND}|{self.name}|{rsp_oneline}]")
-        
         msg = Message(
             content=rsp,
             role=self.profile,
@@ -723,6 +1090,7 @@ class LogisticsCompany(ExpertRole):
             sent_from=self.name,
             send_to={"政策部门"},
         )
+        record_response(self, msg)
         self.rc.memory.add(msg)
         return msg
 
@@ -740,14 +1108,10 @@ class InfrastructureCompany(ExpertRole):
         todo = self.rc.todo
         
         memories = self.get_memories()
-        context = "\n".join(f"{msg.sent_from}: {msg.content}" for msg in memories)
+        context = self.context_builder.build(memories, self.name)
         
         rsp = await todo.run(context=context, name=self.name)
         
-        # 统一格式输出 (压缩为单行)
-        rsp_oneline = rsp.replace('\n', '\\n').replace('\r', '')
-        logger.info(f"[ROUND_{CURRENT_ROUND}|{self.name}|{rsp_oneline}]")
-        
         msg = Message(
             content=rsp,
             role=self.profile,
@@ -755,6 +1119,7 @@ class InfrastructureCompany(ExpertRole):
             sent_from=self.name,
             send_to={"政策部门"},
         )
+        record_response(self, msg)
         self.rc.memory.add(msg)
         return msg
 
@@ -786,83 +1151,38 @@ class ConsensusChecker:
 
     @staticmethod
     def analyze(messages: List[Message], current_round: int) -> Dict[str, Any]:
-        results = {
-            # 共识分数
-            "agree_score": 0,
-            # 赞同分数
-            "positive_score": 0,
-            # 不赞同分数
-            "negative_score": 0,
-            # 中立分数
-            "neutral_score": 0,
-            # 关键议题
-            "key_issues": [],
-            # 政策变化幅度
-            "substantial_changes": 0,
-            # 政策版本
-            "policy_versions": [],
-            # 轮数要求是否达标（True or False)
-            "meets_round_requirement": current_round >= ConsensusChecker.min_round,
-            # 政策是否发生变化（True or False)
-            "meets_change_requirement": False
-        }
+        # 全量分析即对一个新的增量分析器一次性输入全部消息
+        return ConsensusTracker().update(messages, current_round)
 
-        if not messages:
-            return results
+    @staticmethod
+    def score_message(message: Message) -> Tuple[str, float]:
+        """单条消息的共识倾向及加权得分"""
+        role = message.role
+        weight = ConsensusChecker.weights.get(role, 1)  # 默认权重 1
 
-        # 提取所有政策版本
-        policy_versions = [msg.content for msg in messages if "修订后的政策:" in msg.content]
-        results["policy_versions"] = policy_versions
+        content = message.content.lower()
         
-        # 计算版本间差异
-        substantial_changes = 0
-        for i in range(1, len(policy_versions)):
-            diff = ConsensusChecker.calculate_policy_diff(policy_versions[i-1], policy_versions[i])
-            if diff >= ConsensusChecker.min_diff:
-                substantial_changes += 1
-        results["substantial_changes"] = substantial_changes
-        results["meets_change_requirement"] = substantial_changes >= ConsensusChecker.min_change
-
-        # 分析共识程度（带权重）
-        for message in messages:
-            role = message.role
-            weight = ConsensusChecker.weights.get(role, 1)  # 默认权重 1
-
-            
-            content = message.content.lower()
-            
-            # 检查共识说明
-            if "共识说明:" in content:
-                results["positive_score"] += 2 * weight
-                continue
-            
-            # 检查反对意见
-            has_negative = any(neg in content for neg in ConsensusChecker.negative_words)
-            # 检查赞同意见（确保没有被否定词修饰）
-            has_positive = any(pos in content and not ConsensusChecker.is_negated(pos, content) 
-                            for pos in ConsensusChecker.positive_words)
-
-            if has_negative:
-                score = 2 if "强烈" in content else 1
-                results["negative_score"] += score * weight
-            elif has_positive:
-                score = 2 if "强烈" in content else 1
-                results["positive_score"] += score * weight
-            else:
-                results["neutral_score"] += 1 * weight
-        
-        # 计算加权共识分数
-        total_weight = sum(ConsensusChecker.weights.values())
-        max_possible = total_weight * 2  # 每个角色最高可得2分
+        # 检查共识说明
+        if "共识说明:" in content:
+            return "positive", 2 * weight
         
-        # 分占比减去负分影响的20%
-        if max_possible > 0:
-            results["agree_score"] = max(0, min(100, 
-                (results["positive_score"] / max_possible * 100) - 
-                (results["negative_score"] / max_possible * 20)))
-        else:
-            results["agree_score"] = 0
-            
+        # 检查反对意见
+        has_negative = any(neg in content for neg in ConsensusChecker.negative_words)
+        # 检查赞同意见（确保没有被否定词修饰）
+        has_positive = any(pos in content and not ConsensusChecker.is_negated(pos, content) 
+                        for pos in ConsensusChecker.positive_words)
+
+        if has_negative:
+            score = 2 if "强烈" in content else 1
+            return "negative", score * weight
+        elif has_positive:
+            score = 2 if "强烈" in content else 1
+            return "positive", score * weight
+        return "neutral", 1 * weight
+
+    @staticmethod
+    def agree_score(positive_score: float, negative_score: float) -> float:
+        """计算加权共识分数"""
         # 共识分数计算过程
         # 政策部门：强烈同意 (2×0.35=0.70)
         # 经济顾问：同意 (1×0.15=0.15)
@@ -878,18 +1198,29 @@ class ConsensusChecker:
         # 积极占比 = 1.15 / 2.0 = 0.575
         # 消极影响 = 0.15 / 2.0 × 0.2 = 0.015
         # 共识分数 = (0.575 - 0.015) × 100 = 56.0
-            
-        if results["negative_score"] > 0:
-            results["key_issues"] = ConsensusChecker.extract_issues(messages)
-            
-        return results
+        total_weight = sum(ConsensusChecker.weights.values())
+        max_possible = total_weight * 2  # 每个角色最高可得2分
+        
+        # 分占比减去负分影响的20%
+        if max_possible > 0:
+            return max(0, min(100, 
+                (positive_score / max_possible * 100) - 
+                (negative_score / max_possible * 20)))
+        return 0
 
     @staticmethod
     def calculate_policy_diff(policy1: str, policy2: str) -> float:
         """计算两个政策版本之间的差异率（0-1）"""
         policy1_clean = policy1.split("修订后的政策:")[-1].strip()
         policy2_clean = policy2.split("修订后的政策:")[-1].strip()
-        return 1 - SequenceMatcher(None, policy1_clean, policy2_clean).ratio()
+        return DIFF_ENGINE.get().diff(policy1_clean, policy2_clean)
+
+    @staticmethod
+    def is_substantial_change(policy1: str, policy2: str) -> bool:
+        """两个政策版本之间是否为实质变更（上界已能判定时跳过精确计算）"""
+        policy1_clean = policy1.split("修订后的政策:")[-1].strip()
+        policy2_clean = policy2.split("修订后的政策:")[-1].strip()
+        return DIFF_ENGINE.get().is_substantial(policy1_clean, policy2_clean, ConsensusChecker.min_diff)
 
     @staticmethod
     def is_negated(keyword: str, text: str) -> bool:
@@ -909,17 +1240,24 @@ class ConsensusChecker:
         """提取关键分歧点"""
         issues = set()
         for message in messages:
-            content = message.content.lower()
-            if any(neg in content for neg in ConsensusChecker.negative_words):
-                markers = ["因为", "由于", "鉴于", "原因:", "问题:"]
-                for marker in markers:
-                    if marker in content:
-                        issue = content.split(marker)[-1].strip()
-                        if issue and len(issue.split()) > 2:
-                            issues.add(issue.capitalize())
-                            break
+            issue = ConsensusChecker.message_issue(message)
+            if issue:
+                issues.add(issue)
         return list(issues)
 
+    @staticmethod
+    def message_issue(message: Message) -> Optional[str]:
+        """提取单条反对意见中的分歧原因"""
+        content = message.content.lower()
+        if any(neg in content for neg in ConsensusChecker.negative_words):
+            markers = ["因为", "由于", "鉴于", "原因:", "问题:"]
+            for marker in markers:
+                if marker in content:
+                    issue = content.split(marker)[-1].strip()
+                    if issue and len(issue.split()) > 2:
+                        return issue.capitalize()
+        return None
+
     @staticmethod
     def reached(analysis_result: Dict[str, Any]) -> bool:
         """检查是否达成共识"""
@@ -927,14 +1265,147 @@ class ConsensusChecker:
                 analysis_result["meets_round_requirement"] and
                 analysis_result["meets_change_requirement"])
 
-# 政策推演流程
-CURRENT_ROUND = 0  # 全局轮次变量
+class ConsensusTracker:
+    """增量共识分析：每次只处理新增消息，结果与对全部消息调用 ConsensusChecker.analyze 一致"""
+
+    def __init__(self):
+        self.positive_score = 0
+        self.negative_score = 0
+        self.neutral_score = 0
+        self.policy_versions: List[str] = []
+        self.substantial_changes = 0
+        self.issues = set()
+        self.message_count = 0
+
+    def update(self, new_messages: List[Message], current_round: int) -> Dict[str, Any]:
+        for message in new_messages:
+            self._ingest(message)
+        return self.results(current_round)
+
+    def _ingest(self, message: Message):
+        self.message_count += 1
+
+        # 新政策版本只需与上一版本比较
+        if "修订后的政策:" in message.content:
+            if self.policy_versions:
+                if ConsensusChecker.is_substantial_change(self.policy_versions[-1], message.content):
+                    self.substantial_changes += 1
+            self.policy_versions.append(message.content)
+
+        kind, score = ConsensusChecker.score_message(message)
+        if kind == "positive":
+            self.positive_score += score
+        elif kind == "negative":
+            self.negative_score += score
+        else:
+            self.neutral_score += score
 
-async def policy_development(idea: str, investment: float = 3.0, max_round: int = 10):
-    # 运行政策推演流程
-    global CURRENT_ROUND
-    CURRENT_ROUND = 0
-    
+        issue = ConsensusChecker.message_issue(message)
+        if issue:
+            self.issues.add(issue)
+
+    def results(self, current_round: int) -> Dict[str, Any]:
+        results = {
+            # 共识分数
+            "agree_score": 0,
+            # 赞同分数
+            "positive_score": self.positive_score,
+            # 不赞同分数
+            "negative_score": self.negative_score,
+            # 中立分数
+            "neutral_score": self.neutral_score,
+            # 关键议题
+            "key_issues": [],
+            # 政策变化幅度
+            "substantial_changes": self.substantial_changes,
+            # 政策版本
+            "policy_versions": list(self.policy_versions),
+            # 轮数要求是否达标（True or False)
+            "meets_round_requirement": current_round >= ConsensusChecker.min_round,
+            # 政策是否发生变化（True or False)
+            "meets_change_requirement": self.substantial_changes >= ConsensusChecker.min_change
+        }
+        if self.message_count == 0:
+            return results
+
+        results["agree_score"] = ConsensusChecker.agree_score(self.positive_score, self.negative_score)
+        if self.negative_score > 0:
+            results["key_issues"] = list(self.issues)
+        return results
+
+class TranscriptStore:
+    """只追加的讨论记录（供共识分析使用）：各角色记忆中的消息只保存一次并分配稳定序号"""
+
+    def __init__(self):
+        self._messages: List[Message] = []
+        # 消息id -> 序号
+        self._index: Dict[str, int] = {}
+        # 角色名 -> 已同步的记忆条数
+        self._synced: Dict[str, int] = {}
+
+    def __len__(self) -> int:
+        return len(self._messages)
+
+    def add(self, message: Message) -> int:
+        """记录消息并返回其序号；同一消息被多个角色持有时只保存一次"""
+        seq = self._index.get(message.id)
+        if seq is None:
+            seq = len(self._messages)
+            self._index[message.id] = seq
+            self._messages.append(message)
+        return seq
+
+    def sync(self, role: Role):
+        """将角色记忆中新增的消息同步到记录中"""
+        memories = role.get_memories()
+        for message in memories[self._synced.get(role.name, 0):]:
+            self.add(message)
+        self._synced[role.name] = len(memories)
+
+    def since(self, seq: int) -> List[Message]:
+        """序号不小于 seq 的消息"""
+        return self._messages[seq:]
+
+# 政策推演流程
+CURRENT_ROUND: ContextVar[int] = ContextVar("CURRENT_ROUND", default=0)  # 当前讨论轮次（每个讨论任务独立）
+
+async def run_experts_concurrently(speaking_experts: List[ExpertRole], max_concurrency: int) -> List[Message]:
+    """并发执行本轮所有发言专家，所有专家基于同一政策快照给出反馈"""
+    semaphore = asyncio.Semaphore(max(1, max_concurrency))
+
+    async def _speak(expert: ExpertRole) -> Message:
+        async with semaphore:
+            return await expert.run()
+
+    responses = await asyncio.gather(*(_speak(expert) for expert in speaking_experts))
+    return [rsp for rsp in responses if rsp]
+
+async def gate_experts(experts: List[ExpertRole], max_concurrency: int) -> List[ExpertRole]:
+    """并发判断所有专家是否发言，并记录每位专家的判断耗时"""
+    semaphore = asyncio.Semaphore(max(1, max_concurrency))
+
+    async def _decide(expert: ExpertRole) -> bool:
+        async with semaphore:
+            start = time.perf_counter()
+            with trace_span("decide_to_speak", role=expert.name) as span:
+                should_speak = await expert.decide_to_speak()
+                span.set(speak=should_speak)
+            elapsed = time.perf_counter() - start
+            logger.info(f"{expert.name}: 发言判断耗时 {elapsed:.2f}s（{'发言' if should_speak else '跳过'}）")
+            emit_event(EVENT_GATE, round=CURRENT_ROUND.get(), role=expert.name, speak=should_speak,
+                       elapsed=round(elapsed, 3))
+            return should_speak
+
+    start = time.perf_counter()
+    with trace_span("gating", experts=len(experts)):
+        decisions = await asyncio.gather(*(_decide(expert) for expert in experts))
+    logger.info(f"发言判断阶段总耗时 {time.perf_counter() - start:.2f}s")
+    return [expert for expert, should_speak in zip(experts, decisions) if should_speak]
+
+async def run_discussion_rounds(idea: str, investment: float, max_round: int, concurrent: bool,
+                                max_concurrency: int, gate_mode: str, gate_band: Tuple[float, float],
+                                context_budget: int) -> Dict[str, Any]:
+    """组建团队并进行多轮讨论，直到达成共识或达到最大轮数"""
     # 初始化所有角色
     policy_maker = PolicyMaker(
         name="政策部门",
@@ -999,71 +1470,91 @@ async def policy_development(idea: str, investment: float = 3.0, max_round: int
         logistics_company,
         infrastructure_company
     ]
+    for expert in all_experts:
+        expert.gate_mode = gate_mode
+        expert.gate_band_low, expert.gate_band_high = gate_band
+    for role in [policy_maker] + all_experts:
+        role.context_builder.token_budget = context_budget
+
+    # 共享讨论记录与增量共识分析器（政策部门优先同步，保证消息按发生顺序记录）
+    transcript = TranscriptStore()
+    consensus_tracker = ConsensusTracker()
 
     # 多轮讨论：专家自主判断是否发言
     while rounds < max_round and not consensus:
         rounds += 1
-        CURRENT_ROUND = rounds  # 更新全局轮次
-        logger.info(f"\n{'='*20} 第 {rounds} 轮讨论 {'='*20}")
+        CURRENT_ROUND.set(rounds)  # 更新当前轮次
+        with trace_span("round", round=rounds):
+            logger.info(f"\n{'='*20} 第 {rounds} 轮讨论 {'='*20}")
+            emit_event(EVENT_ROUND_START, round=rounds)
         
-        # 步骤1：广播当前政策给所有专家
-        team.run_project(idea, send_to=None)  # None表示广播给所有人
+            # 步骤1：广播当前政策给所有专家
+            team.run_project(idea, send_to=None)  # None表示广播给所有人
         
-        # 步骤2：每个专家自主判断是否需要发言
-        speaking_experts = []
-        for expert in all_experts:
-            should_speak = await expert.decide_to_speak()
-            if should_speak:
-                speaking_experts.append(expert)
+            # 步骤2：所有专家同时自主判断是否需要发言（与 Team.run 一样，每个阶段前检查预算）
+            team._check_balance()
+            speaking_experts = await gate_experts(all_experts, max_concurrency)
         
-        logger.info(f"本轮发言专家: {[e.name for e in speaking_experts]}")
+            logger.info(f"本轮发言专家: {[e.name for e in speaking_experts]}")
         
-        # 步骤3：所有专家依次发言，然后政策部门统一修订
-        if speaking_experts:
-            # 让所有专家发言
-            for expert in speaking_experts:
-                team.run_project(idea, send_to=expert.name)
-            
-            # 运行一轮：所有专家发言 + 政策部门修订
-            await team.run(n_round=len(speaking_experts) + 1)
-        else:
-            logger.info("本轮无专家发言，政策保持不变") 
-
-        # 收集所有消息
-        all_messages = []
-        for role in [policy_maker, economic_advisor, environmentalist, compliance_lawyer, 
-                    manufacturer, logistics_company, infrastructure_company]:
-            all_messages.extend(role.get_memories())
+            # 步骤3：所有专家依次发言，然后政策部门统一修订
+            if speaking_experts:
+                # 让所有专家发言
+                for expert in speaking_experts:
+                    team.run_project(idea, send_to=expert.name)
             
-        analysis = ConsensusChecker.analyze(all_messages, rounds)
-        round_results.append(analysis)
-
-        # 输出轮次摘要
-        logger.info(f"\n=== 第 {rounds} 轮摘要 ===")
-        logger.info(f"共识分数: {analysis['agree_score']:.1f}/100")
-        logger.info(f"实质变更: {analysis['substantial_changes']}/{ConsensusChecker.min_change} 需满足")
-        logger.info(f"完成轮数: {rounds}/{ConsensusChecker.min_round} 最低要求")
+                if concurrent:
+                    # 并发模式：专家同时发言，全部返回后政策部门再统一修订；
+                    # 不经过 Team.run，超出投入预算时同样抛出 NoMoneyException
+                    team._check_balance()
+                    await run_experts_concurrently(speaking_experts, max_concurrency)
+                    team._check_balance()
+                    await policy_maker.run()
+                else:
+                    # 运行一轮：所有专家发言 + 政策部门修订
+                    await team.run(n_round=len(speaking_experts) + 1)
+            else:
+                logger.info("本轮无专家发言，政策保持不变") 
+
+            # 将各角色新增的记忆同步到共享记录（广播消息只记录一次），增量更新共识分析
+            with trace_span("consensus_analysis"):
+                synced = len(transcript)
+                for role in [policy_maker] + all_experts:
+                    transcript.sync(role)
+                analysis = consensus_tracker.update(transcript.since(synced), rounds)
+            round_results.append(analysis)
+
+            # 输出轮次摘要
+            logger.info(f"\n=== 第 {rounds} 轮摘要 ===")
+            logger.info(f"共识分数: {analysis['agree_score']:.1f}/100")
+            logger.info(f"实质变更: {analysis['substantial_changes']}/{ConsensusChecker.min_change} 需满足")
+            logger.info(f"完成轮数: {rounds}/{ConsensusChecker.min_round} 最低要求")
         
-        # 输出关键问题
-        if analysis["key_issues"]:
-            logger.warning("未解决问题:")
-            for issue in analysis["key_issues"]:
-                logger.warning(f" - {issue}")
+            # 输出关键问题
+            if analysis["key_issues"]:
+                logger.warning("未解决问题:")
+                for issue in analysis["key_issues"]:
+                    logger.warning(f" - {issue}")
         
-        consensus = ConsensusChecker.reached(analysis)
+            consensus = ConsensusChecker.reached(analysis)
         
-        # 强制最小讨论轮数
-        if rounds < ConsensusChecker.min_round:
-            logger.info("未达到最低讨论轮数，继续讨论...")
-            consensus = False
+            # 强制最小讨论轮数
+            if rounds < ConsensusChecker.min_round:
+                logger.info("未达到最低讨论轮数，继续讨论...")
+                consensus = False
         
-        if analysis["substantial_changes"] < ConsensusChecker.min_change:
-            logger.info("实质变更不足，继续讨论...")
-            consensus = False
+            if analysis["substantial_changes"] < ConsensusChecker.min_change:
+                logger.info("实质变更不足，继续讨论...")
+                consensus = False
 
-        # 保存最新政策版本
-        if policy_maker.policy_versions:
-            final_policy = policy_maker.policy_versions[-1]
+            emit_event(EVENT_CONSENSUS, round=rounds, agree_score=round(analysis["agree_score"], 2),
+                       positive_score=analysis["positive_score"], negative_score=analysis["negative_score"],
+                       neutral_score=analysis["neutral_score"], substantial_changes=analysis["substantial_changes"],
+                       key_issues=analysis["key_issues"], reached=consensus)
+
+            # 保存最新政策版本
+            if policy_maker.policy_versions:
+                final_policy = policy_maker.policy_versions[-1]
 
     # 最终结果
     final_result = round_results[-1] if round_results else {}
@@ -1104,6 +1595,80 @@ async def policy_development(idea: str, investment: float = 3.0, max_round: int
         if final_result.get('agree_score', 0) < ConsensusChecker.min_score:
             logger.warning(f"- 共识分数 {final_result.get('agree_score', 0):.1f} 低于最低要求 {ConsensusChecker.min_score}")
 
+    return {
+        "idea": idea,
+        "consensus": consensus,
+        "rounds": rounds,
+        "final_policy": extract_policy_text(final_policy),
+        "consensus_trajectory": [round(result["agree_score"], 2) for result in round_results],
+        "substantial_changes": final_result.get("substantial_changes", 0),
+        "key_issues": final_result.get("key_issues", []),
+        "cost": team.cost_manager.total_cost,
+    }
+
+async def policy_development(idea: str, investment: float = 3.0, max_round: int = 10,
+                             concurrent: bool = False, max_concurrency: int = 6,
+                             gate_mode: str = "llm", gate_band: Tuple[float, float] = (0.2, 0.6),
+                             context_budget: int = CONTEXT_TOKEN_BUDGET, cache_mode: str = BYPASS,
+                             record_to: str = "", replay_from: str = "", replay_match: str = MATCH_HASH,
+                             replay_latency: bool = False, seed: Optional[int] = None,
+                             diff_engine: str = "clause", discussion_id: str = "",
+                             trace_to: str = "") -> Dict[str, Any]:
+    # 运行政策推演流程
+    CURRENT_ROUND.set(0)
+    # 冷却机制使用本讨论独立的随机数生成器，固定种子时录制与回放得到一致的发言顺序（并发讨论互不影响）
+    DISCUSSION_RNG.set(random.Random(seed))
+    DIFF_ENGINE.set(get_diff_engine(diff_engine))
+    cache = LLMCache(mode=cache_mode) if cache_mode != BYPASS else None
+    recorder = TranscriptRecorder(record_to) if record_to else None
+    replayer = TranscriptReplayer(replay_from, replay_match, replay_latency) if replay_from else None
+    event_log = EventLog(discussion_id or new_discussion_id())
+    ledger = CostLedger()
+    tracer = Tracer(trace_to) if trace_to else None
+    LLM_CACHE.set(cache)
+    LLM_RECORDER.set(recorder)
+    LLM_REPLAYER.set(replayer)
+    EVENT_LOG.set(event_log)
+    COST_LEDGER.set(ledger)
+    TRACER.set(tracer)
+
+    emit_event(EVENT_RUN_STATUS, status="started", idea=idea, max_round=max_round, concurrent=concurrent,
+               gate_mode=gate_mode)
+    try:
+        with trace_span("discussion", discussion_id=event_log.discussion_id, max_round=max_round):
+            result = await run_discussion_rounds(idea, investment, max_round, concurrent, max_concurrency,
+                                                 gate_mode, gate_band, context_budget)
+    except BaseException as e:
+        emit_event(EVENT_RUN_STATUS, status="failed", error=f"{type(e).__name__}: {e}")
+        raise
+    else:
+        emit_event(EVENT_RUN_STATUS, status="completed", consensus=result["consensus"], rounds=result["rounds"])
+        result["discussion_id"] = event_log.discussion_id
+        result["llm_usage"] = ledger.totals()
+        return result
+    finally:
+        if cache is not None:
+            logger.info(f"LLM缓存统计: {cache.stats()}")
+            cache.close()
+            LLM_CACHE.set(None)
+        if recorder is not None:
+            logger.info(f"LLM调用已录制到: {recorder.path}")
+            recorder.close()
+            LLM_RECORDER.set(None)
+        if replayer is not None:
+            logger.info(f"已回放 {replayer.served} 次LLM调用")
+            LLM_REPLAYER.set(None)
+        logger.info(f"LLM调度统计: {LLM_DISPATCHER.stats()}")
+        logger.info(f"LLM请求token与花费（按角色/轮次/调用类型；真实请求优先使用服务商报告的token数）:\n{ledger.format_table()}")
+        COST_LEDGER.set(None)
+        if tracer is not None:
+            logger.info(f"计时记录已保存到: {tracer.save()}（可用 chrome://tracing 或 ui.perfetto.dev 打开）")
+            TRACER.set(None)
+        if get_http_pool() is not None:
+            logger.info(f"HTTP连接池统计: {get_http_pool().stats()}")
+        event_log.close()
+        EVENT_LOG.set(None)
+
 # 提取政策文本
 def extract_policy_text(full_text: str) -> str:
     """从完整消息中提取政策部分"""
@@ -1113,17 +1678,57 @@ def extract_policy_text(full_text: str) -> str:
     return full_text
 
 # 主函数
-def main(idea: str, investment: float = 3.0, n_round: int = 10):
+def main(idea: str, investment: float = 3.0, n_round: int = 10,
+         concurrent: bool = False, max_concurrency: int = 6,
+         gate_mode: str = "llm", gate_band: Tuple[float, float] = (0.2, 0.6),
+         context_budget: int = CONTEXT_TOKEN_BUDGET, cache_mode: str = BYPASS,
+         record_to: str = "", replay_from: str = "", replay_match: str = MATCH_HASH,
+         replay_latency: bool = False, seed: Optional[int] = None, diff_engine: str = "clause",
+         discussion_id: str = "", llm_rpm: float = 0, llm_tpm: float = 0, max_llm_calls: int = 0,
+         llm_max_retries: int = 4, hedge_actions: Union[str, Sequence[str]] = (), hedge_percentile: float = 0.95,
+         hedge_budget: float = 0.1, http_pool: bool = True, http_max_connections: int = 64, trace_to: str = ""):
     """
     :param idea: 政策提案，例如 "对进口零部件征收40%的关税"
 
     :param investment: 讨论预算
     :param n_round: 最大讨论轮数（强制执行最低3轮）
+    :param concurrent: 是否启用并发轮次模式（专家同时发言，政策部门最后修订）
+    :param max_concurrency: 同时进行发言判断/发言的专家数上限
+    :param gate_mode: 发言判断模式，"llm" 或 "local"（本地评分，仅模糊区间调用LLM）
+    :param gate_band: 本地评分模糊区间 (下限, 上限)
+    :param context_budget: 每次动作中讨论历史的token预算
+    :param cache_mode: LLM响应缓存模式，read_through / write_only / bypass（默认不使用缓存）
+    :param record_to: 将本次讨论的所有LLM调用录制到该JSONL文件
+    :param replay_from: 从录制文件回放LLM响应（不调用真实LLM）
+    :param replay_match: 回放匹配方式，hash（按提示词内容）或 order（按每个动作与调用类型内的发起顺序）
+    :param replay_latency: 回放时是否按录制时的耗时模拟延迟
+    :param seed: 随机种子（录制与回放时应保持一致）
+    :param diff_engine: 政策差异引擎，clause（条款级，默认）或 char（字符级）
+    :param discussion_id: 讨论ID（事件文件名 logs/events/<discussion_id>.jsonl，已存在时续写），默认按时间生成
+    :param llm_rpm: 每分钟LLM请求数上限（0 表示不限制）
+    :param llm_tpm: 每分钟LLM token数上限（0 表示不限制）
+    :param max_llm_calls: 同时进行的LLM调用数上限（0 表示不限制）
+    :param llm_max_retries: LLM调用遇到限流、超时等错误时的最多重试次数
+    :param hedge_actions: 启用对冲请求的动作名（逗号分隔，如 LegalComplianceReview,PolicyRevision；gate 为发言判断；all 为全部）
+    :param hedge_percentile: 调用超过该动作历史耗时的此分位数仍未返回时发出对冲请求
+    :param hedge_budget: 对冲请求数占请求总数的比例上限
+    :param http_pool: 是否让所有动作共享一个保持连接的HTTP连接池（需要安装 httpx，安装 h2 时启用HTTP/2）
+    :param http_max_connections: 共享连接池的连接数上限
+    :param trace_to: 将讨论、轮次、发言判断、动作、LLM调用等环节的嵌套计时保存为该 Chrome trace JSON 文件
     """
     if platform.system() == "Windows":
         asyncio.set_event_loop_policy(asyncio.WindowsSelectorEventLoopPolicy())
     n_round = max(n_round, 3)
-    asyncio.run(policy_development(idea, investment, n_round))
+    configure_llm_dispatcher(max_llm_calls, llm_rpm, llm_tpm, llm_max_retries,
+                             hedge_actions, hedge_percentile, hedge_budget)
+    configure_http_pool(http_pool, http_max_connections)
+    asyncio.run(with_http_pool(policy_development(idea, investment, n_round,
+                                                  concurrent=concurrent, max_concurrency=max_concurrency,
+                                                  gate_mode=gate_mode, gate_band=tuple(gate_band),
+                                                  context_budget=context_budget, cache_mode=cache_mode,
+                                                  record_to=record_to, replay_from=replay_from, replay_match=replay_match,
+                                                  replay_latency=replay_latency, seed=seed, diff_engine=diff_engine,
+                                                  discussion_id=discussion_id, trace_to=trace_to)))
 
 if __name__ == "__main__":
     fire.Fire(main)
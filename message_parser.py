@@ -0,0 +1,278 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+角色回复的结构化解析（评分、同意程度、问题、建议、修订政策、修改列表）
+
+讨论进程在每次动作返回时解析一次并写入事件文件，Web服务器直接读取解析结果。
+"""
+
+import re
+from typing import Dict, List
+
+# 评分
+SCORE_PATTERNS = [re.compile(pattern) for pattern in (
+    r"可接受性评分[:：]\s*(\d+)/10",
+    r"环境影响评分[:：]\s*(\d+)/10",
+    r"合规风险评分[:：]\s*(\d+)/10",
+    r"可制造性评分[:：]\s*(\d+)/10",
+    r"运营可行性评分[:：]\s*(\d+)/10",
+    r"基础设施可行性评分[:：]\s*(\d+)/10"
+)]
+AGREEMENT_PATTERN = re.compile(r"同意程度[:：]\s*(强烈反对|反对|中立|同意|强烈同意)")
+POLICY_PATTERN = re.compile(r"修订后的政策[:：]\s*(.*?)\s*所做修改", re.DOTALL)
+
+# 各专家回复的问题/建议小节标题
+EXPERT_SECTIONS = [
+    ("关键经济问题", "建议改进"),
+    ("关键环境问题", "建议改进"),
+    ("法规合规问题", "建议修改"),
+    ("制造问题", "建议修改"),
+    ("物流运营问题", "建议修改"),
+    ("基础设施开发问题", "建议修改"),
+]
+
+_SCORE_SECTION_ENDS = [
+    r"\n可接受性评分[:：]",
+    r"\n环境影响评分[:：]",
+    r"\n合规风险评分[:：]",
+    r"\n可制造性评分[:：]",
+    r"\n运营可行性评分[:：]",
+    r"\n基础设施可行性评分[:：]",
+    r"\n同意程度[:：]"
+]
+# 编号列表结束位置：下一个小节或评分
+NUMBERED_LIST_ENDS = [re.compile(pattern) for pattern in [
+    r"\n\n[^0-9\-\s].*[:：]",  # 下一个section
+    r"\n建议改进[:：]",
+    r"\n建议修改[:：]",
+] + _SCORE_SECTION_ENDS]
+# 项目符号列表结束位置
+BULLET_LIST_ENDS = [re.compile(pattern) for pattern in [
+    r"\n\n[^-\s].*[:：]",
+] + _SCORE_SECTION_ENDS]
+NUMBERED_ITEM_PATTERN = re.compile(r'^\d+\.')
+# 常见的政策相关关键词
+POLICY_KEYWORDS = [
+    "空域", "无人机", "管理", "监控", "安全", "标准", "制度", "系统",
+    "分层", "区域", "运营", "商业", "准入", "条件", "应急", "响应",
+    "成本", "效益", "投资", "资金", "环境", "污染", "技术", "法规"
+]
+NUMBER_PREFIX_PATTERN = re.compile(r'^\d+\.\s*')
+BULLET_PREFIX_PATTERN = re.compile(r'^[•\-\*]\s*')
+
+
+def extract_structured_content(content: str, role: str, include_raw: bool = True) -> Dict:
+    """提取结构化内容"""
+    result = {
+        "sections": {},
+        "score": None,
+        "agreement": None
+    }
+    if include_raw:
+        result["raw_content"] = content
+
+    # 提取评分
+    for pattern in SCORE_PATTERNS:
+        match = pattern.search(content)
+        if match:
+            result["score"] = int(match.group(1))
+            break
+
+    # 提取同意程度
+    agreement_match = AGREEMENT_PATTERN.search(content)
+    if agreement_match:
+        result["agreement"] = agreement_match.group(1)
+
+    # 根据角色提取不同的结构化信息
+    for problem_section, suggestion_section in EXPERT_SECTIONS:
+        if problem_section in content:
+            result["sections"]["problems"] = extract_numbered_list(content, problem_section)
+            result["sections"]["suggestions"] = extract_bullet_list(content, suggestion_section)
+            break
+    else:
+        if "修订后的政策" in content:
+            # 提取政策内容
+            policy_match = POLICY_PATTERN.search(content)
+            if policy_match:
+                result["sections"]["policy"] = policy_match.group(1).strip()
+            result["sections"]["changes"] = extract_numbered_list(content, "所做修改")
+
+    # 政策历史使用的修订内容与专家建议
+    if role in ("政策制定者", "政策部门"):
+        if "修订后的政策" in content:
+            result["revision"] = extract_policy_revision(content)
+    elif len(content) > 30:
+        result["expert_suggestions"] = extract_expert_suggestions(content, role)
+
+    return result
+
+
+def _section_text(text: str, section_name: str, end_patterns: List[re.Pattern]) -> str:
+    """截取小节标题之后、下一个小节之前的文本；找不到标题返回空串"""
+    start_match = re.search(f"{section_name}[:：]", text)
+    if not start_match:
+        return ""
+    remaining_text = text[start_match.end():]
+
+    end_pos = len(remaining_text)
+    for pattern in end_patterns:
+        match = pattern.search(remaining_text)
+        if match:
+            end_pos = min(end_pos, match.start())
+
+    return remaining_text[:end_pos].strip()
+
+
+def extract_numbered_list(text: str, section_name: str) -> List[str]:
+    """提取编号列表"""
+    try:
+        section_text = _section_text(text, section_name, NUMBERED_LIST_ENDS)
+
+        # 提取编号项目
+        items = []
+        current_item = ""
+
+        for line in section_text.split('\n'):
+            line = line.strip()
+            if NUMBERED_ITEM_PATTERN.match(line):  # 以数字开头
+                if current_item:
+                    items.append(current_item.strip())
+                current_item = line
+            elif current_item and line:  # 续行
+                current_item += " " + line
+
+        if current_item:
+            items.append(current_item.strip())
+
+        return items
+    except Exception:
+        return []
+
+
+def extract_bullet_list(text: str, section_name: str) -> List[str]:
+    """提取项目符号列表"""
+    try:
+        section_text = _section_text(text, section_name, BULLET_LIST_ENDS)
+
+        # 提取项目符号项目
+        items = []
+        current_item = ""
+
+        for line in section_text.split('\n'):
+            line = line.strip()
+            if line.startswith('-') or line.startswith('•'):
+                if current_item:
+                    items.append(current_item.strip())
+                current_item = line[1:].strip()  # 去掉符号
+            elif current_item and line:
+                current_item += " " + line
+
+        if current_item:
+            items.append(current_item.strip())
+
+        return items
+    except Exception:
+        return []
+
+
+def extract_expert_suggestions(content: str, expert_role: str) -> List[Dict]:
+    """从专家消息中提取关键建议"""
+    suggestions = []
+
+    # 常见的建议关键词
+    suggestion_keywords = [
+        "建议", "推荐", "应该", "需要", "必须", "可以考虑", "不如", "最好",
+        "问题", "风险", "挑战", "改进", "优化", "增加", "减少", "修改"
+    ]
+
+    # 按行分析内容
+    lines = content.split('\n')
+    for line in lines:
+        line = line.strip()
+        if len(line) < 10:  # 跳过太短的行
+            continue
+
+        # 检查是否包含建议关键词
+        has_suggestion = any(keyword in line for keyword in suggestion_keywords)
+
+        if has_suggestion:
+            # 清理格式
+            clean_line = NUMBER_PREFIX_PATTERN.sub('', line)
+            clean_line = BULLET_PREFIX_PATTERN.sub('', clean_line)
+
+            if clean_line and len(clean_line) > 15:
+                # 分类建议类型
+                suggestion_type = categorize_suggestion(clean_line)
+
+                suggestions.append({
+                    "text": clean_line,
+                    "type": suggestion_type,
+                    "expert": expert_role,
+                    "keywords": extract_keywords(clean_line)
+                })
+
+    return suggestions
+
+
+def categorize_suggestion(text: str) -> str:
+    """对建议进行分类"""
+    text_lower = text.lower()
+
+    if any(word in text_lower for word in ["经济", "成本", "效益", "投资", "资金", "费用"]):
+        return "经济建议"
+    elif any(word in text_lower for word in ["环境", "污染", "排放", "生态", "绿色"]):
+        return "环境建议"
+    elif any(word in text_lower for word in ["技术", "系统", "设备", "监控", "自动化"]):
+        return "技术建议"
+    elif any(word in text_lower for word in ["法律", "法规", "合规", "标准", "规范"]):
+        return "法规建议"
+    elif any(word in text_lower for word in ["安全", "风险", "应急", "防护"]):
+        return "安全建议"
+    else:
+        return "一般建议"
+
+
+def extract_keywords(text: str) -> List[str]:
+    """从文本中提取关键词"""
+    # 简单的关键词提取
+    keywords = []
+
+    for keyword in POLICY_KEYWORDS:
+        if keyword in text:
+            keywords.append(keyword)
+
+    return keywords[:5]  # 最多返回5个关键词
+
+
+def extract_policy_revision(content: str) -> Dict:
+    """提取政策部门回复中的修订后政策与修改列表（政策历史使用）"""
+    policy_content = ""
+    changes = []
+
+    parts = content.split("修订后的政策:")
+    if len(parts) > 1:
+        policy_part = parts[1]
+
+        # 进一步分割获取政策内容和修改说明
+        if "所做修改:" in policy_part:
+            policy_content, changes_part = policy_part.split("所做修改:")[:2]
+            policy_content = policy_content.strip()
+
+            # 解析修改列表
+            for line in changes_part.split('\n'):
+                line = line.strip()
+                if line and not line.startswith('修改') and len(line) > 5:
+                    # 清理编号和格式
+                    clean_line = NUMBER_PREFIX_PATTERN.sub('', line)
+                    clean_line = BULLET_PREFIX_PATTERN.sub('', clean_line)
+                    if clean_line:
+                        changes.append(clean_line)
+        else:
+            policy_content = policy_part.strip()
+
+    # 如果没有找到标准格式，使用整个内容
+    if not policy_content:
+        policy_content = content
+
+    return {"policy": policy_content, "changes": changes}
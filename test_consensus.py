@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+增量共识分析测试：逐轮增量更新的 ConsensusTracker 与原先每轮对全部消息的完整重算结果一致
+"""
+
+import os
+import random
+import tempfile
+
+import pytest
+
+# metagpt 在导入时按项目根目录写日志并重写工具schema，测试期间指向临时目录以免改动仓库文件
+os.environ.setdefault("METAGPT_PROJECT_ROOT", tempfile.mkdtemp(prefix="metagpt_"))
+
+pytest.importorskip("metagpt.roles")
+
+from metagpt.schema import Message  # noqa: E402
+
+from main import DIFF_ENGINE, ConsensusChecker, ConsensusTracker  # noqa: E402
+from policy_diff import get_diff_engine  # noqa: E402
+
+ROLES = list(ConsensusChecker.weights) + ["未知角色"]
+OPINIONS = [
+    "我们强烈同意该方案",
+    "同意，但需要补充细节",
+    "我反对 因为 审批 流程 过长 成本 太高",
+    "强烈反对 由于 空域 安全 无法 保障",
+    "不 同意 目前 的 条款",
+    "共识说明: 各方已就核心条款达成一致",
+    "需要进一步讨论",
+    "拒绝 鉴于 责任 划分 不 清晰",
+]
+CLAUSES = [
+    "一、低空飞行器实行分类登记管理。", "二、开放120米以下空域用于物流试点。", "三、企业须购买第三者责任险。",
+    "四、设立专项补贴支持基础设施建设。", "五、建立跨部门联合审批机制。", "六、噪声与隐私投诉纳入执法考核。",
+]
+
+
+def full_recompute(messages, current_round):
+    """原先的完整重算：每轮对全部消息重新统计，政策版本两两相邻计算差异率"""
+    results = {
+        "agree_score": 0,
+        "positive_score": 0,
+        "negative_score": 0,
+        "neutral_score": 0,
+        "key_issues": [],
+        "substantial_changes": 0,
+        "policy_versions": [],
+        "meets_round_requirement": current_round >= ConsensusChecker.min_round,
+        "meets_change_requirement": False,
+    }
+    if not messages:
+        return results
+    versions = [msg.content for msg in messages if "修订后的政策:" in msg.content]
+    results["policy_versions"] = versions
+    changes = sum(1 for i in range(1, len(versions))
+                  if ConsensusChecker.calculate_policy_diff(versions[i - 1], versions[i]) >= ConsensusChecker.min_diff)
+    results["substantial_changes"] = changes
+    results["meets_change_requirement"] = changes >= ConsensusChecker.min_change
+    for message in messages:
+        kind, score = ConsensusChecker.score_message(message)
+        results[f"{kind}_score"] += score
+    results["agree_score"] = ConsensusChecker.agree_score(results["positive_score"], results["negative_score"])
+    if results["negative_score"] > 0:
+        results["key_issues"] = ConsensusChecker.extract_issues(messages)
+    return results
+
+
+def make_round(rng: random.Random, round_num: int):
+    policy = rng.sample(CLAUSES, rng.randint(2, len(CLAUSES)))
+    messages = [Message(content=f"第{round_num}轮 修订后的政策: " + "".join(policy), role="政策部门")]
+    for _ in range(rng.randint(0, 6)):
+        messages.append(Message(content=rng.choice(OPINIONS), role=rng.choice(ROLES)))
+    return messages
+
+
+@pytest.mark.parametrize("engine", ["clause", "char"])
+@pytest.mark.parametrize("seed", range(5))
+def test_incremental_matches_full_recompute(engine, seed):
+    token = DIFF_ENGINE.set(get_diff_engine(engine))
+    try:
+        rng = random.Random(seed)
+        tracker = ConsensusTracker()
+        transcript = []
+        for round_num in range(1, 9):
+            new_messages = make_round(rng, round_num)
+            transcript.extend(new_messages)
+            incremental = tracker.update(new_messages, round_num)
+            expected = full_recompute(transcript, round_num)
+            assert sorted(incremental.pop("key_issues")) == sorted(expected.pop("key_issues"))
+            assert incremental == pytest.approx(expected)
+            assert ConsensusChecker.analyze(transcript, round_num)["substantial_changes"] == expected["substantial_changes"]
+    finally:
+        DIFF_ENGINE.reset(token)
+
+
+def test_empty_round_keeps_defaults():
+    results = ConsensusTracker().update([], 1)
+    assert results == full_recompute([], 1)
@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+LLM花费账本测试：对冲与未采用请求的计数、按轮次/角色/调用类型汇总、合计与表格输出
+"""
+
+import pytest
+
+from cost_ledger import (SOURCE_CACHE, SOURCE_LIVE, SOURCE_REPLAY, STATUS_CANCELLED, STATUS_FAILED, STATUS_OK,
+                         CostLedger)
+
+CALLS = [
+    {"round": 1, "role": "经济顾问", "kind": "gate", "action": "Gate", "source": SOURCE_LIVE,
+     "prompt_tokens": 100, "completion_tokens": 5, "cost": 0.001},
+    {"round": 1, "role": "经济顾问", "kind": "feedback", "action": "Feedback", "source": SOURCE_LIVE,
+     "prompt_tokens": 300, "completion_tokens": 200, "cost": 0.01, "status": STATUS_CANCELLED},
+    {"round": 1, "role": "经济顾问", "kind": "feedback", "action": "Feedback", "source": SOURCE_LIVE,
+     "prompt_tokens": 300, "completion_tokens": 250, "cost": 0.012, "hedge": True},
+    {"round": 1, "role": "政策部门", "kind": "revision", "action": "Revise", "source": SOURCE_LIVE,
+     "prompt_tokens": 0, "completion_tokens": 0, "cost": 0.0, "status": STATUS_FAILED},
+    {"round": 1, "role": "政策部门", "kind": "revision", "action": "Revise", "source": SOURCE_LIVE,
+     "prompt_tokens": 800, "completion_tokens": 600, "cost": 0.03, "status": STATUS_OK},
+    {"round": 2, "role": "经济顾问", "kind": "feedback", "action": "Feedback", "source": SOURCE_CACHE,
+     "prompt_tokens": 320, "completion_tokens": 240},
+    {"round": 2, "role": "合规律师", "kind": "feedback", "action": "Feedback", "source": SOURCE_REPLAY,
+     "prompt_tokens": 310, "completion_tokens": 220},
+]
+
+
+@pytest.fixture
+def ledger():
+    ledger = CostLedger()
+    for call in CALLS:
+        ledger.add(call)
+    return ledger
+
+
+def test_totals_count_hedges_and_unused_requests(ledger):
+    assert ledger.calls == len(CALLS)
+    assert ledger.totals() == {
+        "calls": 7, "live_calls": 5, "hedges": 1, "unused": 2,
+        "prompt_tokens": 2130, "completion_tokens": 1515, "cost": 0.053,
+    }
+
+
+def test_group_by_round(ledger):
+    rows = ledger.group_by("round")
+    assert [(row["round"], row["calls"], row["live_calls"], row["unused"]) for row in rows] == [(1, 5, 5, 2), (2, 2, 0, 0)]
+    assert rows[0]["cost"] == pytest.approx(0.053)
+    assert rows[1]["cost"] == 0
+
+
+def test_group_by_role_and_kind(ledger):
+    by_role = {row["role"]: row for row in ledger.group_by("role")}
+    assert list(by_role) == sorted(by_role)
+    assert (by_role["经济顾问"]["calls"], by_role["经济顾问"]["hedges"], by_role["经济顾问"]["unused"]) == (4, 1, 1)
+    assert by_role["政策部门"]["prompt_tokens"] == 800
+    by_kind = {row["kind"]: row["calls"] for row in ledger.group_by("kind")}
+    assert by_kind == {"feedback": 4, "gate": 1, "revision": 2}
+
+
+def test_group_by_several_fields_sums_to_totals(ledger):
+    rows = ledger.group_by("round", "role")
+    assert [(row["round"], row["role"]) for row in rows] == [
+        (1, "政策部门"), (1, "经济顾问"), (2, "合规律师"), (2, "经济顾问"),
+    ]
+    totals = ledger.totals()
+    for field in ("calls", "live_calls", "hedges", "unused", "prompt_tokens", "completion_tokens"):
+        assert sum(row[field] for row in rows) == totals[field]
+
+
+def test_snapshot_and_table(ledger):
+    snapshot = ledger.snapshot()
+    assert set(snapshot) == {"total", "by_role", "by_round", "by_kind", "by_round_role"}
+    assert snapshot["total"] == ledger.totals()
+    table = ledger.format_table().split("\n")
+    # 表头 + 3个角色 + 2轮 + 3种调用类型 + 合计
+    assert len(table) == 10
+    assert table[-1].startswith("合计")
+    assert table[-1].split()[1:5] == ["7", "5", "1", "2"]
+
+
+def test_empty_ledger():
+    ledger = CostLedger()
+    assert ledger.totals()["calls"] == 0
+    assert ledger.group_by("role") == []
+    assert ledger.format_table().split("\n")[-1].split()[1] == "0"
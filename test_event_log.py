@@ -0,0 +1,51 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+讨论事件文件测试：复用讨论ID时续写，事件ID在同一文件内不重复
+"""
+
+import json
+
+from event_log import EVENT_MESSAGE, EVENT_RUN_STATUS, EventLog
+
+
+def read_ids(path) -> list:
+    ids = []
+    for line in path.read_text(encoding="utf-8").splitlines():
+        try:
+            ids.append(json.loads(line)["id"])
+        except ValueError:
+            continue
+    return ids
+
+
+def test_new_file_starts_at_zero(tmp_path):
+    event_log = EventLog("d1", tmp_path)
+    assert event_log.emit(EVENT_RUN_STATUS, status="started")["id"] == 0
+    assert event_log.emit(EVENT_MESSAGE, round=1)["id"] == 1
+    event_log.close()
+    assert read_ids(tmp_path / "d1.jsonl") == [0, 1]
+
+
+def test_reused_discussion_id_continues_sequence(tmp_path):
+    for _ in range(2):
+        event_log = EventLog("d1", tmp_path)
+        event_log.emit(EVENT_RUN_STATUS, status="started")
+        event_log.emit(EVENT_RUN_STATUS, status="completed")
+        event_log.close()
+    assert read_ids(tmp_path / "d1.jsonl") == [0, 1, 2, 3]
+
+
+def test_interrupted_line_is_skipped(tmp_path):
+    event_log = EventLog("d1", tmp_path)
+    event_log.emit(EVENT_RUN_STATUS, status="started")
+    event_log.close()
+    with (tmp_path / "d1.jsonl").open("a", encoding="utf-8") as f:
+        f.write('{"id": 1, "type": "mess')
+    event_log = EventLog("d1", tmp_path)
+    assert event_log.emit(EVENT_RUN_STATUS, status="started")["id"] == 1
+    event_log.close()
+    lines = (tmp_path / "d1.jsonl").read_text(encoding="utf-8").splitlines()
+    assert len(lines) == 3
+    assert read_ids(tmp_path / "d1.jsonl") == [0, 1]
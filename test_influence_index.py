@@ -0,0 +1,130 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+专家建议影响归因测试：倒排索引与逐条打分的结果一致，且检出原实现超过阈值的全部建议
+"""
+
+import math
+import random
+from typing import Dict, List
+
+import pytest
+
+from influence_index import (KEYWORD_WEIGHT, MAX_INFLUENCING, RELEVANCE_THRESHOLD, SIMILARITY_WEIGHT,
+                             SuggestionIndex, bigram_counts)
+from message_parser import extract_expert_suggestions
+
+PHRASES = [
+    "建立分层空域管理制度", "设立无人机物流专用通道", "完善飞行许可审批流程", "加强噪音与污染排放监测",
+    "推动基础设施共建共享", "明确运营主体安全责任", "建设统一监控系统", "给予试点企业资金支持",
+    "规范数据采集与隐私保护", "制定应急响应与事故赔偿机制", "降低企业合规成本", "开展跨部门法规执法",
+    "提高商业运营准入条件", "评估项目投资效益", "推广绿色环境友好技术", "统一区域飞行标准",
+]
+EXPERTS = ["经济顾问", "环境学家", "合规律师", "制造商", "物流公司", "基建公司"]
+
+
+def make_groups(rng: random.Random, n_groups: int) -> List[Dict]:
+    groups = []
+    for i in range(n_groups):
+        expert = rng.choice(EXPERTS)
+        content = "\n".join(f"{j}. 建议" + "，".join(rng.sample(PHRASES, 2)) for j in range(1, 4))
+        groups.append({"expert": expert, "round": i // 6 + 1, "suggestions": extract_expert_suggestions(content, expert)})
+    return groups
+
+
+def legacy_relevance(change: str, suggestion: Dict) -> float:
+    """原 calculate_relevance：关键词命中比例 + 空格分词的Jaccard重合度"""
+    change_lower = change.lower()
+    keyword_score = sum(1 for keyword in suggestion["keywords"] if keyword in change_lower)
+    keyword_score /= max(len(suggestion["keywords"]), 1)
+    change_words, suggestion_words = set(change_lower.split()), set(suggestion["text"].lower().split())
+    similarity = 0
+    if change_words and suggestion_words:
+        similarity = len(change_words & suggestion_words) / len(change_words | suggestion_words)
+    return keyword_score * 0.7 + similarity * 0.3
+
+
+def cosine(a: str, b: str) -> float:
+    counts_a, counts_b = bigram_counts(a), bigram_counts(b)
+    norm = math.sqrt(sum(c * c for c in counts_a.values())) * math.sqrt(sum(c * c for c in counts_b.values()))
+    return sum(count * counts_b[bigram] for bigram, count in counts_a.items()) / norm if norm else 0
+
+
+def brute_force_relevance(change: str, suggestion: Dict) -> float:
+    """不经过倒排索引，逐条按索引的公式打分"""
+    keyword_score = sum(1 for keyword in set(suggestion["keywords"]) if keyword in change.lower())
+    keyword_score /= max(len(suggestion["keywords"]), 1)
+    return keyword_score * KEYWORD_WEIGHT + cosine(change, suggestion["text"]) * SIMILARITY_WEIGHT
+
+
+@pytest.fixture(scope="module")
+def corpus():
+    rng = random.Random(42)
+    groups = make_groups(rng, 120)
+    changes = ["，".join(rng.sample(PHRASES, 2)) for _ in range(8)] + ["完全无关的措辞调整", ""]
+    index = SuggestionIndex()
+    for group in groups:
+        index.add_group(group)
+    entries = [(group, suggestion) for group in groups for suggestion in group["suggestions"]]
+    return groups, changes, index, entries
+
+
+def test_index_scores_match_brute_force(corpus):
+    _, changes, index, entries = corpus
+    current_round = 12
+    for change in changes:
+        expected = {
+            entry_id: brute_force_relevance(change, suggestion)
+            for entry_id, (group, suggestion) in enumerate(entries)
+            if group["round"] <= current_round
+        }
+        expected = {entry_id: score for entry_id, score in expected.items() if score > RELEVANCE_THRESHOLD}
+        scored = {entry_id: score for score, entry_id in index.score_change(change, current_round)}
+        assert scored.keys() == expected.keys()
+        for entry_id, score in scored.items():
+            assert score == pytest.approx(expected[entry_id])
+
+
+def test_index_retrieves_every_legacy_hit(corpus):
+    _, changes, index, entries = corpus
+    current_round = 20
+    for change in changes:
+        legacy_hits = {
+            entry_id for entry_id, (group, suggestion) in enumerate(entries)
+            if group["round"] <= current_round and legacy_relevance(change, suggestion) > RELEVANCE_THRESHOLD
+        }
+        assert legacy_hits <= {entry_id for _, entry_id in index.score_change(change, current_round)}
+
+
+def test_later_rounds_are_excluded(corpus):
+    _, changes, index, entries = corpus
+    for _, entry_id in index.score_change(changes[0], 3):
+        assert entries[entry_id][0]["round"] <= 3
+
+
+def test_attribute_ranks_and_dedupes(corpus):
+    _, changes, index, entries = corpus
+    result = index.attribute(changes, 20)
+    assert 0 < len(result) <= MAX_INFLUENCING
+    scores = [item["relevance_score"] for item in result]
+    assert scores == sorted(scores, reverse=True)
+    keys = [(item["expert"], item["suggestion"][:50]) for item in result]
+    assert len(keys) == len(set(keys))
+    best = max(score for change in changes for score, _ in index.score_change(change, 20))
+    assert scores[0] == best
+    for item in result:
+        assert set(item["matched_keywords"]) <= set(next(
+            suggestion["keywords"] for group, suggestion in entries
+            if group["expert"] == item["expert"] and suggestion["text"] == item["suggestion"]
+        ))
+
+
+def test_empty_index_and_unrelated_change():
+    index = SuggestionIndex()
+    assert index.attribute(["空域管理制度"], 1) == []
+    index.add_group({"expert": "经济顾问", "round": 1, "suggestions": [
+        {"text": "建议建立分层空域管理制度", "type": "建议", "keywords": ["空域", "管理", "制度", "分层"]},
+    ]})
+    assert len(index) == 1
+    assert index.score_change("完全无关的措辞调整", 1) == []
@@ -0,0 +1,315 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+LLM调用调度器测试：优先级放行顺序、限流、重试与退避、对冲请求
+"""
+
+import asyncio
+import random
+import time
+
+import pytest
+
+import llm_dispatcher
+from llm_dispatcher import CALL_FEEDBACK, CALL_GATE, CALL_REVISION, HEDGE_REQUEST, LLMDispatcher, is_retryable
+
+
+class RateLimitError(Exception):
+    """与 openai.RateLimitError 同名的假异常"""
+
+
+def test_queued_calls_are_granted_by_priority():
+    async def run():
+        dispatcher = LLMDispatcher(max_concurrency=1)
+        order = []
+
+        async def call(kind: str, tag: str):
+            async def send():
+                order.append(tag)
+                await asyncio.sleep(0.01)
+                return tag
+            return await dispatcher.call(kind, 10, send)
+
+        # 第一个调用占住唯一的并发名额，其余调用排队后按优先级放行
+        first = asyncio.create_task(call(CALL_GATE, "gate-0"))
+        await asyncio.sleep(0)
+        queued = [asyncio.create_task(call(kind, tag)) for kind, tag in [
+            (CALL_GATE, "gate-1"), (CALL_FEEDBACK, "feedback-1"), (CALL_GATE, "gate-2"),
+            (CALL_REVISION, "revision-1"), (CALL_FEEDBACK, "feedback-2"),
+        ]]
+        await asyncio.gather(first, *queued)
+        return order, dispatcher
+
+    order, dispatcher = asyncio.run(run())
+    assert order == ["gate-0", "revision-1", "feedback-1", "feedback-2", "gate-1", "gate-2"]
+    assert dispatcher.stats()["max_queue_depth"] == 5
+    assert dispatcher.in_flight == 0
+
+
+def test_rpm_limit_delays_calls():
+    async def run():
+        dispatcher = LLMDispatcher(rpm=600)  # 每0.1秒补充一个请求
+        dispatcher.rpm_bucket.tokens = 0
+
+        async def send():
+            return "ok"
+
+        start = time.monotonic()
+        await asyncio.gather(*(dispatcher.call(CALL_FEEDBACK, 1, send) for _ in range(3)))
+        return time.monotonic() - start
+
+    assert asyncio.run(run()) >= 0.25
+
+
+def test_unknown_call_kind_is_rejected():
+    async def send():
+        return "ok"
+
+    with pytest.raises(ValueError):
+        asyncio.run(LLMDispatcher().call("unknown", 1, send))
+
+
+def test_retryable_errors_are_retried_with_growing_backoff(monkeypatch):
+    bounds = []
+    monkeypatch.setattr(llm_dispatcher.random, "uniform", lambda low, high: bounds.append((low, high)) or 0.0)
+
+    async def run():
+        dispatcher = LLMDispatcher(max_retries=4, base_delay=0.5, max_delay=1.5)
+        attempts = 0
+
+        async def flaky():
+            nonlocal attempts
+            attempts += 1
+            if attempts < 4:
+                raise RateLimitError("429 Too Many Requests")
+            return "done"
+
+        return await dispatcher.call(CALL_GATE, 1, flaky), attempts, dispatcher
+
+    rsp, attempts, dispatcher = asyncio.run(run())
+    assert (rsp, attempts) == ("done", 4)
+    # 完全抖动：第n次重试在 [0, min(max_delay, base_delay * 2^n)] 内等待
+    assert bounds == [(0, 0.5), (0, 1.0), (0, 1.5)]
+    assert dispatcher.stats()["retries"] == 3
+    assert dispatcher.stats()["failures"] == 0
+    assert dispatcher.in_flight == 0
+
+
+def test_non_retryable_error_is_raised_immediately():
+    async def run():
+        dispatcher = LLMDispatcher(max_retries=4, base_delay=0)
+        attempts = 0
+
+        async def bad():
+            nonlocal attempts
+            attempts += 1
+            raise ValueError("bad request")
+
+        with pytest.raises(ValueError):
+            await dispatcher.call(CALL_FEEDBACK, 1, bad)
+        return attempts, dispatcher
+
+    attempts, dispatcher = asyncio.run(run())
+    assert attempts == 1
+    assert dispatcher.stats()["failures"] == 1
+    assert dispatcher.in_flight == 0
+
+
+def test_retries_are_exhausted():
+    async def run():
+        dispatcher = LLMDispatcher(max_retries=2, base_delay=0)
+
+        async def always_limited():
+            raise RateLimitError("rate limit")
+
+        with pytest.raises(RateLimitError):
+            await dispatcher.call(CALL_FEEDBACK, 1, always_limited)
+        return dispatcher.stats()
+
+    stats = asyncio.run(run())
+    assert stats["calls"] == 3
+    assert stats["retries"] == 2
+    assert stats["failures"] == 1
+
+
+def test_is_retryable():
+    class StatusError(Exception):
+        def __init__(self, status_code: int):
+            super().__init__(f"status {status_code}")
+            self.status_code = status_code
+
+    assert is_retryable(asyncio.TimeoutError())
+    assert is_retryable(ConnectionResetError())
+    assert is_retryable(StatusError(429))
+    assert is_retryable(StatusError(503))
+    assert is_retryable(RateLimitError("slow down"))
+    assert not is_retryable(StatusError(400))
+    assert not is_retryable(ValueError("bad request"))
+
+
+def warmed_dispatcher(**settings) -> LLMDispatcher:
+    """已有足够耗时记录的对冲调度器：动作 A 的历史耗时均为 10ms"""
+    dispatcher = LLMDispatcher(hedge_actions=["A"], hedge_percentile=0.9, hedge_min_samples=5, **settings)
+    tracker = dispatcher.trackers.setdefault("A", llm_dispatcher.LatencyTracker())
+    for _ in range(5):
+        tracker.record(0.01)
+    return dispatcher
+
+
+def scripted_requests(latencies):
+    """按顺序使用给定耗时的假请求，记录每个请求是否为对冲请求及其结果"""
+    log = []
+
+    async def send():
+        entry = {"hedge": HEDGE_REQUEST.get(), "status": "failed"}
+        log.append(entry)
+        number = len(log)
+        latency = latencies[number - 1]
+        try:
+            if isinstance(latency, Exception):
+                raise latency
+            await asyncio.sleep(latency)
+            entry["status"] = "ok"
+            return f"rsp-{number}"
+        except asyncio.CancelledError:
+            entry["status"] = "cancelled"
+            raise
+
+    return send, log
+
+
+def test_slow_call_is_hedged_and_hedge_win_counted():
+    async def run():
+        dispatcher = warmed_dispatcher(hedge_budget=1.0)
+        send, log = scripted_requests([1.0, 0.01])
+        rsp = await dispatcher.call(CALL_FEEDBACK, 10, send, action="A")
+        await asyncio.sleep(0)
+        return rsp, log, dispatcher
+
+    rsp, log, dispatcher = asyncio.run(run())
+    assert rsp == "rsp-2"
+    assert log == [{"hedge": False, "status": "cancelled"}, {"hedge": True, "status": "ok"}]
+    stats = dispatcher.stats()
+    assert (stats["calls"], stats["hedges"], stats["hedge_win_rate"]) == (2, 1, 1.0)
+    assert stats["actions"]["A"]["hedge_wins"] == 1
+    assert dispatcher.in_flight == 0
+
+
+def test_primary_win_is_not_counted_as_hedge_win():
+    async def run():
+        dispatcher = warmed_dispatcher(hedge_budget=1.0)
+        send, log = scripted_requests([0.05, 1.0])
+        rsp = await dispatcher.call(CALL_FEEDBACK, 10, send, action="A")
+        await asyncio.sleep(0)
+        return rsp, log, dispatcher
+
+    rsp, log, dispatcher = asyncio.run(run())
+    assert rsp == "rsp-1"
+    assert [entry["status"] for entry in log] == ["ok", "cancelled"]
+    assert dispatcher.stats()["hedges"] == 1
+    assert dispatcher.stats()["hedge_win_rate"] == 0.0
+
+
+def test_hedges_respect_budget_and_action_list():
+    async def run():
+        dispatcher = warmed_dispatcher(hedge_budget=0.0)
+        send, log = scripted_requests([0.05])
+        await dispatcher.call(CALL_FEEDBACK, 10, send, action="A")
+        other, other_log = scripted_requests([0.05])
+        await dispatcher.call(CALL_FEEDBACK, 10, other, action="B")
+        return log + other_log, dispatcher
+
+    log, dispatcher = asyncio.run(run())
+    assert [entry["hedge"] for entry in log] == [False, False]
+    assert dispatcher.stats()["hedges"] == 0
+
+
+def test_no_hedge_before_enough_samples():
+    async def run():
+        dispatcher = LLMDispatcher(hedge_actions=["all"], hedge_budget=1.0, hedge_min_samples=5)
+        send, log = scripted_requests([0.01] * 4 + [0.05])
+        for _ in range(5):
+            await dispatcher.call(CALL_GATE, 1, send, action="gate")
+        return log, dispatcher
+
+    log, dispatcher = asyncio.run(run())
+    assert len(log) == 5
+    assert dispatcher.stats()["hedges"] == 0
+
+
+def test_both_requests_failing_raises_primary_error():
+    async def run():
+        dispatcher = warmed_dispatcher(hedge_budget=1.0, max_retries=0)
+
+        async def send():
+            if HEDGE_REQUEST.get():
+                raise ValueError("hedge failed")
+            await asyncio.sleep(0.05)
+            raise KeyError("primary failed")
+
+        with pytest.raises(KeyError):
+            await dispatcher.call(CALL_FEEDBACK, 10, send, action="A")
+        return dispatcher
+
+    dispatcher = asyncio.run(run())
+    assert dispatcher.stats()["failures"] == 1
+    assert dispatcher.in_flight == 0
+
+
+def test_percentile_without_censoring_matches_sorted_index():
+    rng = random.Random(5)
+    for size in (1, 7, 20, 200):
+        tracker = llm_dispatcher.LatencyTracker()
+        samples = [round(rng.uniform(0, 5), 1) for _ in range(size)]
+        for latency in samples:
+            tracker.record(latency)
+        ordered = sorted(samples)
+        for q in (0.5, 0.9, 0.95):
+            assert tracker.percentile(q) == ordered[min(size - 1, int(q * size))]
+
+
+def test_censored_samples_keep_the_tail():
+    tracker = llm_dispatcher.LatencyTracker()
+    for _ in range(8):
+        tracker.record(0.1)
+    # 两个慢请求在对冲胜出后被取消：只知道它们至少耗时1秒
+    tracker.record(1.0, censored=True)
+    tracker.record(1.2, censored=True)
+    assert tracker.percentile(0.5) == 0.1
+    assert tracker.percentile(0.9) == 1.2
+    # 被取消的对冲请求只提供下界，不会压低分位数
+    tracker = llm_dispatcher.LatencyTracker()
+    for latency in (0.1, 0.2, 0.3, 0.4):
+        tracker.record(latency)
+    before = tracker.percentile(0.5)
+    tracker.record(0.05, censored=True)
+    assert tracker.percentile(0.5) >= before
+
+
+def test_cancelled_loser_is_recorded_as_censored_sample():
+    async def run():
+        dispatcher = warmed_dispatcher(hedge_budget=1.0)
+        send, _ = scripted_requests([1.0, 0.01])
+        await dispatcher.call(CALL_FEEDBACK, 10, send, action="A")
+        await asyncio.sleep(0)
+        return dispatcher.trackers["A"]
+
+    tracker = asyncio.run(run())
+    censored = [latency for latency, is_censored in tracker.latencies if is_censored]
+    assert len(censored) == 1
+    assert censored[0] >= 0.01
+
+
+def test_hedged_call_settles_both_tpm_reservations(monkeypatch):
+    async def run(action, latencies):
+        dispatcher = warmed_dispatcher(hedge_budget=1.0, tpm=6000, completion_reserve=100)
+        send, _ = scripted_requests(latencies)
+        await dispatcher.call(CALL_FEEDBACK, 10, send, count_tokens=lambda rsp: 30, action=action)
+        await asyncio.sleep(0)
+        return dispatcher.tpm_bucket.tokens
+
+    monkeypatch.setattr(llm_dispatcher.TokenBucket, "_refill", lambda self: None)
+    # 每个请求预留 10 + 100，按实际 10 + 30 结算
+    assert asyncio.run(run("B", [0.05])) == 6000 - 40
+    assert asyncio.run(run("A", [1.0, 0.01])) == 6000 - 80
@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+政策差异引擎测试：条款切分、条款级相似度、上界与阈值判断
+"""
+
+import random
+from difflib import SequenceMatcher
+
+import pytest
+
+from policy_diff import ClauseDiffEngine, get_diff_engine, split_clauses
+
+CLAUSES = [
+    "开放120米以下空域用于物流试点", "企业须购买第三者责任险", "设立专项补贴支持基础设施建设",
+    "建立跨部门联合审批机制", "噪声与隐私投诉纳入执法考核", "低空飞行器实行分类登记管理",
+    "试点城市每季度公开飞行数据", "禁止在学校和医院上空低空飞行",
+]
+
+
+def random_policy(rng: random.Random) -> str:
+    return "。".join(rng.sample(CLAUSES, rng.randint(0, len(CLAUSES)))) + "。"
+
+
+def test_split_clauses_on_punctuation_and_numbering():
+    text = "1. 开放空域；2、购买保险\n（3）设立补贴。第四条 联合审批！版本1.5保持不变"
+    assert split_clauses(text) == ("1. 开放空域", "2、购买保险", "（3）设立补贴", "第四条 联合审批", "版本1.5保持不变")
+
+
+def test_clause_ratio_weights_matched_clauses_by_length():
+    engine = ClauseDiffEngine()
+    a = "开放空域。购买保险。"
+    b = "开放空域。设立专项补贴。"
+    # 匹配 "开放空域"（4字），总字数 4+4+4+6
+    assert engine.ratio(a, b) == pytest.approx(2 * 4 / 18)
+    assert engine.diff(a, a) == 0
+    assert engine.diff("", "") == 0
+    assert engine.diff(a, "") == 1
+
+
+def test_moved_clause_lowers_ratio_but_not_upper_bound():
+    engine = ClauseDiffEngine()
+    a = "开放空域。购买保险。设立补贴。"
+    b = "设立补贴。开放空域。购买保险。"
+    assert engine.ratio(a, b) == pytest.approx(2 * 8 / 24)
+    assert engine.upper_bound_ratio(a, b) == 1.0
+
+
+@pytest.mark.parametrize("name", ["clause", "char"])
+def test_upper_bound_and_is_substantial_agree_with_exact_diff(name):
+    engine = get_diff_engine(name)
+    rng = random.Random(7)
+    for _ in range(300):
+        a, b = random_policy(rng), random_policy(rng)
+        assert engine.upper_bound_ratio(a, b) >= engine.ratio(a, b) - 1e-12
+        for threshold in (0.1, 0.25, 0.5):
+            assert engine.is_substantial(a, b, threshold) == (engine.diff(a, b) >= threshold)
+
+
+def test_char_engine_matches_original_sequence_matcher():
+    engine = get_diff_engine("char")
+    rng = random.Random(3)
+    for _ in range(50):
+        a, b = random_policy(rng), random_policy(rng)
+        assert engine.diff(a, b) == 1 - SequenceMatcher(None, a, b).ratio()
+
+
+def test_unknown_engine_is_rejected():
+    with pytest.raises(ValueError):
+        get_diff_engine("word")
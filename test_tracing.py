@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+讨论计时测试：未启用时为空操作、嵌套区间、按 asyncio 任务分泳道、Chrome trace 输出格式
+"""
+
+import asyncio
+import json
+
+import pytest
+
+from tracing import NOOP_SPAN, TRACER, Tracer, trace_span
+
+
+@pytest.fixture
+def tracer(tmp_path):
+    tracer = Tracer(str(tmp_path / "traces" / "discussion.json"))
+    token = TRACER.set(tracer)
+    yield tracer
+    TRACER.reset(token)
+
+
+def test_disabled_tracing_is_noop():
+    assert TRACER.get() is None
+    with trace_span("round", round=1) as span:
+        span.set(speakers=2)
+    assert span is NOOP_SPAN
+
+
+def test_nested_spans_are_recorded_inside_their_parent(tracer):
+    with trace_span("round", round=1) as outer:
+        with trace_span("expert", role="经济顾问"):
+            pass
+        outer.set(speakers=1)
+    inner, outer = tracer.events
+    assert (inner["name"], outer["name"]) == ("expert", "round")
+    assert outer["args"] == {"round": 1, "speakers": 1}
+    assert inner["args"] == {"role": "经济顾问"}
+    assert outer["ts"] <= inner["ts"]
+    assert inner["ts"] + inner["dur"] <= outer["ts"] + outer["dur"]
+    assert inner["tid"] == outer["tid"] == 0
+
+
+def test_error_is_recorded_and_reraised(tracer):
+    with pytest.raises(KeyError):
+        with trace_span("llm_call"):
+            raise KeyError("boom")
+    assert tracer.events[0]["args"] == {"error": "KeyError"}
+
+
+def test_each_task_gets_its_own_lane(tracer):
+    async def expert(name: str):
+        with trace_span("expert", role=name):
+            await asyncio.sleep(0.01)
+
+    async def run():
+        with trace_span("round"):
+            await asyncio.gather(
+                asyncio.create_task(expert("经济顾问"), name="经济顾问"),
+                asyncio.create_task(expert("合规律师"), name="合规律师"),
+            )
+
+    asyncio.run(run())
+    lanes = {event["args"].get("role", "round"): event["tid"] for event in tracer.events}
+    assert len(set(lanes.values())) == 3
+    assert tracer._lane_names[lanes["经济顾问"]] == "经济顾问"
+    assert tracer._lane_names[lanes["合规律师"]] == "合规律师"
+
+
+def test_save_writes_chrome_trace(tracer):
+    with trace_span("discussion", topic="低空经济"):
+        pass
+    path = tracer.save()
+    trace = json.loads(path.read_text(encoding="utf-8"))
+    assert trace["displayTimeUnit"] == "ms"
+    metadata, event = trace["traceEvents"]
+    assert metadata == {"name": "thread_name", "ph": "M", "pid": tracer.pid, "tid": 0, "args": {"name": "main"}}
+    assert event["ph"] == "X"
+    assert event["args"] == {"topic": "低空经济"}
+    assert event["dur"] >= 0
@@ -0,0 +1,200 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Web服务器测试：消息流按 Last-Event-ID 断线续传、讨论消息的增量/过滤/分页选择
+"""
+
+import json
+
+import pytest
+
+pytest.importorskip("flask")
+
+import web_server_new  # noqa: E402
+from web_server_new import MessageHub, hub_stream, parse_event_id, select_history, select_messages  # noqa: E402
+
+
+class StubCache:
+    """代替讨论文件缓存：续传前的 refresh() 不读取文件"""
+
+    def refresh(self):
+        pass
+
+
+@pytest.fixture
+def hub(monkeypatch):
+    monkeypatch.setattr(web_server_new, "ensure_tailer", lambda: None)
+    monkeypatch.setattr(web_server_new, "discussion_cache", StubCache())
+    hub = MessageHub(maxlen=4)
+    hub.publish([], reset=True, key="discussion_a")
+    hub.publish([{"id": f"m{seq}"} for seq in range(3)])
+    return hub
+
+
+def open_stream(hub: MessageHub, last_event_id: str):
+    def snapshot():
+        generation, next_seq, key = hub.cursor()
+        return {"type": "init"}, generation, next_seq, key
+
+    return hub_stream(hub, parse_event_id(last_event_id), snapshot, lambda item: {"type": "message", "message": item})
+
+
+def read_event(stream) -> tuple:
+    """读取下一个SSE事件，返回 (事件ID, 数据)"""
+    lines = next(stream).strip().split("\n")
+    fields = dict(line.split(": ", 1) for line in lines)
+    return fields.get("id"), json.loads(fields["data"])
+
+
+def test_parse_event_id():
+    assert parse_event_id("discussion_a:12") == ("discussion_a", 12)
+    assert parse_event_id("20250101:events:3") == ("20250101:events", 3)
+    assert parse_event_id("") is None
+    assert parse_event_id("discussion_a:x") is None
+
+
+def test_resume_within_buffer(hub):
+    generation, _, _ = hub.cursor()
+    assert hub.resume("discussion_a", 1) == (generation, 1)
+    assert hub.resume("discussion_a", 3) == (generation, 3)
+    assert [seq for seq, _ in hub.wait(generation, 1, timeout=0)] == [1, 2]
+
+
+def test_resume_rejects_other_discussion_and_future_ids(hub):
+    assert hub.resume("discussion_b", 1) is None
+    assert hub.resume("discussion_a", 4) is None
+
+
+def test_resume_rejects_gap_beyond_buffer(hub):
+    hub.publish([{"id": f"m{seq}"} for seq in range(3, 7)])
+    # 缓冲区只保留序号 3-6
+    assert hub.resume("discussion_a", 2) is None
+    assert hub.resume("discussion_a", 3) is not None
+
+
+def test_stream_resumes_after_last_event_id(hub):
+    stream = open_stream(hub, "discussion_a:0")
+    assert read_event(stream) == ("discussion_a:1", {"type": "message", "message": {"id": "m1"}})
+    assert read_event(stream) == ("discussion_a:2", {"type": "message", "message": {"id": "m2"}})
+    hub.publish([{"id": "m3"}])
+    assert read_event(stream) == ("discussion_a:3", {"type": "message", "message": {"id": "m3"}})
+
+
+def test_stream_sends_init_without_last_event_id(hub):
+    stream = open_stream(hub, "")
+    assert read_event(stream) == ("discussion_a:2", {"type": "init"})
+    hub.publish([{"id": "m3"}])
+    assert read_event(stream) == ("discussion_a:3", {"type": "message", "message": {"id": "m3"}})
+
+
+def test_stream_sends_init_when_gap_cannot_be_filled(hub):
+    hub.publish([{"id": f"m{seq}"} for seq in range(3, 7)])
+    stream = open_stream(hub, "discussion_a:0")
+    assert read_event(stream) == ("discussion_a:6", {"type": "init"})
+
+
+def test_stream_sends_init_after_discussion_switch(hub):
+    stream = open_stream(hub, "discussion_a:2")
+    hub.publish([{"id": "n0"}], reset=True, key="discussion_b")
+    assert read_event(stream) == ("discussion_b:0", {"type": "init"})
+
+
+MESSAGES = [
+    {"id": f"m{index}", "round": index // 3 + 1, "role": ["政策部门", "经济顾问", "合规律师"][index % 3]}
+    for index in range(10)
+]
+
+
+def ids(messages) -> list:
+    return [message["id"] for message in messages]
+
+
+def page_through(limit: int, **filters) -> list:
+    """按 next_cursor 逐页读取，返回每页的消息ID"""
+    pages, cursor = [], None
+    while True:
+        page, cursor = select_messages(MESSAGES, limit=limit, cursor=cursor, **filters)
+        pages.append(ids(page))
+        if cursor is None:
+            return pages
+
+
+def test_select_without_parameters_returns_everything():
+    assert select_messages(MESSAGES) == (MESSAGES, None)
+
+
+def test_select_since_id():
+    assert ids(select_messages(MESSAGES, since_id="m6")[0]) == ["m7", "m8", "m9"]
+    assert select_messages(MESSAGES, since_id="m9") == ([], None)
+    # 未知ID（如讨论已切换）时返回全部消息
+    assert select_messages(MESSAGES, since_id="other")[0] == MESSAGES
+
+
+def test_select_filters_by_round_and_role():
+    assert ids(select_messages(MESSAGES, round_num=2)[0]) == ["m3", "m4", "m5"]
+    assert ids(select_messages(MESSAGES, role="经济顾问")[0]) == ["m1", "m4", "m7"]
+    assert ids(select_messages(MESSAGES, round_num=3, role="合规律师")[0]) == ["m8"]
+
+
+def test_pages_cover_all_messages_once():
+    assert page_through(4) == [["m0", "m1", "m2", "m3"], ["m4", "m5", "m6", "m7"], ["m8", "m9"]]
+    assert page_through(5) == [["m0", "m1", "m2", "m3", "m4"], ["m5", "m6", "m7", "m8", "m9"]]
+
+
+@pytest.mark.parametrize("limit", [1, 2, 3])
+def test_filtered_pages_match_unpaged_selection(limit):
+    pages = page_through(limit, role="政策部门")
+    assert [message_id for page in pages for message_id in page] == ["m0", "m3", "m6", "m9"]
+    assert all(len(page) <= limit for page in pages)
+
+
+def test_cursor_and_since_id_combine():
+    page, cursor = select_messages(MESSAGES, since_id="m2", limit=2)
+    assert (ids(page), cursor) == (["m3", "m4"], 5)
+    page, cursor = select_messages(MESSAGES, since_id="m2", limit=2, cursor=cursor)
+    assert (ids(page), cursor) == (["m5", "m6"], 7)
+
+
+HISTORY = {
+    "versions": [{"version": version, "round": version // 2 + 1} for version in range(5)],
+    "expert_suggestions": [
+        {"message_id": index, "round": index // 3 + 1, "expert": ["经济顾问", "合规律师"][index % 2]}
+        for index in range(8)
+    ],
+    "current_round": 3,
+}
+
+
+def page_history(limit: int, **filters) -> list:
+    """按 next_cursor / next_since_id 逐页读取政策历史，返回每页的 (版本号, 建议组序号)"""
+    pages, cursor, since_id = [], None, None
+    while True:
+        page = select_history(HISTORY, since_version=cursor, since_id=since_id, limit=limit, **filters)
+        pages.append(([v["version"] for v in page["versions"]], [g["message_id"] for g in page["expert_suggestions"]]))
+        cursor, since_id = page["next_cursor"], page["next_since_id"]
+        if cursor is None and since_id is None:
+            return pages
+
+
+def test_history_without_limit_returns_everything():
+    page = select_history(HISTORY)
+    assert page["versions"] == HISTORY["versions"]
+    assert page["expert_suggestions"] == HISTORY["expert_suggestions"]
+    assert (page["next_cursor"], page["next_since_id"]) == (None, None)
+    assert page["current_round"] == 3
+
+
+def test_history_pages_versions_and_suggestions_separately():
+    assert page_history(3) == [([0, 1, 2], [0, 1, 2]), ([3, 4], [3, 4, 5]), ([], [6, 7])]
+    pages = page_history(2)
+    assert [version for versions, _ in pages for version in versions] == [0, 1, 2, 3, 4]
+    assert [index for _, groups in pages for index in groups] == list(range(8))
+    assert all(len(versions) <= 2 and len(groups) <= 2 for versions, groups in pages)
+
+
+def test_history_paging_with_filters():
+    pages = page_history(1, role="合规律师")
+    assert [index for _, groups in pages for index in groups] == [1, 3, 5, 7]
+    assert [version for versions, _ in pages for version in versions] == [0, 1, 2, 3, 4]
+    assert page_history(1, round_num=2) == [([2], [3]), ([3], [4]), ([], [5])]
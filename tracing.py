@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+讨论流程的嵌套计时（Chrome trace 格式）
+
+    with trace_span("round", round=3) as span:
+        ...
+        span.set(speakers=2)
+
+未启用时 trace_span 返回共享的空操作对象，开销只有一次 ContextVar 读取。
+启用后按单调时钟（perf_counter_ns）记录每个区间，每个 asyncio 任务一条泳道，
+保存为 Chrome trace JSON，可用 chrome://tracing 或 https://ui.perfetto.dev 打开。
+"""
+
+import asyncio
+import json
+import os
+import time
+import weakref
+from contextvars import ContextVar
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+
+class _NoopSpan:
+    """未启用计时时使用的空区间"""
+
+    __slots__ = ()
+
+    def __enter__(self) -> "_NoopSpan":
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+    def set(self, **args: Any):
+        pass
+
+
+NOOP_SPAN = _NoopSpan()
+
+
+class Span:
+    """一个计时区间，退出时写入所属 Tracer"""
+
+    __slots__ = ("tracer", "name", "args", "lane", "start")
+
+    def __init__(self, tracer: "Tracer", name: str, args: Dict[str, Any]):
+        self.tracer = tracer
+        self.name = name
+        self.args = args
+
+    def __enter__(self) -> "Span":
+        self.lane = self.tracer.lane()
+        self.start = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        end = time.perf_counter_ns()
+        if exc_type is not None:
+            self.args["error"] = exc_type.__name__
+        self.tracer.complete(self.name, self.lane, self.start, end, self.args)
+        return False
+
+    def set(self, **args: Any):
+        """补充区间参数（如调用来源、发言人数）"""
+        self.args.update(args)
+
+
+class Tracer:
+    """单个讨论的计时记录"""
+
+    def __init__(self, path: str):
+        self.path = Path(path)
+        self.pid = os.getpid()
+        self.origin = time.perf_counter_ns()
+        self.events: List[Dict[str, Any]] = []
+        self._lanes: "weakref.WeakKeyDictionary[asyncio.Task, int]" = weakref.WeakKeyDictionary()
+        self._lane_names: Dict[int, str] = {0: "main"}
+
+    def lane(self) -> int:
+        """当前 asyncio 任务的泳道号（任务之外为0）"""
+        try:
+            task = asyncio.current_task()
+        except RuntimeError:
+            task = None
+        if task is None:
+            return 0
+        lane = self._lanes.get(task)
+        if lane is None:
+            lane = self._lanes[task] = len(self._lane_names)
+            self._lane_names[lane] = task.get_name()
+        return lane
+
+    def complete(self, name: str, lane: int, start: int, end: int, args: Dict[str, Any]):
+        self.events.append({
+            "name": name,
+            "ph": "X",
+            "ts": (start - self.origin) / 1000,
+            "dur": (end - start) / 1000,
+            "pid": self.pid,
+            "tid": lane,
+            "args": args,
+        })
+
+    def save(self) -> Path:
+        lanes = [
+            {"name": "thread_name", "ph": "M", "pid": self.pid, "tid": lane, "args": {"name": name}}
+            for lane, name in self._lane_names.items()
+        ]
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with self.path.open("w", encoding="utf-8") as f:
+            json.dump({"traceEvents": lanes + self.events, "displayTimeUnit": "ms"}, f,
+                      ensure_ascii=False, separators=(",", ":"), default=str)
+        return self.path
+
+
+# 当前讨论的计时记录（由 policy_development 按参数设置，每个讨论任务独立）
+TRACER: ContextVar[Optional[Tracer]] = ContextVar("TRACER", default=None)
+
+
+def trace_span(name: str, **args: Any):
+    """开始一个计时区间（用作 with 语句）；未启用时返回空操作对象"""
+    tracer = TRACER.get()
+    if tracer is None:
+        return NOOP_SPAN
+    return Span(tracer, name, args)
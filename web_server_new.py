@@ -5,11 +5,29 @@ import os
 import time
 import json
 import re
+import gzip
+import hashlib
 from datetime import datetime
 from pathlib import Path
-from typing import Generator, Optional, List, Dict
+from collections import deque
+from typing import Callable, Generator, Optional, List, Dict, Tuple
 
 from flask import Flask, Response, render_template, jsonify, request
+
+try:
+    from inotify_simple import INotify, flags as inotify_flags
+except ImportError:  # 非Linux或未安装时退回轮询
+    INotify = None
+
+try:
+    import orjson
+except ImportError:  # 未安装时使用标准库json
+    orjson = None
+
+from cost_ledger import GROUP_FIELDS, CostLedger
+from event_log import EVENTS_DIR, EVENT_LLM_CALL, EVENT_MESSAGE, find_latest_event_file
+from message_parser import extract_expert_suggestions, extract_policy_revision, extract_structured_content
+from influence_index import SuggestionIndex
 import html
 import subprocess
 import threading
@@ -29,6 +47,26 @@ discussion_status = {
     "process": None,
     "progress": ""
 }
+_status_lock = threading.Lock()
+
+def public_discussion_status() -> Dict:
+    """创建一个可序列化的状态副本，排除Popen对象"""
+    return {
+        "is_running": discussion_status.get("is_running", False),
+        "current_topic": discussion_status.get("current_topic", ""),
+        "start_time": discussion_status.get("start_time", ""),
+        "progress": discussion_status.get("progress", ""),
+        # 不包含 "process" 字段，因为Popen对象无法JSON序列化
+    }
+
+def set_discussion_status(**changes):
+    """更新讨论状态，对外可见的字段有变化时推送 status 事件"""
+    with _status_lock:
+        before = public_discussion_status()
+        discussion_status.update(changes)
+        after = public_discussion_status()
+    if after != before:
+        update_hub.publish([{"type": "status", "status": after}])
 
 # 角色配置
 ROLES_CONFIG = {
@@ -97,155 +135,6 @@ def find_latest_log_file() -> Optional[Path]:
     log_files = sorted(LOG_DIR.glob("*.txt"), key=lambda p: p.stat().st_mtime, reverse=True)
     return log_files[0] if log_files else None
 
-def extract_expert_suggestions(content: str, expert_role: str) -> List[Dict]:
-    """从专家消息中提取关键建议"""
-    suggestions = []
-    
-    # 常见的建议关键词
-    suggestion_keywords = [
-        "建议", "推荐", "应该", "需要", "必须", "可以考虑", "不如", "最好",
-        "问题", "风险", "挑战", "改进", "优化", "增加", "减少", "修改"
-    ]
-    
-    # 按行分析内容
-    lines = content.split('\n')
-    for line in lines:
-        line = line.strip()
-        if len(line) < 10:  # 跳过太短的行
-            continue
-            
-        # 检查是否包含建议关键词
-        has_suggestion = any(keyword in line for keyword in suggestion_keywords)
-        
-        if has_suggestion:
-            # 清理格式
-            clean_line = re.sub(r'^\d+\.\s*', '', line)
-            clean_line = re.sub(r'^[•\-\*]\s*', '', clean_line)
-            
-            if clean_line and len(clean_line) > 15:
-                # 分类建议类型
-                suggestion_type = categorize_suggestion(clean_line)
-                
-                suggestions.append({
-                    "text": clean_line,
-                    "type": suggestion_type,
-                    "expert": expert_role,
-                    "keywords": extract_keywords(clean_line)
-                })
-    
-    return suggestions
-
-def categorize_suggestion(text: str) -> str:
-    """对建议进行分类"""
-    text_lower = text.lower()
-    
-    if any(word in text_lower for word in ["经济", "成本", "效益", "投资", "资金", "费用"]):
-        return "经济建议"
-    elif any(word in text_lower for word in ["环境", "污染", "排放", "生态", "绿色"]):
-        return "环境建议"
-    elif any(word in text_lower for word in ["技术", "系统", "设备", "监控", "自动化"]):
-        return "技术建议"
-    elif any(word in text_lower for word in ["法律", "法规", "合规", "标准", "规范"]):
-        return "法规建议"
-    elif any(word in text_lower for word in ["安全", "风险", "应急", "防护"]):
-        return "安全建议"
-    else:
-        return "一般建议"
-
-def extract_keywords(text: str) -> List[str]:
-    """从文本中提取关键词"""
-    # 简单的关键词提取
-    keywords = []
-    
-    # 常见的政策相关关键词
-    policy_keywords = [
-        "空域", "无人机", "管理", "监控", "安全", "标准", "制度", "系统",
-        "分层", "区域", "运营", "商业", "准入", "条件", "应急", "响应",
-        "成本", "效益", "投资", "资金", "环境", "污染", "技术", "法规"
-    ]
-    
-    for keyword in policy_keywords:
-        if keyword in text:
-            keywords.append(keyword)
-    
-    return keywords[:5]  # 最多返回5个关键词
-
-def find_influencing_suggestions(changes: List[str], expert_suggestions: List[Dict], current_round: int) -> List[Dict]:
-    """找到影响当前政策修订的专家建议"""
-    influencing = []
-    
-    # 查找当前轮次之前的专家建议
-    relevant_suggestions = [
-        s for s in expert_suggestions 
-        if s["round"] <= current_round
-    ]
-    
-    for change in changes:
-        change_lower = change.lower()
-        change_keywords = extract_keywords(change)
-        
-        # 为每个修改找到相关的专家建议
-        for suggestion_group in relevant_suggestions:
-            expert = suggestion_group["expert"]
-            
-            for suggestion in suggestion_group["suggestions"]:
-                # 计算相关性得分
-                relevance_score = calculate_relevance(change, suggestion["text"], suggestion["keywords"])
-                
-                if relevance_score > 0.3:  # 相关性阈值
-                    influencing.append({
-                        "expert": expert,
-                        "suggestion": suggestion["text"],
-                        "type": suggestion["type"],
-                        "relevance_score": relevance_score,
-                        "round": suggestion_group["round"],
-                        "change": change,
-                        "matched_keywords": list(set(change_keywords) & set(suggestion["keywords"]))
-                    })
-    
-    # 按相关性得分排序
-    influencing.sort(key=lambda x: x["relevance_score"], reverse=True)
-    
-    # 去重并限制数量
-    seen_combinations = set()
-    unique_influencing = []
-    
-    for item in influencing:
-        key = (item["expert"], item["suggestion"][:50])  # 使用专家和建议前50字符作为唯一标识
-        if key not in seen_combinations:
-            seen_combinations.add(key)
-            unique_influencing.append(item)
-            
-        if len(unique_influencing) >= 10:  # 最多返回10个相关建议
-            break
-    
-    return unique_influencing
-
-def calculate_relevance(change_text: str, suggestion_text: str, suggestion_keywords: List[str]) -> float:
-    """计算修改和建议之间的相关性得分"""
-    change_lower = change_text.lower()
-    suggestion_lower = suggestion_text.lower()
-    
-    # 关键词匹配得分
-    keyword_matches = sum(1 for keyword in suggestion_keywords if keyword in change_lower)
-    keyword_score = keyword_matches / max(len(suggestion_keywords), 1)
-    
-    # 文本相似度得分（简单的词汇重叠）
-    change_words = set(change_lower.split())
-    suggestion_words = set(suggestion_lower.split())
-    
-    if len(change_words) == 0 or len(suggestion_words) == 0:
-        similarity_score = 0
-    else:
-        intersection = len(change_words & suggestion_words)
-        union = len(change_words | suggestion_words)
-        similarity_score = intersection / union if union > 0 else 0
-    
-    # 综合得分
-    final_score = (keyword_score * 0.7 + similarity_score * 0.3)
-    
-    return final_score
-
 def parse_log_message_DEPRECATED(line: str) -> Optional[Dict]:
     """解析日志消息（支持两种格式）"""
     try:
@@ -311,302 +200,465 @@ def parse_log_message_DEPRECATED(line: str) -> Optional[Dict]:
             print(f"解析消息失败: {e}")
         return None
 
-def extract_structured_content(content: str, role: str) -> Dict:
-    """提取结构化内容"""
-    result = {
-        "raw_content": content,
-        "sections": {},
-        "score": None,
-        "agreement": None
+# 只供政策修订历史使用的解析字段，不随消息发送给前端
+HISTORY_FIELDS = ("revision", "expert_suggestions")
+
+def build_message(message_id: str, role: str, content: str, round_num: int, timestamp: str,
+                  structured: Dict) -> Dict:
+    """构建前端使用的消息结构（角色配置通过 roles 表引用，不在每条消息中重复）"""
+    return {
+        "id": message_id,
+        "role": role,
+        "content": content,
+        "structured": {k: v for k, v in structured.items() if k not in HISTORY_FIELDS},
+        "timestamp": timestamp,
+        "round": round_num
     }
+
+def message_from_event(event: Dict) -> Optional[Tuple[Dict, Dict]]:
+    """
+    将 message 事件转换为 (消息, 解析结果)，其他事件返回None
     
-    # 提取评分
-    score_patterns = [
-        r"可接受性评分[:：]\s*(\d+)/10",
-        r"环境影响评分[:：]\s*(\d+)/10", 
-        r"合规风险评分[:：]\s*(\d+)/10",
-        r"可制造性评分[:：]\s*(\d+)/10",
-        r"运营可行性评分[:：]\s*(\d+)/10",
-        r"基础设施可行性评分[:：]\s*(\d+)/10"
-    ]
+    解析结果优先使用讨论进程写入的 structured 字段，缺失时才在此解析
+    """
+    if event.get("type") != EVENT_MESSAGE or event.get("role") not in ROLES_CONFIG:
+        return None
+    structured = event.get("structured")
+    if structured is None:
+        structured = extract_structured_content(event["content"], event["role"], include_raw=False)
+    message = build_message(event["message_id"], event["role"], event["content"],
+                            event.get("round", 1), event.get("time", ""), structured)
+    return message, structured
+
+LEGACY_LINE_PATTERN = re.compile(r'\[ROUND_(\d+)\|([^\|]+)\|(.+)\]')
+LEGACY_TIMESTAMP_PATTERN = re.compile(r'^(\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2})')
+EXPLICIT_ROUND_PATTERN = re.compile(r'第\s*(\d+)\s*轮')
+MAX_LEGACY_ROUNDS = 10  # 旧版日志推断轮次的上限
+
+class MessageHub:
+    """
+    新消息的广播中心
+    
+    最近的消息保存在有界环形缓冲区中，所有SSE订阅者通过同一个条件变量等待新消息，
+    不再各自打开和轮询文件。讨论文件切换或被截断时 generation 加一，订阅者需要重新获取全量数据。
+    """
     
-    for pattern in score_patterns:
-        match = re.search(pattern, content)
-        if match:
-            result["score"] = int(match.group(1))
-            break
-    
-    # 提取同意程度
-    agreement_match = re.search(r"同意程度[:：]\s*(强烈反对|反对|中立|同意|强烈同意)", content)
-    if agreement_match:
-        result["agreement"] = agreement_match.group(1)
-    
-    # 根据角色提取不同的结构化信息
-    if "关键经济问题" in content:
-        result["sections"]["problems"] = extract_numbered_list(content, "关键经济问题")
-        result["sections"]["suggestions"] = extract_bullet_list(content, "建议改进")
-    elif "关键环境问题" in content:
-        result["sections"]["problems"] = extract_numbered_list(content, "关键环境问题") 
-        result["sections"]["suggestions"] = extract_bullet_list(content, "建议改进")
-    elif "法规合规问题" in content:
-        result["sections"]["problems"] = extract_numbered_list(content, "法规合规问题")
-        result["sections"]["suggestions"] = extract_bullet_list(content, "建议修改")
-    elif "制造问题" in content:
-        result["sections"]["problems"] = extract_numbered_list(content, "制造问题")
-        result["sections"]["suggestions"] = extract_bullet_list(content, "建议修改") 
-    elif "物流运营问题" in content:
-        result["sections"]["problems"] = extract_numbered_list(content, "物流运营问题")
-        result["sections"]["suggestions"] = extract_bullet_list(content, "建议修改")
-    elif "基础设施开发问题" in content:
-        result["sections"]["problems"] = extract_numbered_list(content, "基础设施开发问题")
-        result["sections"]["suggestions"] = extract_bullet_list(content, "建议修改")
-    elif "修订后的政策" in content:
-        # 提取政策内容
-        policy_match = re.search(r"修订后的政策[:：]\s*(.*?)\s*所做修改", content, re.DOTALL)
-        if policy_match:
-            result["sections"]["policy"] = policy_match.group(1).strip()
-        result["sections"]["changes"] = extract_numbered_list(content, "所做修改")
-    
-    return result
+    def __init__(self, maxlen: int = 500):
+        self._cond = threading.Condition()
+        self._buffer: deque = deque(maxlen=maxlen)  # (seq, message)
+        self.generation = 0
+        self.next_seq = 0
+        self.key = ""  # 当前讨论文件名，与消息序号组成SSE事件ID
+    
+    def publish(self, messages: List[Dict], reset: bool = False, key: str = ""):
+        with self._cond:
+            if reset:
+                self.generation += 1
+                self.next_seq = 0
+                self.key = key
+                self._buffer.clear()
+            for message in messages:
+                self._buffer.append((self.next_seq, message))
+                self.next_seq += 1
+            self._cond.notify_all()
+    
+    def cursor(self) -> Tuple[int, int, str]:
+        with self._cond:
+            return self.generation, self.next_seq, self.key
+    
+    def resume(self, key: str, next_seq: int) -> Optional[Tuple[int, int]]:
+        """断线重连：缺失的消息仍在缓冲区内时返回可继续等待的位置，否则返回None"""
+        with self._cond:
+            oldest = self._buffer[0][0] if self._buffer else self.next_seq
+            if key != self.key or not oldest <= next_seq <= self.next_seq:
+                return None
+            return self.generation, next_seq
+    
+    def wait(self, generation: int, next_seq: int, timeout: float) -> Optional[List[Tuple[int, Dict]]]:
+        """
+        等待 next_seq 及之后的消息，超时返回空列表；
+        讨论已切换或所需消息已被挤出缓冲区时返回None，订阅者需重新获取全量数据
+        """
+        with self._cond:
+            self._cond.wait_for(lambda: self.generation != generation or self.next_seq > next_seq, timeout)
+            if self.generation != generation:
+                return None
+            if self._buffer and self._buffer[0][0] > next_seq:
+                return None
+            return [(seq, message) for seq, message in self._buffer if seq >= next_seq]
 
-def extract_numbered_list(text: str, section_name: str) -> List[str]:
-    """提取编号列表"""
-    try:
-        # 找到section开始位置
-        start_pattern = f"{section_name}[:：]"
-        start_match = re.search(start_pattern, text)
-        if not start_match:
-            return []
-        
-        # 从section开始位置提取内容
-        start_pos = start_match.end()
-        remaining_text = text[start_pos:]
-        
-        # 查找下一个section或结束
-        next_section_patterns = [
-            r"\n\n[^0-9\-\s].*[:：]",  # 下一个section
-            r"\n建议改进[:：]",
-            r"\n建议修改[:：]", 
-            r"\n可接受性评分[:：]",
-            r"\n环境影响评分[:：]",
-            r"\n合规风险评分[:：]",
-            r"\n可制造性评分[:：]",
-            r"\n运营可行性评分[:：]",
-            r"\n基础设施可行性评分[:：]",
-            r"\n同意程度[:：]"
-        ]
-        
-        end_pos = len(remaining_text)
-        for pattern in next_section_patterns:
-            match = re.search(pattern, remaining_text)
-            if match:
-                end_pos = min(end_pos, match.start())
-        
-        section_text = remaining_text[:end_pos].strip()
-        
-        # 提取编号项目
-        items = []
-        lines = section_text.split('\n')
-        current_item = ""
+class PolicyHistoryState:
+    """
+    政策修订历史的增量状态：每条新消息只处理一次，产生新的专家建议组或政策版本
+    
+    add() 返回由该消息产生的增量（suggestion_group / policy_version 事件），用于推送给已打开的页面。
+    """
+    
+    def __init__(self):
+        self.versions: List[Dict] = []
+        self.expert_suggestions: List[Dict] = []
+        self.initial_version: Optional[Dict] = None  # 没有修订版本时，用第一条政策制定者消息作为初始版本
+        self.participating_experts = set()
+        self.total_suggestions = 0
+        self.suggestion_index = SuggestionIndex()
+        self.current_round = 1
+        self._has_messages = False
+    
+    def add(self, msg: Dict, structured: Dict) -> List[Dict]:
+        """structured 为该消息的完整解析结果（含 HISTORY_FIELDS）"""
+        content = msg.get("content", "")
+        role = msg.get("role", "")
+        timestamp = msg.get("timestamp", "")
+        round_num = msg.get("round", 1)
+        self.current_round = max(self.current_round, round_num) if self._has_messages else round_num
+        self._has_messages = True
+        updates = []
         
-        for line in lines:
-            line = line.strip()
-            if re.match(r'^\d+\.', line):  # 以数字开头
-                if current_item:
-                    items.append(current_item.strip())
-                current_item = line
-            elif current_item and line:  # 续行
-                current_item += " " + line
+        # 识别专家建议（非政策制定者的消息）
+        if role not in ["政策制定者", "政策部门"] and len(content) > 30:
+            # 关键建议（讨论进程已解析，旧数据在此解析）
+            suggestions = structured.get("expert_suggestions")
+            if suggestions is None:
+                suggestions = extract_expert_suggestions(content, role)
+            if suggestions:
+                group = {
+                    "expert": role,
+                    "round": round_num,
+                    "timestamp": timestamp,
+                    "suggestions": suggestions,
+                    "message_id": len(self.expert_suggestions)
+                }
+                self.expert_suggestions.append(group)
+                self.suggestion_index.add_group(group)
+                self.participating_experts.add(role)
+                self.total_suggestions += len(suggestions)
+                updates.append({"type": "suggestion_group", "group": group})
         
-        if current_item:
-            items.append(current_item.strip())
+        # 查找政策修订消息
+        if "修订后的政策:" in content:
+            # 政策内容与修改列表（讨论进程已解析，旧数据在此解析）
+            revision = structured.get("revision") or extract_policy_revision(content)
+            changes = revision["changes"]
+            
+            # 找到影响此次修订的专家建议
+            influencing_suggestions = self.suggestion_index.attribute(changes, round_num)
+            
+            version = {
+                "version": len(self.versions) + 1,
+                "round": round_num,
+                "timestamp": timestamp or datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+                "content": revision["policy"],
+                "changes": changes,
+                "expert": role,
+                "influencing_suggestions": influencing_suggestions,
+                "expert_feedback_count": len(influencing_suggestions)
+            }
+            self.versions.append(version)
+            updates.append({"type": "policy_version", "version": version})
+        elif not self.versions and self.initial_version is None and role in ["政策制定者", "政策部门"] \
+                and len(content) > 50:  # 确保有实质内容
+            self.initial_version = {
+                "version": 1,
+                "round": round_num,
+                "timestamp": timestamp,
+                "content": content,
+                "changes": ["初始政策制定"],
+                "expert": role
+            }
+            updates.append({"type": "policy_version", "version": self.initial_version})
         
-        return items
-    except Exception:
-        return []
+        for update in updates:
+            update["summary"] = self.summary()
+        return updates
+    
+    def summary(self) -> Dict:
+        versions = self.versions or ([self.initial_version] if self.initial_version else [])
+        return {
+            "total_versions": len(versions),
+            "current_round": self.current_round,
+            "participating_experts": list(self.participating_experts),
+            "total_suggestions": self.total_suggestions,
+        }
+    
+    def snapshot(self) -> Dict:
+        return {
+            "versions": list(self.versions or ([self.initial_version] if self.initial_version else [])),
+            "expert_suggestions": list(self.expert_suggestions),
+            **self.summary(),
+            "last_update": datetime.now().isoformat()
+        }
 
-def extract_bullet_list(text: str, section_name: str) -> List[str]:
-    """提取项目符号列表"""
-    try:
-        start_pattern = f"{section_name}[:：]"
-        start_match = re.search(start_pattern, text)
-        if not start_match:
-            return []
-        
-        start_pos = start_match.end()
-        remaining_text = text[start_pos:]
-        
-        # 查找下一个section
-        next_section_patterns = [
-            r"\n\n[^-\s].*[:：]",
-            r"\n可接受性评分[:：]",
-            r"\n环境影响评分[:：]", 
-            r"\n合规风险评分[:：]",
-            r"\n可制造性评分[:：]",
-            r"\n运营可行性评分[:：]",
-            r"\n基础设施可行性评分[:：]",
-            r"\n同意程度[:：]"
-        ]
-        
-        end_pos = len(remaining_text)
-        for pattern in next_section_patterns:
-            match = re.search(pattern, remaining_text)
-            if match:
-                end_pos = min(end_pos, match.start())
-        
-        section_text = remaining_text[:end_pos].strip()
+class DiscussionIngestCache:
+    """
+    讨论数据的增量读取缓存
+    
+    记录当前文件（路径 + st_dev/st_ino）和已解析到的字节偏移，每次只解析新追加的完整行，
+    消息列表、角色统计和轮次状态随之增量更新；文件被截断、轮换或出现更新的讨论文件时重新读取。
+    """
+    
+    def __init__(self, hub: MessageHub, update_hub: MessageHub):
+        self.hub = hub
+        self.update_hub = update_hub
+        self._lock = threading.Lock()
+        self._reset(None, None, False)
+    
+    def _reset(self, path: Optional[Path], identity: Optional[tuple], is_events: bool):
+        self.path = path
+        self.identity = identity
+        self.is_events = is_events
+        self.offset = 0
+        self.messages: List[Dict] = []
+        self.role_stats = {role: {"message_count": 0, "total_score": 0, "agreements": []}
+                           for role in ROLES_CONFIG.keys()}
+        self.score_counts = {role: 0 for role in ROLES_CONFIG.keys()}
+        self.history = PolicyHistoryState()
+        self._history_updates: List[Dict] = []
+        self.costs = CostLedger()
+        # 旧版日志的去重与轮次推断状态
+        self._seen_contents = set()
+        self._legacy_round = 1
+    
+    def _locate(self) -> Optional[Path]:
+        events_file = find_latest_event_file()
+        if events_file:
+            return events_file
+        return find_latest_log_file()
+    
+    def _refresh(self):
+        """解析新增内容，并把新消息（以及文件切换）发布到消息广播"""
+        path = self._locate()
+        st = None
+        if path is not None:
+            try:
+                st = path.stat()
+            except FileNotFoundError:
+                path = None
+        if path is None:
+            if self.identity is not None:
+                self._reset(None, None, False)
+                self.hub.publish([], reset=True)
+                self.update_hub.publish([{"type": "history_reset", "history": self.history.snapshot()}])
+            return
         
-        # 提取项目符号项目
-        items = []
-        lines = section_text.split('\n')
-        current_item = ""
+        identity = (str(path), st.st_dev, st.st_ino)
+        if identity != self.identity or st.st_size < self.offset:
+            # 新文件、文件轮换或被截断：从头读取
+            self._reset(path, identity, path.suffix == ".jsonl")
+            self.hub.publish([], reset=True, key=path.stem)
+            self.update_hub.publish([{"type": "history_reset", "history": self.history.snapshot()}])
+        if st.st_size == self.offset:
+            return
         
-        for line in lines:
-            line = line.strip()
-            if line.startswith('-') or line.startswith('•'):
-                if current_item:
-                    items.append(current_item.strip())
-                current_item = line[1:].strip()  # 去掉符号
-            elif current_item and line:
-                current_item += " " + line
+        with path.open("rb") as f:
+            f.seek(self.offset)
+            chunk = f.read(st.st_size - self.offset)
+        # 只处理完整的行，写入中的最后一行留到下次
+        end = chunk.rfind(b"\n")
+        if end < 0:
+            return
+        self.offset += end + 1
+        new_messages = []
+        for line in chunk[:end].decode("utf-8", errors="ignore").split("\n"):
+            parsed = self._parse_event_line(line) if self.is_events else self._parse_legacy_line(line)
+            if parsed:
+                message, structured = parsed
+                self._add(message, structured)
+                new_messages.append(message)
+        if new_messages:
+            self.hub.publish(new_messages)
+        if self._history_updates:
+            self.update_hub.publish(self._history_updates)
+            self._history_updates = []
+    
+    def refresh(self):
+        """读取新增内容（由后台跟踪线程和SSE断线重连调用）"""
+        with self._lock:
+            self._refresh()
+    
+    def _parse_event_line(self, line: str) -> Optional[Tuple[Dict, Dict]]:
+        try:
+            event = orjson.loads(line) if orjson is not None else json.loads(line)
+        except json.JSONDecodeError:
+            return None
+        if event.get("type") == EVENT_LLM_CALL:
+            self.costs.add(event)
+            return None
+        return message_from_event(event)
+    
+    def _parse_legacy_line(self, line: str) -> Optional[Tuple[Dict, Dict]]:
+        """解析旧版日志的 [ROUND_X|角色|内容] 行（兼容事件文件出现之前的讨论）"""
+        match = LEGACY_LINE_PATTERN.search(line)
+        if not match:
+            return None
         
-        if current_item:
-            items.append(current_item.strip())
+        round_num = int(match.group(1))
+        role_name = match.group(2).strip()
+        # 还原换行符
+        content = match.group(3).strip().replace('\\n', '\n')
+        if role_name not in ROLES_CONFIG:
+            return None
         
-        return items
-    except Exception:
-        return []
-
-def extract_round_info(messages: List[Dict]) -> List[Dict]:
-    """从消息中提取轮次信息"""
-    if not messages:
-        return messages
-    
-    current_round = 1
-    policy_revisions = 0  # 政策修订计数
-    max_rounds = 10  # 最大轮次限制
-    
-    for i, message in enumerate(messages):
-        content = message.get("content", "")
-        role = message.get("role", "")
+        # 去重
+        fingerprint = f"{role_name}:{round_num}:{content[:50]}"
+        if fingerprint in self._seen_contents:
+            return None
+        self._seen_contents.add(fingerprint)
         
-        # 查找明确的轮次标识（如果日志中有的话）
-        round_match = re.search(r'第\s*(\d+)\s*轮', content)
+        timestamp_match = LEGACY_TIMESTAMP_PATTERN.match(line)
+        timestamp = timestamp_match.group(1) if timestamp_match else ""
+        message_id = hashlib.md5(f"{role_name}_{round_num}_{content[:50]}".encode()).hexdigest()[:16]
+        structured = extract_structured_content(content, role_name, include_raw=False)
+        message = build_message(message_id, role_name, content, round_num, timestamp, structured)
+        message["round"] = self._infer_legacy_round(role_name, content)
+        return message, structured
+    
+    def _infer_legacy_round(self, role: str, content: str) -> int:
+        """旧版日志的轮次：优先使用内容中明确的“第N轮”，否则每次政策修订后进入下一轮"""
+        round_match = EXPLICIT_ROUND_PATTERN.search(content)
         if round_match:
-            explicit_round = int(round_match.group(1))
-            # 确保不超过最大轮次
-            current_round = min(explicit_round, max_rounds)
-        
-        # 为消息添加轮次信息
-        message["round"] = current_round
-        
-        # 根据政策修订来推断轮次变化
-        # 政策部门的政策修订通常标志着一轮讨论的结束
-        if role == "政策部门" and "修订后的政策" in content:
-            policy_revisions += 1
-            # 每次政策修订后，如果还有后续消息，则开始新轮次
-            if i < len(messages) - 1 and current_round < max_rounds:
-                current_round += 1
-        
-        # 另一种轮次推断方式：基于消息序列模式
-        # 如果是经济顾问的第一条消息，且前面已有政策修订，可能是新轮次
-        elif role == "经济顾问" and policy_revisions > 0:
-            # 检查前面是否刚有政策修订
-            if i > 0 and messages[i-1].get("role") == "政策部门":
-                # 保持当前轮次不变，因为已经在上面的逻辑中处理了
-                pass
-    
-    # 最后检查：确保所有消息的轮次都不超过最大值
-    for message in messages:
-        if message.get("round", 1) > max_rounds:
-            message["round"] = max_rounds
-    
-    return messages
+            self._legacy_round = min(int(round_match.group(1)), MAX_LEGACY_ROUNDS)
+        round_num = min(self._legacy_round, MAX_LEGACY_ROUNDS)
+        if role == "政策部门" and "修订后的政策" in content and self._legacy_round < MAX_LEGACY_ROUNDS:
+            self._legacy_round += 1
+        return round_num
+    
+    def _add(self, message: Dict, structured: Dict):
+        self.messages.append(message)
+        self._history_updates.extend(self.history.add(message, structured))
+        stats = self.role_stats[message["role"]]
+        structured = message["structured"]
+        stats["message_count"] += 1
+        if structured["score"]:
+            stats["total_score"] += structured["score"]
+            self.score_counts[message["role"]] += 1
+        if structured["agreement"]:
+            stats["agreements"].append(structured["agreement"])
+    
+    def _snapshot(self) -> Dict:
+        if self.path is None:
+            return {"messages": [], "stats": {}}
+        stats = {
+            role: {
+                "message_count": s["message_count"],
+                "total_score": s["total_score"],
+                "agreements": list(s["agreements"]),
+                "avg_score": s["total_score"] / self.score_counts[role] if self.score_counts[role] else 0,
+            }
+            for role, s in self.role_stats.items()
+        }
+        return {
+            "messages": list(self.messages),
+            "stats": stats,
+            "total_messages": len(self.messages),
+            "latest_update": datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        }
+    
+    def snapshot(self) -> Dict:
+        """读取新增内容并返回当前数据的副本"""
+        with self._lock:
+            self._refresh()
+            return self._snapshot()
+    
+    def history_snapshot(self) -> Dict:
+        """读取新增内容并返回政策修订历史"""
+        return self.versioned_history()[0]
+    
+    def _version(self) -> str:
+        """数据版本：讨论文件和已解析的消息数不变时数据不变（用于ETag）"""
+        return f"{self.identity}:{len(self.messages)}"
+    
+    def versioned_snapshot(self) -> Tuple[Dict, str]:
+        with self._lock:
+            self._refresh()
+            return self._snapshot(), self._version()
+    
+    def versioned_history(self) -> Tuple[Dict, str]:
+        with self._lock:
+            self._refresh()
+            return self.history.snapshot(), self._version()
+    
+    def versioned_costs(self, group_by: List[str]) -> Tuple[Dict, str]:
+        """读取新增内容并返回LLM调用的汇总（group_by 为空时返回默认汇总；版本随调用数变化）"""
+        with self._lock:
+            self._refresh()
+            if group_by:
+                data = {"total": self.costs.totals(), "rows": self.costs.group_by(*group_by)}
+            else:
+                data = self.costs.snapshot()
+            return data, f"{self.identity}:{self.costs.calls}"
+    
+    def updates_snapshot(self) -> Tuple[Dict, int, int, str]:
+        """返回政策修订历史及对应的更新广播位置"""
+        with self._lock:
+            self._refresh()
+            generation, next_seq, key = self.update_hub.cursor()
+            return self.history.snapshot(), generation, next_seq, key
+    
+    def snapshot_with_cursor(self) -> Tuple[Dict, int, int, str]:
+        """返回数据副本及对应的广播位置 (generation, next_seq, key)，订阅者从该位置开始接收新消息"""
+        with self._lock:
+            self._refresh()
+            generation, next_seq, key = self.hub.cursor()
+            return self._snapshot(), generation, next_seq, key
 
-def get_discussion_data() -> Dict:
-    """获取讨论数据"""
-    import re
-    import hashlib
-    
-    latest_log = find_latest_log_file()
-    if not latest_log:
-        return {"messages": [], "stats": {}}
-    
-    messages = []
-    seen_contents = set()  # 用于去重
-    role_stats = {role: {"message_count": 0, "total_score": 0, "agreements": []} 
-                  for role in ROLES_CONFIG.keys()}
-    
-    # 角色映射表
-    # 不再需要映射表
-    
-    with latest_log.open("r", encoding="utf-8", errors="ignore") as f:
-        for line in f:
-            # 只解析 [ROUND_X|角色|内容] 格式 (可能在日志前缀之后)
-            match = re.search(r'\[ROUND_(\d+)\|([^\|]+)\|(.+)\]', line)
-            if not match:
-                continue
-            
-            round_num = int(match.group(1))
-            role_name = match.group(2).strip()
-            content = match.group(3).strip()
-            # 还原换行符
-            content = content.replace('\\n', '\n')
-            
-            # 映射角色名
-            display_role = role_name if role_name in ROLES_CONFIG else None
-            if not display_role:
-                continue
-            
-            # 去重
-            fingerprint = f"{display_role}:{round_num}:{content[:50]}"
-            if fingerprint in seen_contents:
-                continue
-            seen_contents.add(fingerprint)
-            
-            # 提取时间戳
-            timestamp_match = re.match(r'^(\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2})', line)
-            timestamp = timestamp_match.group(1) if timestamp_match else ""
-            
-            # 创建消息
-            message_id = hashlib.md5(f"{role_name}_{round_num}_{content[:50]}".encode()).hexdigest()[:16]
-            structured = extract_structured_content(content, display_role)
-            
-            messages.append({
-                "id": message_id,
-                "role": display_role,
-                "role_config": ROLES_CONFIG[display_role],
-                "content": content,
-                "structured": structured,
-                "timestamp": timestamp,
-                "send_to": [],
-                "round": round_num
-            })
-            
-            # 更新统计
-            role_stats[display_role]["message_count"] += 1
-            if structured["score"]:
-                role_stats[display_role]["total_score"] += structured["score"]
-            if structured["agreement"]:
-                role_stats[display_role]["agreements"].append(structured["agreement"])
-    
-    # 计算平均分数
-    for role, stats in role_stats.items():
-        if stats["message_count"] > 0 and stats["total_score"] > 0:
-            stats["avg_score"] = stats["total_score"] / len([m for m in messages 
-                                                           if m["role"] == role and m["structured"]["score"]])
-        else:
-            stats["avg_score"] = 0
+class DiscussionTailer(threading.Thread):
+    """
+    后台跟踪线程：唯一读取讨论文件的地方，新内容经缓存解析后发布到广播中心
     
-    # 提取轮次信息
-    messages = extract_round_info(messages)
+    安装了 inotify_simple 时由文件系统事件唤醒，否则定时轮询。
+    """
     
-    return {
-        "messages": messages,
-        "stats": role_stats,
-        "total_messages": len(messages),
-        "latest_update": datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-    }
+    def __init__(self, cache: DiscussionIngestCache, poll_interval: float = 0.5):
+        super().__init__(name="discussion-tailer", daemon=True)
+        self.cache = cache
+        self.poll_interval = poll_interval
+    
+    def _make_watcher(self):
+        if INotify is None:
+            return None
+        try:
+            watcher = INotify()
+            mask = inotify_flags.MODIFY | inotify_flags.CREATE | inotify_flags.DELETE | inotify_flags.MOVED_TO
+            for directory in (LOG_DIR, EVENTS_DIR):
+                directory.mkdir(parents=True, exist_ok=True)
+                watcher.add_watch(str(directory), mask)
+            return watcher
+        except OSError as e:
+            print(f"⚠️ inotify 不可用，改为轮询: {e}")
+            return None
+    
+    def run(self):
+        watcher = self._make_watcher()
+        while True:
+            try:
+                self.cache.refresh()
+            except Exception as e:
+                print(f"⚠️ 读取讨论文件失败: {e}")
+            if watcher is not None:
+                # 超时兜底，防止遗漏事件
+                watcher.read(timeout=5000, read_delay=20)
+            else:
+                time.sleep(self.poll_interval)
+
+message_hub = MessageHub()
+# 政策修订历史增量与讨论状态变化的广播，事件ID以本次服务启动时间区分
+update_hub = MessageHub()
+update_hub.publish([], reset=True, key=datetime.now().strftime("%Y%m%d%H%M%S%f"))
+discussion_cache = DiscussionIngestCache(message_hub, update_hub)
+_tailer: Optional[DiscussionTailer] = None
+_tailer_lock = threading.Lock()
+
+def ensure_tailer():
+    """按需启动后台跟踪线程（整个进程只有一个）"""
+    global _tailer
+    with _tailer_lock:
+        if _tailer is None:
+            _tailer = DiscussionTailer(discussion_cache)
+            _tailer.start()
+
+def get_discussion_data() -> Dict:
+    """获取讨论数据"""
+    return discussion_cache.snapshot()
 
 def clear_old_logs():
     """清空旧的日志文件"""
@@ -627,6 +679,14 @@ def clear_old_logs():
                 except Exception as e1:
                     print(f"⚠️ 无法删除 {log_file.name}: {e1}")
         
+        if EVENTS_DIR.exists():
+            for events_file in EVENTS_DIR.glob("*.jsonl"):
+                try:
+                    events_file.unlink()
+                    print(f"✅ 已删除: {events_file.name}")
+                except Exception as e1:
+                    print(f"⚠️ 无法删除 {events_file.name}: {e1}")
+        
         LOG_DIR.mkdir(exist_ok=True)
         print("✅ 日志清理完成")
     except Exception as e:
@@ -649,8 +709,7 @@ def force_clear_logs():
                     print("✅ 已强制终止讨论进程")
                 except:
                     pass
-            discussion_status["process"] = None
-            discussion_status["is_running"] = False
+            set_discussion_status(process=None, is_running=False)
         
         # 2. 等待一下让文件句柄释放
         import time
@@ -674,15 +733,17 @@ def run_discussion_async(topic: str):
     global discussion_status
     
     try:
-        discussion_status["is_running"] = True
-        discussion_status["current_topic"] = topic
-        discussion_status["start_time"] = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        discussion_status["progress"] = "正在清理旧数据..."
+        set_discussion_status(
+            is_running=True,
+            current_topic=topic,
+            start_time=datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+            progress="正在清理旧数据..."
+        )
         
         # 清空旧的日志文件，确保新讨论有干净的开始
         clear_old_logs()
         
-        discussion_status["progress"] = "正在启动讨论..."
+        set_discussion_status(progress="正在启动讨论...")
         
         # 构建命令
         if platform.system() == "Windows":
@@ -704,8 +765,7 @@ def run_discussion_async(topic: str):
             universal_newlines=True
         )
         
-        discussion_status["process"] = process
-        discussion_status["progress"] = "讨论进行中..."
+        set_discussion_status(process=process, progress="讨论进行中...")
         
         # 实时输出进程信息（用于调试）
         print("📊 进程输出:")
@@ -720,18 +780,17 @@ def run_discussion_async(topic: str):
         return_code = process.poll()
         
         if return_code == 0:
-            discussion_status["progress"] = "讨论已完成"
+            set_discussion_status(progress="讨论已完成")
             print("✅ 讨论成功完成")
         else:
-            discussion_status["progress"] = f"讨论出错，返回码: {return_code}"
+            set_discussion_status(progress=f"讨论出错，返回码: {return_code}")
             print(f"❌ 讨论失败，返回码: {return_code}")
         
     except Exception as e:
-        discussion_status["progress"] = f"启动失败: {str(e)}"
+        set_discussion_status(progress=f"启动失败: {str(e)}")
         print(f"❌ 启动失败: {e}")
     finally:
-        discussion_status["is_running"] = False
-        discussion_status["process"] = None
+        set_discussion_status(is_running=False, process=None)
 
 def start_discussion_thread(topic: str):
     """在新线程中启动讨论"""
@@ -758,81 +817,203 @@ def policy_history():
     """政策修订历史页面"""
     return render_template("policy_history.html")
 
+def encode_json(payload) -> bytes:
+    """紧凑的UTF-8 JSON（中文不转义为 \\uXXXX），安装了 orjson 时使用 orjson"""
+    if orjson is not None:
+        return orjson.dumps(payload)
+    return json.dumps(payload, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+GZIP_MIN_SIZE = 1024  # 小于该字节数的响应不压缩
+
+def json_response(payload) -> Response:
+    """JSON响应，客户端接受gzip且响应较大时压缩"""
+    body = encode_json(payload)
+    headers = {"Vary": "Accept-Encoding"}
+    if len(body) >= GZIP_MIN_SIZE and "gzip" in request.accept_encodings:
+        body = gzip.compress(body, compresslevel=5)
+        headers["Content-Encoding"] = "gzip"
+    return Response(body, mimetype="application/json", headers=headers)
+
+def conditional_json(version: str, build: Callable[[], Dict]) -> Response:
+    """
+    按数据版本和查询参数生成ETag，客户端数据未变化时返回304，否则返回 build() 的JSON
+    """
+    etag = hashlib.md5(f"{version}|{request.full_path}".encode()).hexdigest()
+    if etag in request.if_none_match:
+        response = Response(status=304)
+    else:
+        response = json_response(build())
+    response.set_etag(etag)
+    return response
+
+def select_messages(messages: List[Dict], since_id: Optional[str] = None, round_num: Optional[int] = None,
+                    role: Optional[str] = None, limit: Optional[int] = None,
+                    cursor: Optional[int] = None) -> Tuple[List[Dict], Optional[int]]:
+    """
+    按增量/过滤/分页参数选择消息
+    
+    since_id 之后的消息；cursor 为消息序号（上一页返回的 next_cursor）；
+    返回 (消息列表, next_cursor)，没有更多消息时 next_cursor 为None
+    """
+    start = 0
+    if since_id:
+        for index in range(len(messages) - 1, -1, -1):
+            if messages[index]["id"] == since_id:
+                start = index + 1
+                break
+    if cursor is not None:
+        start = max(start, cursor)
+    
+    selected = []
+    for index in range(start, len(messages)):
+        message = messages[index]
+        if round_num is not None and message.get("round", 1) != round_num:
+            continue
+        if role and message["role"] != role:
+            continue
+        if limit is not None and len(selected) >= limit:
+            return selected, index
+        selected.append(message)
+    return selected, None
+
 @app.route("/api/discussion")
 def api_discussion():
-    """获取讨论数据API"""
-    return jsonify(get_discussion_data())
+    """
+    获取讨论数据API
+    
+    查询参数：since_id（只返回该消息之后的消息）、round、role、limit、cursor（分页，取上次的 next_cursor）
+    """
+    data, version = discussion_cache.versioned_snapshot()
+    
+    def build() -> Dict:
+        messages, next_cursor = select_messages(
+            data["messages"],
+            since_id=request.args.get("since_id"),
+            round_num=request.args.get("round", type=int),
+            role=request.args.get("role"),
+            limit=request.args.get("limit", type=int),
+            cursor=request.args.get("cursor", type=int),
+        )
+        return {**data, "messages": messages, "next_cursor": next_cursor, "roles": ROLES_CONFIG}
+    
+    return conditional_json(version, build)
+
+def format_sse(payload: Dict, event_id: Optional[str] = None) -> str:
+    """格式化SSE事件，带ID的事件可用于断线续传"""
+    prefix = f"id: {event_id}\n" if event_id is not None else ""
+    return f"{prefix}data: {encode_json(payload).decode('utf-8')}\n\n"
+
+def parse_event_id(event_id: str) -> Optional[Tuple[str, int]]:
+    """解析 "<讨论文件名>:<消息序号>" 格式的事件ID"""
+    key, _, seq = (event_id or "").rpartition(":")
+    try:
+        return key, int(seq)
+    except ValueError:
+        return None
+
+def hub_stream(hub: MessageHub, last_event: Optional[Tuple[str, int]],
+               snapshot: Callable[[], Tuple[Dict, int, int, str]],
+               to_event: Callable[[Dict], Optional[Dict]]) -> Generator[str, None, None]:
+    """
+    从广播中心推送SSE事件，每个事件带ID "<key>:<序号>"
+    
+    能从 last_event 续传时只补发缺失的事件，否则先发送 snapshot() 返回的 init 事件；
+    讨论切换或缺口超出缓冲区时重新发送 init。to_event 把缓冲区条目转换为推送的事件，返回None则跳过。
+    """
+    ensure_tailer()
+    cursor = None
+    if last_event:
+        discussion_cache.refresh()
+        cursor = hub.resume(last_event[0], last_event[1] + 1)
+    
+    if cursor:
+        generation, next_seq = cursor
+        key = last_event[0]
+    else:
+        payload, generation, next_seq, key = snapshot()
+        if not key:
+            yield format_sse({'type': 'error', 'message': '未找到日志文件'})
+            return
+        yield format_sse(payload, f"{key}:{next_seq - 1}")
+    
+    while True:
+        items = hub.wait(generation, next_seq, timeout=15)
+        if items is None:
+            payload, generation, next_seq, key = snapshot()
+            yield format_sse(payload, f"{key}:{next_seq - 1}")
+            continue
+        if not items:
+            yield ": keep-alive\n\n"
+            continue
+        for seq, item in items:
+            event = to_event(item)
+            if event is not None:
+                yield format_sse(event, f"{key}:{seq}")
+            next_seq = seq + 1
 
 @app.route("/api/messages/stream")
 def stream_messages():
-    """实时消息流"""
-    def generate():
-        latest_log = find_latest_log_file()
-        if not latest_log:
-            yield f"data: {json.dumps({'type': 'error', 'message': '未找到日志文件'})}\n\n"
-            return
-        
-        # 先发送现有消息
-        data = get_discussion_data()
-        yield f"data: {json.dumps({'type': 'init', 'data': data})}\n\n"
-        
-        # 监听新消息
-        with latest_log.open("r", encoding="utf-8", errors="ignore") as f:
-            f.seek(0, os.SEEK_END)
-            while True:
-                line = f.readline()
-                if line:
-                    msg = parse_log_message(line)
-                    if msg and msg["content"].strip():
-                        # 映射角色
-                        display_role = None
-                        
-                        # 角色映射表
-                        role_mapping = {
-                            "首席经济学家": "经济顾问",
-                            "环境科学家": "环境学家", 
-                            "航空法规专家": "合规律师",
-                            "无人机生产主管": "制造商",
-                            "航空物流总监": "物流公司",
-                            "基础设施开发经理": "基建公司",
-                            "高级政策制定者": "政策部门"
-                        }
-                        
-                        # 先尝试直接映射
-                        for role_key in ROLES_CONFIG.keys():
-                            if role_key in msg["sent_from"] or role_key in msg["role"]:
-                                display_role = role_key
-                                break
-                        
-                        # 如果直接映射失败，尝试通过映射表
-                        if not display_role:
-                            for profile, role_key in role_mapping.items():
-                                if profile in msg["role"] or profile in msg["sent_from"]:
-                                    display_role = role_key
-                                    break
-                        
-                        if display_role:
-                            structured = extract_structured_content(msg["content"], display_role)
-                            message = {
-                                "id": msg["id"],
-                                "role": display_role,
-                                "role_config": ROLES_CONFIG[display_role],
-                                "content": msg["content"],
-                                "structured": structured,
-                                "timestamp": msg["timestamp"],
-                                "round": 1  # 新消息默认为当前轮次，后续会更新
-                            }
-                            yield f"data: {json.dumps({'type': 'message', 'message': message})}\n\n"
-                else:
-                    time.sleep(1)
+    """
+    实时消息流
+    
+    每个事件带ID "<讨论文件名>:<消息序号>"。重连时通过 Last-Event-ID 请求头（浏览器自动重连）
+    或 last_event_id 参数（页面重新创建连接）只补发缺失的消息，缺口超出缓冲区时才重新发送全量数据。
+    """
+    last_event = parse_event_id(request.headers.get("Last-Event-ID") or request.args.get("last_event_id", ""))
+    
+    def snapshot():
+        data, generation, next_seq, key = discussion_cache.snapshot_with_cursor()
+        return {'type': 'init', 'data': {**data, 'roles': ROLES_CONFIG}}, generation, next_seq, key
+    
+    def to_event(message: Dict) -> Dict:
+        return {'type': 'message', 'message': message}
     
-    return Response(generate(), mimetype="text/event-stream")
+    return Response(hub_stream(message_hub, last_event, snapshot, to_event), mimetype="text/event-stream")
+
+# 更新推送的频道及对应的事件类型
+UPDATE_CHANNELS = {
+    "history": {"policy_version", "suggestion_group", "history_reset"},
+    "status": {"status"},
+}
+
+@app.route("/api/updates/stream")
+def stream_updates():
+    """
+    政策修订历史与讨论状态的推送
+    
+    channels 参数选择频道（history,status，默认全部）。首次连接发送 init 全量数据，
+    之后只推送新的政策版本、新的专家建议组和讨论状态变化，断线续传方式同消息流。
+    """
+    channels = [c for c in request.args.get("channels", "history,status").split(",") if c in UPDATE_CHANNELS]
+    wanted = set().union(*(UPDATE_CHANNELS[c] for c in channels))
+    last_event = parse_event_id(request.headers.get("Last-Event-ID") or request.args.get("last_event_id", ""))
+    
+    def snapshot():
+        history, generation, next_seq, key = discussion_cache.updates_snapshot()
+        payload = {'type': 'init'}
+        if "history" in channels:
+            payload["history"] = history
+        if "status" in channels:
+            payload["status"] = public_discussion_status()
+        return payload, generation, next_seq, key
+    
+    def to_event(update: Dict) -> Optional[Dict]:
+        return update if update["type"] in wanted else None
+    
+    return Response(hub_stream(update_hub, last_event, snapshot, to_event), mimetype="text/event-stream")
 
 @app.route("/api/stats")
 def api_stats():
-    """获取统计信息"""
-    data = get_discussion_data()
-    return jsonify(data["stats"])
+    """获取统计信息（role 参数只返回该角色）"""
+    data, version = discussion_cache.versioned_snapshot()
+    
+    def build() -> Dict:
+        role = request.args.get("role")
+        if role:
+            return {role: data["stats"][role]} if role in data["stats"] else {}
+        return data["stats"]
+    
+    return conditional_json(version, build)
 
 @app.route("/api/start_discussion", methods=["POST"])
 def api_start_discussion():
@@ -875,15 +1056,7 @@ def api_start_discussion():
 @app.route("/api/discussion_status")
 def api_discussion_status():
     """获取讨论状态"""
-    # 创建一个可序列化的状态副本，排除Popen对象
-    safe_status = {
-        "is_running": discussion_status.get("is_running", False),
-        "current_topic": discussion_status.get("current_topic", ""),
-        "start_time": discussion_status.get("start_time", ""),
-        "progress": discussion_status.get("progress", ""),
-        # 不包含 "process" 字段，因为Popen对象无法JSON序列化
-    }
-    return jsonify(safe_status)
+    return jsonify(public_discussion_status())
 
 @app.route("/api/stop_discussion", methods=["POST"])
 def api_stop_discussion():
@@ -899,9 +1072,7 @@ def api_stop_discussion():
     try:
         if discussion_status["process"]:
             discussion_status["process"].terminate()
-            discussion_status["progress"] = "讨论已停止"
-            discussion_status["is_running"] = False
-            discussion_status["process"] = None
+            set_discussion_status(progress="讨论已停止", is_running=False, process=None)
         
         return jsonify({
             "success": True,
@@ -928,145 +1099,64 @@ def api_clear_data():
             "message": f"清空失败: {str(e)}"
         }), 500
 
+def select_history(history: Dict, since_version: Optional[int] = None, since_id: Optional[int] = None,
+                   round_num: Optional[int] = None, role: Optional[str] = None,
+                   limit: Optional[int] = None) -> Dict:
+    """
+    按增量/过滤/分页参数选择政策版本和专家建议组
+    
+    since_version / since_id 分别只返回版本号 / 建议组序号更大的条目；round 同时过滤两者，role 过滤建议组的专家；
+    limit 对版本和建议组分别分页，每页各最多 limit 条。任一列表还有更多条目时返回两者的位置：
+    next_cursor 为已返回的最后版本号（作为下次的 since_version / cursor），next_since_id 为已返回的最后建议组序号
+    （作为下次的 since_id）；两个列表都已取完时两者均为None
+    """
+    versions = [
+        v for v in history["versions"]
+        if (since_version is None or v["version"] > since_version)
+        and (round_num is None or v["round"] == round_num)
+    ]
+    suggestions = [
+        g for g in history["expert_suggestions"]
+        if (since_id is None or g["message_id"] > since_id)
+        and (round_num is None or g["round"] == round_num)
+        and (not role or g["expert"] == role)
+    ]
+    next_cursor = next_since_id = None
+    if limit is not None and (len(versions) > limit or len(suggestions) > limit):
+        versions, suggestions = versions[:limit], suggestions[:limit]
+        next_cursor = versions[-1]["version"] if versions else since_version
+        next_since_id = suggestions[-1]["message_id"] if suggestions else since_id
+    return {**history, "versions": versions, "expert_suggestions": suggestions,
+            "next_cursor": next_cursor, "next_since_id": next_since_id}
+
 @app.route("/api/policy_history")
 def api_policy_history():
-    """获取政策修订历史"""
+    """
+    获取政策修订历史（页面首次加载后改为订阅 /api/updates/stream）
+    
+    查询参数：since_version、since_id（专家建议组序号）、round、role、limit、cursor（同 since_version）；
+    分页时依次以返回的 next_cursor、next_since_id 作为下一页的 cursor、since_id
+    """
     try:
-        data = get_discussion_data()
-        messages = data.get("messages", [])
-        
-        # 提取政策版本和专家建议
-        policy_versions = []
-        expert_suggestions = []
-        version_number = 0
-        
-        # 首先收集所有专家建议
-        for msg in messages:
-            content = msg.get("content", "")
-            role = msg.get("role", "")
-            timestamp = msg.get("timestamp", "")
-            round_num = msg.get("round", 1)
-            
-            # 识别专家建议（非政策制定者的消息）
-            if role not in ["政策制定者", "政策部门"] and len(content) > 30:
-                # 提取关键建议
-                suggestions = extract_expert_suggestions(content, role)
-                if suggestions:
-                    expert_suggestions.append({
-                        "expert": role,
-                        "round": round_num,
-                        "timestamp": timestamp,
-                        "suggestions": suggestions,
-                        "full_content": content,
-                        "message_id": len(expert_suggestions)
-                    })
-        
-        # 然后处理政策版本，并关联专家建议
-        for msg in messages:
-            content = msg.get("content", "")
-            role = msg.get("role", "")
-            timestamp = msg.get("timestamp", "")
-            round_num = msg.get("round", 1)
-            
-            # 查找政策修订消息
-            if "修订后的政策:" in content:
-                version_number += 1
-                
-                # 提取政策内容
-                policy_content = ""
-                changes = []
-                
-                try:
-                    # 分割内容
-                    parts = content.split("修订后的政策:")
-                    if len(parts) > 1:
-                        policy_part = parts[1]
-                        
-                        # 进一步分割获取政策内容和修改说明
-                        if "所做修改:" in policy_part:
-                            policy_content = policy_part.split("所做修改:")[0].strip()
-                            changes_part = policy_part.split("所做修改:")[1].strip()
-                            
-                            # 解析修改列表
-                            change_lines = [line.strip() for line in changes_part.split('\n') if line.strip()]
-                            for line in change_lines:
-                                if line and not line.startswith('修改') and len(line) > 5:
-                                    # 清理编号和格式
-                                    clean_line = re.sub(r'^\d+\.\s*', '', line)
-                                    clean_line = re.sub(r'^[•\-\*]\s*', '', clean_line)
-                                    if clean_line:
-                                        changes.append(clean_line)
-                        else:
-                            policy_content = policy_part.strip()
-                    
-                    # 如果没有找到标准格式，使用整个内容
-                    if not policy_content:
-                        policy_content = content
-                        
-                except Exception as e:
-                    logger.error(f"解析政策内容失败: {e}")
-                    policy_content = content
-                
-                # 找到影响此次修订的专家建议
-                influencing_suggestions = find_influencing_suggestions(
-                    changes, expert_suggestions, round_num
-                )
-                
-                # 创建版本记录
-                version = {
-                    "version": version_number,
-                    "round": round_num,
-                    "timestamp": timestamp or datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-                    "content": policy_content,
-                    "changes": changes,
-                    "expert": role,
-                    "raw_message": content,
-                    "influencing_suggestions": influencing_suggestions,
-                    "expert_feedback_count": len(influencing_suggestions)
-                }
-                
-                policy_versions.append(version)
-        
-        # 如果没有找到政策版本，创建一个初始版本
-        if not policy_versions and messages:
-            # 查找第一个政策制定者的消息作为初始版本
-            for msg in messages:
-                role = msg.get("role", "")
-                if role in ["政策制定者", "政策部门"]:
-                    content = msg.get("content", "")
-                    if len(content) > 50:  # 确保有实质内容
-                        version = {
-                            "version": 1,
-                            "round": msg.get("round", 1),
-                            "timestamp": msg.get("timestamp", ""),
-                            "content": content,
-                            "changes": ["初始政策制定"],
-                            "expert": role,
-                            "raw_message": content
-                        }
-                        policy_versions.append(version)
-                        break
+        history, version = discussion_cache.versioned_history()
         
-        # 计算统计信息
-        current_round = max([msg.get("round", 1) for msg in messages]) if messages else 1
-        
-        # 统计专家参与情况
-        participating_experts = set()
-        for suggestion_group in expert_suggestions:
-            participating_experts.add(suggestion_group["expert"])
-        
-        return jsonify({
-            "versions": policy_versions,
-            "expert_suggestions": expert_suggestions,
-            "total_versions": len(policy_versions),
-            "current_round": current_round,
-            "participating_experts": list(participating_experts),
-            "total_suggestions": sum(len(s["suggestions"]) for s in expert_suggestions),
-            "last_update": datetime.now().isoformat()
-        })
+        def build() -> Dict:
+            since_version = request.args.get("since_version", type=int)
+            cursor = request.args.get("cursor", type=int)
+            if cursor is not None:
+                since_version = max(since_version or 0, cursor)
+            return select_history(
+                history,
+                since_version=since_version,
+                since_id=request.args.get("since_id", type=int),
+                round_num=request.args.get("round", type=int),
+                role=request.args.get("role"),
+                limit=request.args.get("limit", type=int),
+            )
         
+        return conditional_json(version, build)
     except Exception as e:
-        logger.error(f"获取政策历史失败: {e}")
+        print(f"获取政策历史失败: {e}")
         return jsonify({
             "versions": [],
             "total_versions": 0,
@@ -1075,6 +1165,16 @@ def api_policy_history():
             "error": str(e)
         })
 
+@app.route("/api/cost")
+def api_cost():
+    """LLM调用的token与花费汇总（group_by 指定汇总字段，如 round,role；默认返回合计及按角色、轮次、调用类型的汇总）"""
+    group_by = [field for field in request.args.get("group_by", "").split(",") if field]
+    unknown = [field for field in group_by if field not in GROUP_FIELDS]
+    if unknown:
+        return jsonify({"error": f"未知汇总字段: {', '.join(unknown)}，可选: {', '.join(GROUP_FIELDS)}"}), 400
+    data, version = discussion_cache.versioned_costs(group_by)
+    return conditional_json(version, lambda: data)
+
 if __name__ == "__main__":
     # 确保目录存在
     TEMPLATES_DIR.mkdir(exist_ok=True)